@@ -2,6 +2,15 @@ import asyncio
 from bleak import BleakClient, BleakScanner
 import struct
 import csv
+import os
+import sys
+import time
+
+# Frame layout and class names come from the ESP's own modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'SensorIntegration',
+                                'Final Application'))
+import verdict
+from forest import LABELS
 
 
 # Auto generated UUIDs for service and characteristics (https://www.uuidgenerator.net/)
@@ -14,9 +23,89 @@ ESP32_DEVICES = [
 OUTPUT_FILE_NAME = 'received_data.csv' 
 LastBatch = 0
 receivedCounter = 0
-# Handler for incoming data
+
+# Frames between two byte-count and loss reports
+REPORT_FRAMES = 100
+
+
+# Bytes and sequence gaps of the notifications of one device while connected. A gap of
+# half the sequence range or more is taken as a reboot of the ESP (or a late frame).
+# The 16-bit ms of the frames wraps every 65.5s, unwrap_ms extends it against the
+# receive time of the last frame.
+class VerdictLog:
+    def __init__(self):
+        self.last_seq = None
+        # Unwrapped ms and receive time (ms) of the last frame
+        self.last_ms = None
+        self.last_received_ms = 0
+        self.frames = 0
+        self.texts = 0
+        self.bytes = 0
+        self.lost = 0
+        self.restarts = 0
+
+    def add(self, seq, size):
+        if self.last_seq is not None:
+            gap = (seq - self.last_seq - 1) & 0xFF
+            if gap < 0x80:
+                self.lost += gap
+            else:
+                self.restarts += 1
+                self.last_ms = None
+        self.last_seq = seq
+        self.frames += 1
+        self.bytes += size
+
+    # ESP ticks_ms of a frame from its low 16 bits, taking the wraps since the last frame
+    # from the time between them. Counts from the first frame's ms after a (re)connect.
+    def unwrap_ms(self, ms, received_ms):
+        if self.last_ms is not None:
+            expected = self.last_ms + received_ms - self.last_received_ms
+            ms += (expected - ms + 0x8000) >> 16 << 16
+        self.last_ms = ms
+        self.last_received_ms = received_ms
+        return ms
+
+    # Frames the ESP made while no central was connected were never sent
+    def disconnected(self):
+        self.last_seq = None
+        self.last_ms = None
+
+    def loss_percent(self):
+        return 100 * self.lost / max(self.frames + self.lost, 1)
+
+    def report(self, device_name):
+        return (f"{device_name}: {self.frames} frames and {self.texts} strings in {self.bytes} bytes, "
+                f"{self.lost} frames lost ({self.loss_percent():.1f}%), {self.restarts} sequence restarts")
+
+
+verdict_logs = {}
+
+
+# Kind, class id and votes of a frame as text
+def verdict_text(kind, class_id, votes, trees):
+    if kind == verdict.VERDICT_RETRACT:
+        return "Retracted"
+    label = LABELS[class_id] if class_id < len(LABELS) else str(class_id)
+    if kind == verdict.VERDICT_ALERT:
+        return label + '?'
+    return f"{label} ({votes}/{trees} trees)" if trees else label
+
+
+# Handler for incoming data: verdict frames, or the label strings of older firmware
 async def recieve_data(device_name, sender, data):
-    print(" Verdict = ",data.decode('utf-8'))
+    log = verdict_logs.setdefault(device_name, VerdictLog())
+    if verdict.is_frame(data):
+        kind, class_id, votes, trees, seq, ms = verdict.decode(data)
+        log.add(seq, len(data))
+        ms = log.unwrap_ms(ms, int(time.monotonic() * 1000))
+        print(f" Verdict = {verdict_text(kind, class_id, votes, trees)}, #{seq} at {ms} ms")
+        if log.frames % REPORT_FRAMES == 0:
+            print(log.report(device_name))
+    else:
+        log.texts += 1
+        log.bytes += len(data)
+        print(" Verdict = ", data.decode('utf-8'))
     return
     with open(device_name + '_' + OUTPUT_FILE_NAME, 'a', newline='') as f:
         values = struct.unpack('209h', data)
@@ -76,6 +165,9 @@ async def start_BLE(device):
 
             # Prints that device has been disconnected
             print(f"{device['name']} disconnected. Reconnecting...")
+            if device['name'] in verdict_logs:
+                print(verdict_logs[device['name']].report(device['name']))
+                verdict_logs[device['name']].disconnected()
 
         # Non-blocking sleep
         await asyncio.sleep(2)
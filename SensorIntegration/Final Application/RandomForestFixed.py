@@ -0,0 +1,597 @@
+# Generated by forest_tools.py from RandomForest.py, do not edit.
+# Integer thresholds for features computed by KinematicAccumulator(fixed=True)
+# or SlidingFeatures(window, fixed=True): means in Q8, squared peaks, |z| in LSB.
+
+def predict(x):
+    votes = [0, 0, 0, 0]
+    if x[11] <= 24005428:
+        if x[0] <= 37691:
+            if x[8] <= 52775:
+                if x[8] <= -61278:
+                    if x[3] <= -122870:
+                        votes[0] += 1
+
+                    else:
+                        votes[0] += 1
+
+                else:
+                    if x[3] <= -250799:
+                        votes[0] += 1
+
+                    else:
+                        votes[3] += 1
+
+            else:
+                if x[6] <= -381317:
+                    if x[11] <= 18436477:
+                        votes[2] += 1
+
+                    else:
+                        votes[0] += 1
+
+                else:
+                    if x[4] <= -1290066:
+                        votes[1] += 1
+
+                    else:
+                        votes[0] += 1
+
+        else:
+            if x[2] <= 252209:
+                if x[1] <= 1979:
+                    votes[0] += 1
+
+                else:
+                    if x[7] <= 139647:
+                        votes[2] += 1
+
+                    else:
+                        votes[0] += 1
+
+            else:
+                votes[1] += 1
+
+    else:
+        if x[9] <= 36006389:
+            votes[0] += 1
+
+        else:
+            if x[5] <= -2301645:
+                votes[0] += 1
+
+            else:
+                votes[1] += 1
+
+    # tree #2
+    if x[11] <= 23823729:
+        if x[8] <= 53233:
+            if x[2] <= -8079:
+                if x[8] <= -152645:
+                    votes[0] += 1
+
+                else:
+                    if x[8] <= 51849:
+                        votes[3] += 1
+
+                    else:
+                        votes[0] += 1
+
+            else:
+                if x[9] <= 12541293:
+                    votes[0] += 1
+
+                else:
+                    if x[9] <= 36963262:
+                        votes[2] += 1
+
+                    else:
+                        votes[1] += 1
+
+        else:
+            if x[10] <= 16603809:
+                if x[12] <= 828:
+                    votes[2] += 1
+
+                else:
+                    if x[7] <= 132307:
+                        votes[2] += 1
+
+                    else:
+                        votes[0] += 1
+
+            else:
+                if x[10] <= 200662704:
+                    if x[7] <= 350577:
+                        votes[2] += 1
+
+                    else:
+                        votes[0] += 1
+
+                else:
+                    if x[2] <= 168280:
+                        votes[3] += 1
+
+                    else:
+                        votes[1] += 1
+
+    else:
+        if x[7] <= 144915:
+            votes[1] += 1
+
+        else:
+            if x[12] <= 4956:
+                votes[0] += 1
+
+            else:
+                if x[7] <= 328979:
+                    votes[1] += 1
+
+                else:
+                    votes[0] += 1
+
+    # tree #3
+    if x[8] <= 41432:
+        if x[10] <= 18659911:
+            if x[7] <= -72665:
+                votes[3] += 1
+
+            else:
+                votes[0] += 1
+
+        else:
+            if x[7] <= -77066:
+                if x[9] <= 33874508:
+                    votes[3] += 1
+
+                else:
+                    votes[1] += 1
+
+            else:
+                if x[5] <= 1363281:
+                    if x[0] <= 29287:
+                        votes[3] += 1
+
+                    else:
+                        votes[2] += 1
+
+                else:
+                    votes[1] += 1
+
+    else:
+        if x[10] <= 158817308:
+            if x[7] <= 246892:
+                if x[1] <= -132471:
+                    votes[0] += 1
+
+                else:
+                    if x[2] <= 85074:
+                        votes[2] += 1
+
+                    else:
+                        votes[0] += 1
+
+            else:
+                votes[0] += 1
+
+        else:
+            if x[11] <= 4814701:
+                votes[3] += 1
+
+            else:
+                votes[1] += 1
+
+    # tree #4
+    if x[7] <= 253828:
+        if x[10] <= 59745506:
+            if x[10] <= 11747793:
+                if x[11] <= 604499:
+                    votes[2] += 1
+
+                else:
+                    if x[11] <= 1337507:
+                        votes[0] += 1
+
+                    else:
+                        votes[0] += 1
+
+            else:
+                if x[10] <= 24736309:
+                    if x[12] <= 2646:
+                        votes[2] += 1
+
+                    else:
+                        votes[3] += 1
+
+                else:
+                    votes[2] += 1
+
+        else:
+            if x[6] <= -310627:
+                if x[11] <= 35346083:
+                    if x[9] <= 34099674:
+                        votes[3] += 1
+
+                    else:
+                        votes[1] += 1
+
+                else:
+                    votes[1] += 1
+
+            else:
+                if x[11] <= 7580306:
+                    votes[3] += 1
+
+                else:
+                    votes[1] += 1
+
+    else:
+        if x[2] <= -71941:
+            if x[5] <= -503727:
+                if x[3] <= 420392:
+                    votes[3] += 1
+
+                else:
+                    votes[0] += 1
+
+            else:
+                votes[0] += 1
+
+        else:
+            if x[10] <= 267757892:
+                votes[0] += 1
+
+            else:
+                votes[1] += 1
+
+    # tree #5
+    if x[12] <= 5148:
+        if x[6] <= -394777:
+            if x[7] <= 84061:
+                if x[8] <= 34230:
+                    if x[5] <= 18104:
+                        votes[2] += 1
+
+                    else:
+                        votes[3] += 1
+
+                else:
+                    if x[6] <= -521837:
+                        votes[2] += 1
+
+                    else:
+                        votes[2] += 1
+
+            else:
+                if x[10] <= 90101549:
+                    if x[6] <= -480616:
+                        votes[2] += 1
+
+                    else:
+                        votes[0] += 1
+
+                else:
+                    votes[3] += 1
+
+        else:
+            if x[10] <= 26735991:
+                votes[0] += 1
+
+            else:
+                if x[6] <= -209340:
+                    if x[3] <= 302182:
+                        votes[3] += 1
+
+                    else:
+                        votes[2] += 1
+
+                else:
+                    votes[1] += 1
+
+    else:
+        if x[10] <= 53812311:
+            if x[12] <= 6453:
+                votes[3] += 1
+
+            else:
+                votes[0] += 1
+
+        else:
+            if x[9] <= 34833408:
+                votes[3] += 1
+
+            else:
+                votes[1] += 1
+
+    # tree #6
+    if x[2] <= 151000:
+        if x[8] <= 45553:
+            if x[10] <= 18659911:
+                if x[7] <= -76008:
+                    votes[3] += 1
+
+                else:
+                    votes[0] += 1
+
+            else:
+                if x[9] <= 41028538:
+                    if x[12] <= 2856:
+                        votes[3] += 1
+
+                    else:
+                        votes[3] += 1
+
+                else:
+                    votes[1] += 1
+
+        else:
+            if x[7] <= 242943:
+                if x[2] <= 91912:
+                    if x[12] <= 4744:
+                        votes[2] += 1
+
+                    else:
+                        votes[1] += 1
+
+                else:
+                    votes[0] += 1
+
+            else:
+                votes[0] += 1
+
+    else:
+        if x[9] <= 21612752:
+            votes[0] += 1
+
+        else:
+            votes[1] += 1
+
+    # tree #7
+    if x[7] <= 253828:
+        if x[4] <= 462325:
+            if x[4] <= -544195:
+                if x[1] <= -96114:
+                    votes[1] += 1
+
+                else:
+                    if x[12] <= 4266:
+                        votes[0] += 1
+
+                    else:
+                        votes[1] += 1
+
+            else:
+                if x[8] <= 41432:
+                    if x[10] <= 13195346:
+                        votes[0] += 1
+
+                    else:
+                        votes[3] += 1
+
+                else:
+                    if x[12] <= 4881:
+                        votes[2] += 1
+
+                    else:
+                        votes[1] += 1
+
+        else:
+            if x[10] <= 27038592:
+                votes[0] += 1
+
+            else:
+                votes[1] += 1
+
+    else:
+        if x[6] <= -448183:
+            if x[7] <= 276558:
+                votes[0] += 1
+
+            else:
+                if x[3] <= -361554:
+                    votes[1] += 1
+
+                else:
+                    votes[3] += 1
+
+        else:
+            if x[12] <= 3112:
+                votes[0] += 1
+
+            else:
+                if x[3] <= 109824:
+                    votes[0] += 1
+
+                else:
+                    if x[6] <= 12676:
+                        votes[3] += 1
+
+                    else:
+                        votes[0] += 1
+
+    # tree #8
+    if x[1] <= 152206:
+        if x[7] <= 259672:
+            if x[11] <= 23823729:
+                if x[0] <= 51288:
+                    if x[5] <= 49920:
+                        votes[2] += 1
+
+                    else:
+                        votes[3] += 1
+
+                else:
+                    votes[0] += 1
+
+            else:
+                if x[3] <= -605963:
+                    if x[9] <= 51344064:
+                        votes[0] += 1
+
+                    else:
+                        votes[1] += 1
+
+                else:
+                    if x[10] <= 38174928:
+                        votes[0] += 1
+
+                    else:
+                        votes[1] += 1
+
+        else:
+            if x[1] <= -24872:
+                votes[0] += 1
+
+            else:
+                if x[10] <= 160918782:
+                    votes[0] += 1
+
+                else:
+                    votes[3] += 1
+
+    else:
+        if x[9] <= 25359738:
+            votes[0] += 1
+
+        else:
+            votes[1] += 1
+
+    # tree #9
+    if x[7] <= 83268:
+        if x[12] <= 5216:
+            if x[8] <= 41831:
+                if x[2] <= 38665:
+                    votes[3] += 1
+
+                else:
+                    if x[6] <= -492727:
+                        votes[0] += 1
+
+                    else:
+                        votes[1] += 1
+
+            else:
+                if x[12] <= 4520:
+                    if x[6] <= -215335:
+                        votes[2] += 1
+
+                    else:
+                        votes[0] += 1
+
+                else:
+                    votes[1] += 1
+
+        else:
+            if x[12] <= 5603:
+                if x[9] <= 38760488:
+                    votes[3] += 1
+
+                else:
+                    votes[1] += 1
+
+            else:
+                votes[1] += 1
+
+    else:
+        if x[10] <= 85277712:
+            if x[10] <= 16014403:
+                if x[3] <= 372203:
+                    if x[7] <= 93312:
+                        votes[0] += 1
+
+                    else:
+                        votes[0] += 1
+
+                else:
+                    if x[3] <= 432107:
+                        votes[2] += 1
+
+                    else:
+                        votes[0] += 1
+
+            else:
+                if x[12] <= 3406:
+                    if x[6] <= -442201:
+                        votes[2] += 1
+
+                    else:
+                        votes[3] += 1
+
+                else:
+                    votes[0] += 1
+
+        else:
+            if x[5] <= 994938:
+                votes[3] += 1
+
+            else:
+                votes[1] += 1
+
+    # tree #10
+    if x[9] <= 38107137:
+        if x[2] <= -12244:
+            if x[1] <= -75624:
+                votes[0] += 1
+
+            else:
+                if x[10] <= 95242507:
+                    if x[8] <= 12932:
+                        votes[0] += 1
+
+                    else:
+                        votes[2] += 1
+
+                else:
+                    votes[3] += 1
+
+        else:
+            if x[7] <= 95620:
+                if x[2] <= -759:
+                    if x[9] <= 22825965:
+                        votes[2] += 1
+
+                    else:
+                        votes[3] += 1
+
+                else:
+                    if x[6] <= -457891:
+                        votes[2] += 1
+
+                    else:
+                        votes[2] += 1
+
+            else:
+                if x[10] <= 16603809:
+                    if x[8] <= 63030:
+                        votes[0] += 1
+
+                    else:
+                        votes[0] += 1
+
+                else:
+                    if x[6] <= -403392:
+                        votes[2] += 1
+
+                    else:
+                        votes[0] += 1
+
+    else:
+        if x[7] <= 167857:
+            votes[1] += 1
+
+        else:
+            if x[4] <= -509983:
+                votes[0] += 1
+
+            else:
+                votes[1] += 1
+
+    # return argmax of votes
+    classIdx = 0
+    maxVotes = votes[0]
+
+    for i in range(1, 4):
+        if votes[i] > maxVotes:
+            classIdx = i
+            maxVotes = votes[i]
+
+    return int(classIdx)
@@ -0,0 +1,72 @@
+from perf import ticks_us, ticks_diff, LatencyStats
+from lsm6dsox import FF_IA
+
+# Labels a provisional alert can be raised for, and the forest labels confirming one
+ALERT_LABELS = ('Crash', 'Falling')
+# Forest labels waited for after an alert before it is retracted (whole windows: the
+# window holding the event, or the next one when the event came late in a window)
+CONFIRM_WINDOWS = 2
+
+
+# Provisional crash/fall alerts from the sensor's free-fall and single-tap events (see
+# Adafruit_LSM6DSOX.load_event_settings), raised on the INT1 edge instead of after the
+# window holding the event is classified. The forest labels of the next windows then
+# confirm or retract the alert. clock gives the time the alert and confirm latencies are
+# measured in (ticks_us, or the simulated time on the host).
+class FastAlert:
+    def __init__(self, confirm_windows=CONFIRM_WINDOWS, clock=ticks_us):
+        self.confirm_windows = confirm_windows
+        self.clock = clock
+        self.pending = None
+        self.raised_us = 0
+        self.windows_left = 0
+        # INT1 edge to provisional alert, and alert to forest confirmation (the extra
+        # latency of the window path)
+        self.alert_latency = LatencyStats()
+        self.confirm_latency = LatencyStats()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.alerts = 0
+        self.confirmed = 0
+        self.retracted = 0
+        self.alert_latency.reset()
+        self.confirm_latency.reset()
+
+    # Read the latched events of the driver p after an INT1 edge. Returns the label of a
+    # new provisional alert, None without one (or while an alert is still pending).
+    # A single tap takes an accel slope above 3g (CRASH_TAP_THS) that drops back within
+    # 4 samples, its own threshold above the 0.75g wake-up/activity one of load_settings
+    # that road bumps cross. It is only flagged at the end of the impact, too late to
+    # check the accel peak.
+    def check(self, p):
+        events = p.read_events()
+        if not events or self.pending is not None:
+            return None
+        label = 'Falling' if events & FF_IA else 'Crash'
+        self.pending = label
+        self.raised_us = self.clock()
+        self.windows_left = self.confirm_windows
+        self.alerts += 1
+        self.alert_latency.add(ticks_diff(ticks_us(), p.irq_us))
+        return label
+
+    # Forest label of the next window. Returns 'confirmed' or 'retracted' once the
+    # pending alert is settled, None otherwise.
+    def settle(self, label):
+        if self.pending is None:
+            return None
+        if label in ALERT_LABELS:
+            self.confirm_latency.add(ticks_diff(self.clock(), self.raised_us))
+            self.pending = None
+            self.confirmed += 1
+            return 'confirmed'
+        self.windows_left -= 1
+        if self.windows_left > 0:
+            return None
+        self.pending = None
+        self.retracted += 1
+        return 'retracted'
+
+    def report(self):
+        return 'Alerts: {} raised, {} confirmed, {} retracted'.format(self.alerts, self.confirmed, self.retracted)
@@ -0,0 +1,198 @@
+# Usage: RUN ON PC (CPython with NumPy)
+#   python batch.py [received_data.csv] [-b backend] [-o predictions.csv] [-c]
+# Re-scores recorded windows in one go: the 13 features of every window as a NumPy
+# matrix and the forest of forest_model.py evaluated over all rows at once. Takes the
+# 209h rows BleWindows.py writes (batch number + 52 tagged words) or, without a file,
+# windows cut from a synthetic ride. -c checks every window against the scalar path
+# (calculate_kinematic_features and RandomForest.predict). -b picks the forest backend:
+# tables (default) or quickscorer, both NumPy over all rows, or row by row with
+# quickscorer-rows (quickscorer.predict) or predict (RandomForest.predict).
+import sys
+import numpy as np
+import RandomForest
+import features
+import forest_model
+import quickscorer
+import forest_tools
+from bench import tagged_windows, WINDOW_WORDS
+from lsm6dsox_sim import synthetic_trace
+from perf import ticks_us, ticks_diff
+
+
+# (N, 209) BleWindows.py rows as an (N, 52, 4) array of [tag, x, y, z] words
+def windows_from_rows(rows):
+    rows = np.asarray(rows, dtype=np.int64)
+    return rows[:, 1:].reshape(len(rows), WINDOW_WORDS, 4)
+
+
+def load_rows(path):
+    return np.loadtxt(path, delimiter=',', dtype=np.int64, ndmin=2)
+
+
+# Mean of the selected samples per window, 0.0 where none are selected
+def masked_mean(values, mask):
+    n = mask.sum(axis=1)
+    sums = (values * mask[..., None]).sum(axis=1)
+    return np.where(n[:, None] > 0, sums / np.maximum(n, 1)[:, None], 0.0)
+
+
+# Largest squared magnitude of the selected samples per window, 0 where none are selected
+def masked_max_sq(values, mask):
+    sq = (values * values).sum(axis=2)
+    return np.where(mask, sq, 0).max(axis=1)
+
+
+# Feature matrix (N, 13) in FEATURE_NAMES order of an (N, samples, 4) array of tagged
+# words, equal to calculate_kinematic_features window by window: the sums are exact
+# int64 and every division or sqrt is a single correctly rounded float64 operation,
+# as in the scalar path.
+def batch_features(windows):
+    words = np.asarray(windows, dtype=np.int64)
+    count = len(words)
+    tag = words[..., 0]
+    xyz = words[..., 1:]
+    accel = tag == 1
+    gyro = tag == 2
+    out = np.zeros((count, features.NUM_FEATURES))
+    out[:, 0:3] = masked_mean(xyz, accel)
+    out[:, 6:9] = masked_mean(xyz, gyro)
+    out[:, 9] = np.sqrt(masked_max_sq(xyz, accel))
+    out[:, 10] = np.sqrt(masked_max_sq(xyz, gyro))
+    out[:, 12] = np.where(accel, np.abs(xyz[..., 2]), 0).max(axis=1)
+
+    # Accel samples moved to the front of each window in their FIFO order
+    n = accel.sum(axis=1)
+    order = np.argsort(~accel, axis=1, kind='stable')
+    samples = np.take_along_axis(xyz, order[..., None], axis=1)
+    rows = np.arange(count)
+    first = samples[:, 0]
+    last = samples[rows, np.maximum(n - 1, 0)]
+    # The jerk sum telescopes to (last - first) * JERK_RATE over n - 1 differences
+    out[:, 3:6] = np.where(n[:, None] >= 2,
+                           (last - first) * features.JERK_RATE / np.maximum(n - 1, 1)[:, None], 0.0)
+    diff = samples[:, 1:] - samples[:, :-1]
+    valid = np.arange(diff.shape[1])[None, :] < (n - 1)[:, None]
+    out[:, 11] = np.sqrt(masked_max_sq(diff, valid) * (features.JERK_RATE * features.JERK_RATE))
+    return out
+
+
+# Vote counts (N, classes) of the forest_model.py tables for every row of x, all rows
+# stepping down each tree together
+def batch_votes(x, model=forest_model):
+    x = np.asarray(x, dtype=np.float64)
+    feature = np.asarray(model.FEATURE, dtype=np.int64)
+    threshold = np.asarray(model.THRESHOLD, dtype=np.float64)
+    right = np.asarray(model.RIGHT, dtype=np.int64)
+    rows = np.arange(len(x))
+    votes = np.zeros((len(x), model.NUM_CLASSES), dtype=np.int64)
+    for root in model.ROOTS:
+        node = np.full(len(x), root, dtype=np.int64)
+        f = feature[node]
+        while (f >= 0).any():
+            split = f >= 0
+            left = x[rows, np.maximum(f, 0)] <= threshold[node]
+            node = np.where(split, np.where(left, node + 1, right[node]), node)
+            f = feature[node]
+        votes[rows, right[node]] += 1
+    return votes
+
+
+# Class index of every row, as RandomForest.predict (argmax keeps the lowest index on a tie)
+def batch_predict(x, model=forest_model):
+    return batch_votes(x, model).argmax(axis=1)
+
+
+# QuickScorer over all rows at once: each node of each feature, in threshold order,
+# ANDs its leaf mask into the tree bitvector of the rows for which it is false
+def quickscorer_predict(x, scorer=None):
+    if scorer is None:
+        scorer = quickscorer.QuickScorer(forest_tools.load_trees())
+    x = np.asarray(x, dtype=np.float64)
+    if max(len(leaves) for leaves in scorer.leaf_class) > 63:
+        raise ValueError('Trees with more than 63 leaves do not fit an int64 bitvector')
+    masks = np.tile(np.array(scorer.full, dtype=np.int64), (len(x), 1))
+    for feature, thresholds, tree_ids, node_masks in scorer.features:
+        column = x[:, feature]
+        for threshold, t, mask in zip(thresholds, tree_ids, node_masks):
+            masks[:, t] &= np.where(column > threshold, mask, -1)
+    # Exit leaf: the lowest set bit, frexp gives its position exactly
+    leaf = np.frexp((masks & -masks).astype(np.float64))[1] - 1
+    width = max(len(leaves) for leaves in scorer.leaf_class)
+    leaf_class = np.array([leaves + [0] * (width - len(leaves)) for leaves in scorer.leaf_class], dtype=np.int64)
+    classes = leaf_class[np.arange(len(scorer.leaf_class))[None, :], leaf]
+    votes = np.zeros((len(x), scorer.num_classes), dtype=np.int64)
+    for c in range(scorer.num_classes):
+        votes[:, c] = (classes == c).sum(axis=1)
+    return votes.argmax(axis=1)
+
+
+# Row by row with the predict function of a scalar backend
+def rows_predict(x, predict):
+    return np.array([predict(row) for row in x.tolist()], dtype=np.int64)
+
+
+BACKENDS = {
+    'tables': batch_predict,
+    'quickscorer': quickscorer_predict,
+    'quickscorer-rows': lambda x: rows_predict(x, quickscorer.predict),
+    'predict': lambda x: rows_predict(x, RandomForest.predict),
+}
+
+
+# Windows where the batch features or labels differ from the scalar path
+def check(windows, x, labels):
+    mismatches = []
+    for i, window in enumerate(np.asarray(windows).reshape(len(windows), -1).tolist()):
+        ref = RandomForest.calculate_kinematic_features(window)
+        ref = [ref[name] for name in features.FEATURE_NAMES]
+        if ref != x[i].tolist() or RandomForest.predict(ref) != labels[i]:
+            mismatches.append(i)
+    return mismatches
+
+
+def main(argv):
+    path = out = None
+    backend = 'tables'
+    verify = False
+    i = 0
+    while i < len(argv):
+        if argv[i] == '-o':
+            out = argv[i + 1]
+            i += 1
+        elif argv[i] == '-b':
+            backend = argv[i + 1]
+            i += 1
+        elif argv[i] == '-c':
+            verify = True
+        else:
+            path = argv[i]
+        i += 1
+    if path:
+        windows = windows_from_rows(load_rows(path))
+    else:
+        windows = np.array(tagged_windows(*synthetic_trace(600)), dtype=np.int64).reshape(-1, WINDOW_WORDS, 4)
+
+    start = ticks_us()
+    x = batch_features(windows)
+    labels = BACKENDS[backend](x)
+    elapsed = ticks_diff(ticks_us(), start)
+    print('Windows: {}, features and prediction ({}) in {:.1f} ms, {:.0f} windows/s'.format(
+        len(windows), backend, elapsed / 1000, len(windows) * 1000000 / max(elapsed, 1)))
+    for idx in range(forest_model.NUM_CLASSES):
+        print('  {:8s} {}'.format(RandomForest.idxToLabel(idx), int((labels == idx).sum())))
+    if out:
+        with open(out, 'w') as f:
+            f.write('window,class\n')
+            for i, label in enumerate(labels):
+                f.write('{},{}\n'.format(i, label))
+    if verify:
+        start = ticks_us()
+        mismatches = check(windows, x, labels)
+        print('Compared with the scalar path ({:.1f} ms): {} mismatches'.format(
+            ticks_diff(ticks_us(), start) / 1000, len(mismatches)))
+        if mismatches:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
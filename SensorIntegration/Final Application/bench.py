@@ -0,0 +1,350 @@
+# Usage: RUN ON PC (CPython or the MicroPython unix port)
+#   python bench.py features
+#   micropython bench.py features
+# Per-window timing of the acquisition and inference stages on windows cut from a
+# synthetic ride (or a trace passed with -t trace.csv).
+import sys
+import gc
+import RandomForest
+import RandomForestFixed
+import features
+from forest import ArrayForest, load_model
+from imu_ring import IMURing
+from perf import ticks_us, ticks_diff
+from lsm6dsox_sim import load_trace, synthetic_trace, TAG_XL_NC, TAG_GYRO_NC
+
+# Words per window, as set by the FIFO watermark
+WINDOW_WORDS = 52
+
+
+# Cut the trace into flat [tag, x, y, z, ...] windows as read_data produced them
+def tagged_windows(accel, gyro):
+    windows = []
+    half = WINDOW_WORDS // 2
+    for start in range(0, len(accel) - half + 1, half):
+        window = []
+        for k in range(start, start + half):
+            window += [TAG_GYRO_NC] + list(gyro[k])
+            window += [TAG_XL_NC] + list(accel[k])
+        windows.append(window)
+    return windows
+
+
+# Mean microseconds per call of fn over every window, repeated rounds times,
+# and the heap allocated per call where the port can tell (MicroPython)
+def time_per_window(fn, windows, rounds=5):
+    fn(windows[0])
+    gc.collect()
+    alloc = gc.mem_alloc() if hasattr(gc, 'mem_alloc') else None
+    start = ticks_us()
+    for _ in range(rounds):
+        for window in windows:
+            fn(window)
+    elapsed = ticks_diff(ticks_us(), start)
+    calls = rounds * len(windows)
+    per_call = None
+    if alloc is not None:
+        per_call = (gc.mem_alloc() - alloc) // calls
+    return elapsed / calls, per_call
+
+
+def report(name, result, baseline=None):
+    us, alloc = result
+    line = '  {:32s} {:9.1f} us/window'.format(name, us)
+    if baseline:
+        line += '  {:5.2f}x'.format(baseline[0] / us)
+    if alloc is not None:
+        line += '  {} bytes allocated'.format(alloc)
+    print(line)
+
+
+def bench_features(accel, gyro):
+    windows = tagged_windows(accel, gyro)
+    out = [0.0] * features.NUM_FEATURES
+    ring = IMURing(WINDOW_WORDS * 2)
+    for window in windows:
+        for i in range(0, len(window), 4):
+            ring.push(window[i], window[i + 1], window[i + 2], window[i + 3])
+    slot = ring.end_window()
+    # The ring slot is reused for every call, only its contents matter for timing
+    ring.accel_start[slot] = ring.gyro_start[slot] = 0
+    ring.accel_count[slot] = ring.gyro_count[slot] = WINDOW_WORDS // 2
+
+    for window in windows:
+        ref = [RandomForest.calculate_kinematic_features(window)[name] for name in features.FEATURE_NAMES]
+        if features.stream_features(window, out) != ref:
+            print('Feature mismatch on window', window[:8])
+            return
+    print('Feature extraction, {} windows of {} words:'.format(len(windows), WINDOW_WORDS))
+    base = time_per_window(RandomForest.calculate_kinematic_features, windows)
+    report('calculate_kinematic_features', base)
+    report('stream_features', time_per_window(lambda w: features.stream_features(w, out), windows), base)
+    report('ring_features', time_per_window(lambda w: features.ring_features(ring, slot, out), windows), base)
+
+
+# Cost of one classification every hop samples: recomputing the whole window
+# versus updating SlidingFeatures with the hop, for 1 s and 2.5 s windows
+def bench_sliding(accel, gyro, hop=6):
+    for window in (WINDOW_WORDS // 2, 65):
+        bench_sliding_window(accel, gyro, window, hop)
+
+
+def bench_sliding_window(accel, gyro, window, hop):
+    out = [0.0] * features.NUM_FEATURES
+    ring = IMURing(len(accel) + window)
+    for k in range(len(accel)):
+        ring.push(TAG_GYRO_NC, gyro[k][0], gyro[k][1], gyro[k][2])
+        ring.push(TAG_XL_NC, accel[k][0], accel[k][1], accel[k][2])
+    slot = ring.end_window()
+    hops = list(range(window, len(accel) - hop, hop))
+
+    def full(start):
+        ring.accel_start[slot] = ring.gyro_start[slot] = start + hop - window
+        ring.accel_count[slot] = ring.gyro_count[slot] = window
+        return features.ring_features(ring, slot, out)
+
+    sliding = features.SlidingFeatures(window)
+
+    def incremental(start):
+        ring.accel_start[slot] = ring.gyro_start[slot] = start
+        ring.accel_count[slot] = ring.gyro_count[slot] = hop
+        features.ring_feed(ring, slot, sliding)
+        return sliding.features(out)
+
+    # Warm the sliding window up to the first hop and check both agree
+    ring.accel_start[slot] = ring.gyro_start[slot] = 0
+    ring.accel_count[slot] = ring.gyro_count[slot] = window - hop
+    features.ring_feed(ring, slot, sliding)
+    for start in hops:
+        if list(incremental(start - hop)) != list(full(start - hop)):
+            print('Sliding mismatch at sample', start)
+            return
+    print('Sliding window of {} samples per sensor, hop of {} samples:'.format(window, hop))
+    base = time_per_window(full, hops, 1)
+    report('full window per hop', base)
+    sliding.reset()
+    report('SlidingFeatures per hop', time_per_window(incremental, hops, 1), base)
+
+
+# Float features and RandomForest versus integer features and RandomForestFixed,
+# from the drained window to the class index
+def bench_fixed(accel, gyro):
+    windows = tagged_windows(accel, gyro)
+    out = [0.0] * features.NUM_FEATURES
+    fixed_out = [0] * features.NUM_FEATURES
+    disagree = 0
+    for window in windows:
+        features.stream_features(window, out)
+        features.stream_features(window, fixed_out, True)
+        if RandomForest.predict(out) != RandomForestFixed.predict(fixed_out):
+            disagree += 1
+    print('Features and prediction, {} windows, {} disagreements:'.format(len(windows), disagree))
+    base = time_per_window(lambda w: RandomForest.predict(features.stream_features(w, out)), windows)
+    report('float', base)
+    report('fixed point', time_per_window(
+        lambda w: RandomForestFixed.predict(features.stream_features(w, fixed_out, True)), windows), base)
+
+
+# Compile and run a module from source as an import on the device does (no .mpy),
+# returning the microseconds taken and the heap it keeps (None if unknown)
+def load_module(path):
+    with open(path) as f:
+        source = f.read()
+    gc.collect()
+    tracemalloc = None
+    if hasattr(gc, 'mem_alloc'):
+        before = gc.mem_alloc()
+    else:
+        try:
+            import tracemalloc
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+        except ImportError:
+            before = None
+    start = ticks_us()
+    module = {'__name__': path}
+    exec(compile(source, path, 'exec'), module)
+    us = ticks_diff(ticks_us(), start)
+    source = None
+    gc.collect()
+    kept = None
+    if tracemalloc:
+        kept = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+    elif before is not None:
+        kept = gc.mem_alloc() - before
+    return us, kept, module
+
+
+# RandomForest.predict versus ArrayForest on the same feature vectors: agreement,
+# load cost of the model module and latency per prediction
+def bench_forest(accel, gyro):
+    windows = tagged_windows(accel, gyro)
+    vectors = [list(features.stream_features(w, [0.0] * features.NUM_FEATURES)) for w in windows]
+    fixed_vectors = [list(features.stream_features(w, [0] * features.NUM_FEATURES, True)) for w in windows]
+    forest = ArrayForest()
+    fixed_forest = ArrayForest(fixed=True)
+    early_forest = ArrayForest(fixed=True, early_exit=True)
+    binned_forest = ArrayForest(binned=True)
+    binned_fixed_forest = ArrayForest(fixed=True, binned=True)
+    disagree = 0
+    for x, fx in zip(vectors, fixed_vectors):
+        ref = RandomForest.predict(x)
+        fixed_ref = RandomForestFixed.predict(fx)
+        if (forest.predict(x) != ref or binned_forest.predict(x) != ref or fixed_forest.predict(fx) != fixed_ref
+                or early_forest.predict(fx) != fixed_ref or binned_fixed_forest.predict(fx) != fixed_ref):
+            disagree += 1
+    print('Forest engines, {} windows, {} disagreements:'.format(len(windows), disagree))
+    for path in ('RandomForest.py', 'RandomForestFixed.py', 'forest_model.py'):
+        us, kept, _ = load_module(path)
+        line = '  load {:27s} {:9.0f} us'.format(path, us)
+        if kept is not None:
+            line += '  {} bytes kept'.format(kept)
+        print(line)
+    base = time_per_window(RandomForest.predict, vectors)
+    report('RandomForest.predict', base)
+    report('ArrayForest.predict', time_per_window(forest.predict, vectors), base)
+    report('RandomForestFixed.predict', time_per_window(RandomForestFixed.predict, fixed_vectors), base)
+    report('ArrayForest(fixed).predict', time_per_window(fixed_forest.predict, fixed_vectors), base)
+    report('ArrayForest(binned).predict', time_per_window(binned_forest.predict, vectors), base)
+    report('ArrayForest(fixed, binned)', time_per_window(binned_fixed_forest.predict, fixed_vectors), base)
+    early = ArrayForest(fixed=True, early_exit=True)
+    report('ArrayForest(fixed, early exit)', time_per_window(early.predict, fixed_vectors), base)
+    print('  early exit evaluates {:.2f} of {} trees per window'.format(early.mean_trees(), len(early.roots)))
+
+
+# Whole-window features and prediction against LazyFeatures, which only computes the
+# features the visited tree nodes read
+def bench_lazy(accel, gyro):
+    window = WINDOW_WORDS // 2
+    ring = IMURing(len(accel))
+    for k in range(len(accel)):
+        ring.push(TAG_GYRO_NC, gyro[k][0], gyro[k][1], gyro[k][2])
+        ring.push(TAG_XL_NC, accel[k][0], accel[k][1], accel[k][2])
+    slot = ring.end_window()
+    starts = list(range(0, len(accel) - window + 1, window))
+
+    def bind(start):
+        ring.accel_start[slot] = ring.gyro_start[slot] = start
+        ring.accel_count[slot] = ring.gyro_count[slot] = window
+
+    out = [0] * features.NUM_FEATURES
+    lazy = features.LazyFeatures(fixed=True)
+    forest = ArrayForest(fixed=True, early_exit=True)
+    for start in starts:
+        bind(start)
+        features.ring_features(ring, slot, out, True)
+        if RandomForestFixed.predict(lazy.bind(ring, slot)) != RandomForestFixed.predict(out):
+            print('Lazy mismatch at sample', start)
+            return
+
+    def full(start):
+        bind(start)
+        return RandomForestFixed.predict(features.ring_features(ring, slot, out, True))
+
+    def on_demand(start):
+        bind(start)
+        return RandomForestFixed.predict(lazy.bind(ring, slot))
+
+    def full_forest(start):
+        bind(start)
+        return forest.predict(features.ring_features(ring, slot, out, True))
+
+    def on_demand_forest(start):
+        bind(start)
+        return forest.predict(lazy.bind(ring, slot))
+
+    print('Fixed-point features and prediction, {} windows of {} samples per sensor:'.format(len(starts), window))
+    base = time_per_window(full, starts)
+    report('ring_features + predict', base)
+    lazy.reset_stats()
+    report('LazyFeatures + predict', time_per_window(on_demand, starts), base)
+    print('  {:.2f} of {} features computed per window'.format(lazy.mean_computed(), features.NUM_FEATURES))
+    report('ring_features + ArrayForest', time_per_window(full_forest, starts), base)
+    lazy.reset_stats()
+    report('LazyFeatures + ArrayForest', time_per_window(on_demand_forest, starts), base)
+    print('  {:.2f} of {} features computed per window (early exit)'.format(lazy.mean_computed(), features.NUM_FEATURES))
+
+
+# Time from nothing loaded to the first label for each way of shipping the model:
+# the generated RandomForest.py, the forest_model.py tables and forest.bin
+def bench_boot(accel, gyro):
+    x = features.stream_features(tagged_windows(accel, gyro)[0], [0.0] * features.NUM_FEATURES)
+    print('Model load to first inference:')
+    us, kept, module = load_module('RandomForest.py')
+    start = ticks_us()
+    module['predict'](x)
+    report_boot('RandomForest.py', us + ticks_diff(ticks_us(), start), kept)
+    us, kept, module = load_module('forest_model.py')
+    start = ticks_us()
+    ArrayForest(ModuleTables(module)).predict(x)
+    report_boot('forest_model.py', us + ticks_diff(ticks_us(), start), kept)
+    try:
+        gc.collect()
+        start = ticks_us()
+        ArrayForest(load_model('forest.bin')).predict(x)
+        report_boot('forest.bin', ticks_diff(ticks_us(), start), None)
+    except OSError:
+        print('  no forest.bin, run forest_tools.py binary')
+
+
+# Globals of a module run by load_module as attributes
+class ModuleTables:
+    def __init__(self, module):
+        for name in module:
+            setattr(self, name, module[name])
+
+
+def report_boot(name, us, kept):
+    line = '  {:32s} {:9.0f} us'.format(name, us)
+    if kept is not None:
+        line += '  {} bytes kept'.format(kept)
+    print(line)
+
+
+# Host scoring throughput of the forest backends on precomputed feature vectors
+# (CPython only, the model is parsed with forest_tools)
+def bench_quickscorer(accel, gyro):
+    import forest_tools
+    from quickscorer import QuickScorer
+    vectors = forest_tools.trace_vectors(accel, gyro)
+    scorer = QuickScorer(forest_tools.load_trees())
+    forest = ArrayForest()
+    disagree = sum(1 for x in vectors if scorer.predict(x) != RandomForest.predict(x))
+    print('Forest backends, {} windows, {} disagreements:'.format(len(vectors), disagree))
+    for name, predict in (('RandomForest.predict', RandomForest.predict),
+                          ('ArrayForest.predict', forest.predict),
+                          ('QuickScorer.predict', scorer.predict)):
+        us = time_per_window(predict, vectors)[0]
+        print('  {:32s} {:9.0f} windows/s'.format(name, 1000000 / us))
+
+
+BENCHMARKS = {
+    'boot': bench_boot,
+    'features': bench_features,
+    'fixed': bench_fixed,
+    'forest': bench_forest,
+    'lazy': bench_lazy,
+    'quickscorer': bench_quickscorer,
+    'sliding': bench_sliding,
+}
+
+
+def main(argv):
+    trace = None
+    names = []
+    i = 0
+    while i < len(argv):
+        if argv[i] == '-t':
+            trace = argv[i + 1]
+            i += 1
+        else:
+            names.append(argv[i])
+        i += 1
+    accel, gyro = load_trace(trace) if trace else synthetic_trace(600)
+    for name in names or sorted(BENCHMARKS):
+        BENCHMARKS[name](accel, gyro)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
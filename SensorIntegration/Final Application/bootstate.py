@@ -0,0 +1,69 @@
+try:
+    from machine import RTC, reset_cause, DEEPSLEEP_RESET
+except ImportError:
+    # CPython / unix port, sim_run.py keeps the packed state itself
+    RTC = None
+import struct
+
+# State kept in RTC memory across deep sleep (cleared by a power-on reset), little endian:
+# a header, then the sensor's configuration image (Adafruit_LSM6DSOX.shadow_image).
+BOOT_MAGIC = b'SCHB'
+BOOT_VERSION = 1
+# magic, version, flags, rate profile, reserved, warm boots, last cold and warm boot to
+# first prediction in ms, image length
+BOOT_HEADER = '<4sBBBBHHHH'
+BOOT_HEADER_SIZE = 16
+# flags: the MLC program (.ucf) is loaded
+FLAG_MLC = 0x01
+
+
+# What a warm boot needs to pick up where the MCU went to deep sleep
+class BootState:
+    def __init__(self, data=None):
+        self.flags = 0
+        self.profile = 0
+        self.warm_boots = 0
+        self.cold_ms = 0
+        self.warm_ms = 0
+        self.image = b''
+        self.valid = False
+        if data and len(data) >= BOOT_HEADER_SIZE:
+            magic, version, flags, profile, _, boots, cold_ms, warm_ms, size = struct.unpack(
+                BOOT_HEADER, data[:BOOT_HEADER_SIZE])
+            if magic == BOOT_MAGIC and version == BOOT_VERSION and len(data) >= BOOT_HEADER_SIZE + size:
+                self.flags = flags
+                self.profile = profile
+                self.warm_boots = boots
+                self.cold_ms = cold_ms
+                self.warm_ms = warm_ms
+                self.image = bytes(data[BOOT_HEADER_SIZE:BOOT_HEADER_SIZE + size])
+                self.valid = True
+
+    def pack(self):
+        return struct.pack(BOOT_HEADER, BOOT_MAGIC, BOOT_VERSION, self.flags, self.profile, 0,
+                           self.warm_boots & 0xFFFF, min(self.cold_ms, 0xFFFF), min(self.warm_ms, 0xFFFF),
+                           len(self.image)) + self.image
+
+    # Boot to first prediction of this boot, kept for the next ones
+    def first_prediction(self, ms, warm):
+        if warm:
+            self.warm_ms = ms
+        else:
+            self.cold_ms = ms
+
+    def report(self, ms, warm):
+        return 'Boot to first prediction: {} ms ({} boot, last cold {} ms, last warm {} ms)'.format(
+            ms, 'warm' if warm else 'cold', self.cold_ms, self.warm_ms)
+
+
+# State saved before the last deep sleep, and whether this boot is a wake from it
+def load_rtc():
+    state = BootState(RTC().memory())
+    warm = state.valid and reset_cause() == DEEPSLEEP_RESET
+    if warm:
+        state.warm_boots += 1
+    return state, warm
+
+
+def save_rtc(state):
+    RTC().memory(state.pack())
@@ -0,0 +1,697 @@
+import math
+from array import array
+from imu_ring import TS_TICK_US
+
+# Order of the feature vector passed to RandomForest.predict
+FEATURE_NAMES = (
+    'accel_x_mean', 'accel_y_mean', 'accel_z_mean',
+    'jerk_x_mean', 'jerk_y_mean', 'jerk_z_mean',
+    'gyro_x_mean', 'gyro_y_mean', 'gyro_z_mean',
+    'accel_peak', 'gyro_peak', 'jerk_peak', 'accel_z_peak',
+)
+NUM_FEATURES = 13
+
+# Sample rate the jerk is scaled by, as in calculate_kinematic_features
+JERK_RATE = 26
+# Nominal sample period of JERK_RATE. Samples with FIFO timestamps (add_accel with dt)
+# use the time they really are apart instead, so the jerk stays per second whatever the
+# ODR or jitter, and the jerk_peak difference is scaled back to this period.
+JERK_PERIOD_US = 1000000 / JERK_RATE
+# Fixed-point sample rate 1000000 / dt in Q DT_Q
+DT_Q = 8
+RATE_FIXED = 1000000 << DT_Q
+
+# Fixed-point features (fixed=True), matching the thresholds of RandomForestFixed.py:
+# means in Q MEAN_Q, accel/gyro peaks as squared magnitudes, jerk_peak as the squared
+# magnitude of the sample difference (without JERK_RATE) and accel_z_peak in LSB.
+# Components are clipped to +/-SQ_CLIP before squaring so every value stays a small
+# int on the ESP32, all peak thresholds of the model lie below the clip level. Clipping
+# only changes a squared magnitude above SQ_CLIP_SQ, so it is only done for those.
+MEAN_Q = 8
+SQ_CLIP = 16384
+SQ_CLIP_SQ = SQ_CLIP * SQ_CLIP
+
+
+def sq_clipped(x, y, z):
+    if x > SQ_CLIP:
+        x = SQ_CLIP
+    elif x < -SQ_CLIP:
+        x = -SQ_CLIP
+    if y > SQ_CLIP:
+        y = SQ_CLIP
+    elif y < -SQ_CLIP:
+        y = -SQ_CLIP
+    if z > SQ_CLIP:
+        z = SQ_CLIP
+    elif z < -SQ_CLIP:
+        z = -SQ_CLIP
+    return x * x + y * y + z * z
+
+
+# floor(total / n) in Q MEAN_Q without overflowing a small int
+def fixed_mean(total, n):
+    if n <= 0:
+        return 0
+    q = total // n
+    r = total - q * n
+    return (q << MEAN_Q) + (r << MEAN_Q) // n
+
+
+# Mean jerk of the accel difference delta over n sample intervals that took span_us,
+# or n nominal periods with span_us 0 (calculate_kinematic_features)
+def jerk_mean(delta, n, span_us, fixed):
+    if fixed:
+        if span_us and n > 0:
+            return fixed_mean(delta * (RATE_FIXED // (span_us // n)), n) >> DT_Q
+        return fixed_mean(delta * JERK_RATE, n)
+    if n <= 0:
+        return 0.0
+    if span_us:
+        return delta * 1000000 / span_us
+    return delta * JERK_RATE / n
+
+
+# Squared difference of two samples dt_us apart as over the nominal JERK_PERIOD_US
+def timed_jerk_sq(dx, dy, dz, dt_us, fixed):
+    if fixed:
+        # Magnitudes only, so the floor division rounds both signs the same way
+        rate = RATE_FIXED // dt_us
+        scale = JERK_RATE << DT_Q
+        dx = (dx if dx >= 0 else -dx) * rate // scale
+        dy = (dy if dy >= 0 else -dy) * rate // scale
+        dz = (dz if dz >= 0 else -dz) * rate // scale
+        sq = dx * dx + dy * dy + dz * dz
+        if sq > SQ_CLIP_SQ:
+            sq = sq_clipped(dx, dy, dz)
+        return sq
+    s = JERK_PERIOD_US / dt_us
+    return (dx * dx + dy * dy + dz * dz) * (s * s)
+
+
+# Single pass accumulator for the 13 kinematic features. Samples are added one at a
+# time (in FIFO order per sensor) and every mean, peak and accel_z_peak is updated in
+# place, so nothing is allocated per sample. features() gives the same values as
+# RandomForest.calculate_kinematic_features on the same samples: means come from integer
+# sums (the jerk sums telescope to last - first sample), peaks from the largest squared
+# magnitude, which sqrt maps to the same float as the largest magnitude.
+# With fixed set, features() writes the integer features described at MEAN_Q instead.
+class KinematicAccumulator:
+    def __init__(self, fixed=False):
+        self.fixed = fixed
+        self.reset()
+
+    def reset(self):
+        self.accel_n = 0
+        self.ax = self.ay = self.az = 0
+        self.accel_sq = 0
+        self.z_peak = 0
+        self.jerk_sq = 0
+        self.fx = self.fy = self.fz = 0
+        self.px = self.py = self.pz = 0
+        self.span_us = 0
+        self.gyro_n = 0
+        self.gx = self.gy = self.gz = 0
+        self.gyro_sq = 0
+
+    def add(self, tag, x, y, z):
+        if tag == 1:
+            self.add_accel(x, y, z)
+        elif tag == 2:
+            self.add_gyro(x, y, z)
+
+    # dt is the time in us since the previous accel sample (FIFO timestamps), 0 for the
+    # nominal 1/JERK_RATE
+    def add_accel(self, x, y, z, dt=0):
+        self.ax += x
+        self.ay += y
+        self.az += z
+        sq = x * x + y * y + z * z
+        if sq > SQ_CLIP_SQ and self.fixed:
+            sq = sq_clipped(x, y, z)
+        if sq > self.accel_sq:
+            self.accel_sq = sq
+        if z > self.z_peak:
+            self.z_peak = z
+        elif -z > self.z_peak:
+            self.z_peak = -z
+        if self.accel_n:
+            dx = x - self.px
+            dy = y - self.py
+            dz = z - self.pz
+            if dt:
+                self.span_us += dt
+                sq = timed_jerk_sq(dx, dy, dz, dt, self.fixed)
+            else:
+                sq = dx * dx + dy * dy + dz * dz
+                if sq > SQ_CLIP_SQ and self.fixed:
+                    sq = sq_clipped(dx, dy, dz)
+            if sq > self.jerk_sq:
+                self.jerk_sq = sq
+        else:
+            self.fx = x
+            self.fy = y
+            self.fz = z
+        self.px = x
+        self.py = y
+        self.pz = z
+        self.accel_n += 1
+
+    def add_gyro(self, x, y, z):
+        self.gx += x
+        self.gy += y
+        self.gz += z
+        sq = x * x + y * y + z * z
+        if sq > SQ_CLIP_SQ and self.fixed:
+            sq = sq_clipped(x, y, z)
+        if sq > self.gyro_sq:
+            self.gyro_sq = sq
+        self.gyro_n += 1
+
+    # Write the feature vector (FEATURE_NAMES order) into out
+    def features(self, out):
+        if self.fixed:
+            return self.fixed_features(out)
+        n = self.accel_n
+        if n:
+            out[0] = self.ax / n
+            out[1] = self.ay / n
+            out[2] = self.az / n
+        else:
+            out[0] = out[1] = out[2] = 0.0
+        out[3] = jerk_mean(self.px - self.fx, n - 1, self.span_us, False)
+        out[4] = jerk_mean(self.py - self.fy, n - 1, self.span_us, False)
+        out[5] = jerk_mean(self.pz - self.fz, n - 1, self.span_us, False)
+        n = self.gyro_n
+        if n:
+            out[6] = self.gx / n
+            out[7] = self.gy / n
+            out[8] = self.gz / n
+        else:
+            out[6] = out[7] = out[8] = 0.0
+        out[9] = math.sqrt(self.accel_sq)
+        out[10] = math.sqrt(self.gyro_sq)
+        out[11] = math.sqrt(self.jerk_sq * JERK_RATE * JERK_RATE)
+        out[12] = self.z_peak
+        return out
+
+    def fixed_features(self, out):
+        n = self.accel_n
+        out[0] = fixed_mean(self.ax, n)
+        out[1] = fixed_mean(self.ay, n)
+        out[2] = fixed_mean(self.az, n)
+        out[3] = jerk_mean(self.px - self.fx, n - 1, self.span_us, True)
+        out[4] = jerk_mean(self.py - self.fy, n - 1, self.span_us, True)
+        out[5] = jerk_mean(self.pz - self.fz, n - 1, self.span_us, True)
+        n = self.gyro_n
+        out[6] = fixed_mean(self.gx, n)
+        out[7] = fixed_mean(self.gy, n)
+        out[8] = fixed_mean(self.gz, n)
+        out[9] = self.accel_sq
+        out[10] = self.gyro_sq
+        out[11] = self.jerk_sq
+        out[12] = self.z_peak
+        return out
+
+
+_accumulator = KinematicAccumulator()
+_fixed_accumulator = KinematicAccumulator(fixed=True)
+
+
+# Drop-in for RandomForest.calculate_kinematic_features on a flat [tag, x, y, z, ...]
+# list, returning the feature vector instead of a dict
+def stream_features(second_data, out, fixed=False):
+    acc = _fixed_accumulator if fixed else _accumulator
+    acc.reset()
+    for i in range(0, len(second_data) - 3, 4):
+        acc.add(second_data[i], second_data[i + 1], second_data[i + 2], second_data[i + 3])
+    return acc.features(out)
+
+
+# Feed the samples of one ring window to anything with add_accel/add_gyro
+# (KinematicAccumulator, SlidingFeatures), with the accel sample spacing when the ring
+# holds FIFO timestamps
+def ring_feed(ring, slot, acc):
+    cap3 = 3 * ring.capacity
+
+    a = ring.accel
+    k = ring.accel_start[slot]
+    i = 3 * k
+    if ring.timed:
+        ts = ring.accel_ts
+        for _ in range(ring.accel_count[slot]):
+            acc.add_accel(a[i], a[i + 1], a[i + 2], ring.dt_us(ts, k))
+            k += 1
+            i += 3
+            if i == cap3:
+                i = k = 0
+    else:
+        for _ in range(ring.accel_count[slot]):
+            acc.add_accel(a[i], a[i + 1], a[i + 2])
+            i += 3
+            if i == cap3:
+                i = 0
+
+    g = ring.gyro
+    i = 3 * ring.gyro_start[slot]
+    for _ in range(ring.gyro_count[slot]):
+        acc.add_gyro(g[i], g[i + 1], g[i + 2])
+        i += 3
+        if i == cap3:
+            i = 0
+
+
+# Compute the 13 kinematic features of one ring window into out, reading the
+# samples in place
+def ring_features(ring, slot, out, fixed=False):
+    acc = _fixed_accumulator if fixed else _accumulator
+    acc.reset()
+    ring_feed(ring, slot, acc)
+    return acc.features(out)
+
+
+# Feature vector of one ring window that computes each feature the first time it is
+# read (x[i], as predict and ArrayForest do) and keeps it for the rest of the window.
+# Values are those of ring_features with the same fixed setting. computed counts the
+# features evaluated over all windows bound so far.
+# Benchmark only (bench.py lazy): the forest reads nearly every feature of a window, so the
+# bookkeeping costs more than the features it skips and main.py does not use it.
+class LazyFeatures:
+    def __init__(self, fixed=False):
+        self.fixed = fixed
+        self.values = [0] * NUM_FEATURES
+        self.known = 0
+        self.windows = 0
+        self.computed = 0
+
+    def bind(self, ring, slot):
+        self.ring = ring
+        self.accel_start = ring.accel_start[slot]
+        self.accel_n = ring.accel_count[slot]
+        self.gyro_start = ring.gyro_start[slot]
+        self.gyro_n = ring.gyro_count[slot]
+        self.known = 0
+        self.windows += 1
+        return self
+
+    def reset_stats(self):
+        self.windows = 0
+        self.computed = 0
+
+    def mean_computed(self):
+        return self.computed / self.windows if self.windows else 0
+
+    def __len__(self):
+        return NUM_FEATURES
+
+    def __getitem__(self, i):
+        if self.known >> i & 1:
+            return self.values[i]
+        value = self.compute(i)
+        self.values[i] = value
+        self.known |= 1 << i
+        self.computed += 1
+        return value
+
+    def mean(self, total, n):
+        if self.fixed:
+            return fixed_mean(total, n)
+        return total / n if n > 0 else 0.0
+
+    def compute(self, i):
+        ring = self.ring
+        n = self.accel_n
+        if i < 3:
+            return self.means(0, ring.accel, self.accel_start, n)[i]
+        if i < 6:
+            if n < 2:
+                return 0 if self.fixed else 0.0
+            a = ring.accel
+            end = (self.accel_start + n - 1) % ring.capacity
+            first = 3 * self.accel_start + i - 3
+            last = 3 * end + i - 3
+            span = 0
+            if ring.timed:
+                ts = ring.accel_ts
+                span = ((ts[end] - ts[self.accel_start]) & 0xFFFFFFFF) * TS_TICK_US
+            return jerk_mean(a[last] - a[first], n - 1, span, self.fixed)
+        if i < 9:
+            return self.means(6, ring.gyro, self.gyro_start, self.gyro_n)[i]
+        if i == 9:
+            sq = self.max_sq(ring.accel, self.accel_start, n)
+        elif i == 10:
+            sq = self.max_sq(ring.gyro, self.gyro_start, self.gyro_n)
+        elif i == 11:
+            sq = self.max_jerk_sq()
+            if not self.fixed:
+                sq = sq * JERK_RATE * JERK_RATE
+        else:
+            return self.max_abs_z()
+        return sq if self.fixed else math.sqrt(sq)
+
+    # The x, y and z means of a sensor come from one pass, all three are stored from
+    # values[first]. The two still unread count as computed too.
+    def means(self, first, buf, start, count):
+        cap3 = 3 * self.ring.capacity
+        i = 3 * start
+        sx = sy = sz = 0
+        for _ in range(count):
+            sx += buf[i]
+            sy += buf[i + 1]
+            sz += buf[i + 2]
+            i += 3
+            if i == cap3:
+                i = 0
+        values = self.values
+        values[first] = self.mean(sx, count)
+        values[first + 1] = self.mean(sy, count)
+        values[first + 2] = self.mean(sz, count)
+        self.known |= 7 << first
+        self.computed += 2
+        return values
+
+    def max_sq(self, buf, start, count):
+        cap3 = 3 * self.ring.capacity
+        fixed = self.fixed
+        i = 3 * start
+        peak = 0
+        for _ in range(count):
+            x = buf[i]
+            y = buf[i + 1]
+            z = buf[i + 2]
+            sq = x * x + y * y + z * z
+            if sq > SQ_CLIP_SQ and fixed:
+                sq = sq_clipped(x, y, z)
+            if sq > peak:
+                peak = sq
+            i += 3
+            if i == cap3:
+                i = 0
+        return peak
+
+    def max_jerk_sq(self):
+        ring = self.ring
+        a = ring.accel
+        ts = ring.accel_ts if ring.timed else None
+        cap3 = 3 * ring.capacity
+        fixed = self.fixed
+        k = self.accel_start
+        i = 3 * k
+        px = a[i]
+        py = a[i + 1]
+        pz = a[i + 2]
+        peak = 0
+        for _ in range(self.accel_n - 1):
+            k += 1
+            i += 3
+            if i == cap3:
+                i = k = 0
+            x = a[i]
+            y = a[i + 1]
+            z = a[i + 2]
+            dx = x - px
+            dy = y - py
+            dz = z - pz
+            if ts is not None:
+                sq = timed_jerk_sq(dx, dy, dz, ring.dt_us(ts, k), fixed)
+            else:
+                sq = dx * dx + dy * dy + dz * dz
+                if sq > SQ_CLIP_SQ and fixed:
+                    sq = sq_clipped(dx, dy, dz)
+            if sq > peak:
+                peak = sq
+            px = x
+            py = y
+            pz = z
+        return peak
+
+    def max_abs_z(self):
+        a = self.ring.accel
+        cap3 = 3 * self.ring.capacity
+        i = 3 * self.accel_start + 2
+        peak = 0
+        for _ in range(self.accel_n):
+            z = a[i]
+            if z > peak:
+                peak = z
+            elif -z > peak:
+                peak = -z
+            i += 3
+            if i >= cap3:
+                i -= cap3
+        return peak
+
+
+# Monotonic deque giving the maximum of the values pushed under the last keys,
+# keys are evicted oldest first
+class MaxDeque:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.keys = array('H', bytes(2 * capacity))
+        self.vals = [0] * capacity
+        self.clear()
+
+    def clear(self):
+        self.head = 0
+        self.size = 0
+
+    def push(self, key, val):
+        # Drop smaller values from the back, they can never be the maximum again
+        while self.size and self.vals[(self.head + self.size - 1) % self.capacity] <= val:
+            self.size -= 1
+        i = (self.head + self.size) % self.capacity
+        self.keys[i] = key
+        self.vals[i] = val
+        self.size += 1
+
+    def evict(self, key):
+        if self.size and self.keys[self.head] == key:
+            self.head = (self.head + 1) % self.capacity
+            self.size -= 1
+
+    def max(self):
+        return self.vals[self.head] if self.size else 0
+
+
+# Kinematic features over the last `window` samples of each sensor, updated as samples
+# arrive. Means are running sums with add/evict, peaks come from monotonic deques, so a
+# hop of h samples costs O(h) instead of a full calculate_kinematic_features. features()
+# matches calculate_kinematic_features on the samples currently in the window.
+# With fixed set, features() writes the integer features described at MEAN_Q instead.
+class SlidingFeatures:
+    def __init__(self, window, fixed=False):
+        self.window = window
+        self.fixed = fixed
+        self.accel = array('h', bytes(6 * window))
+        self.gyro = array('h', bytes(6 * window))
+        # Time in us since the previous accel sample of every sample, 0 without timestamps
+        self.accel_dt = array('I', bytes(4 * window))
+        self.accel_peak = MaxDeque(window)
+        self.gyro_peak = MaxDeque(window)
+        self.jerk_peak = MaxDeque(window)
+        self.z_peak = MaxDeque(window)
+        self.reset()
+
+    def reset(self):
+        self.accel_n = 0
+        self.accel_next = 0
+        self.ax = self.ay = self.az = 0
+        self.span_us = 0
+        self.gyro_n = 0
+        self.gyro_next = 0
+        self.gx = self.gy = self.gz = 0
+        self.accel_peak.clear()
+        self.gyro_peak.clear()
+        self.jerk_peak.clear()
+        self.z_peak.clear()
+
+    def add(self, tag, x, y, z):
+        if tag == 1:
+            self.add_accel(x, y, z)
+        elif tag == 2:
+            self.add_gyro(x, y, z)
+
+    # dt as in KinematicAccumulator.add_accel
+    def add_accel(self, x, y, z, dt=0):
+        a = self.accel
+        pos = self.accel_next
+        if self.accel_n == self.window:
+            # Evict the oldest sample, which sits where the new one goes,
+            # together with the jerk between it and its successor
+            i = 3 * pos
+            self.ax -= a[i]
+            self.ay -= a[i + 1]
+            self.az -= a[i + 2]
+            self.accel_peak.evict(pos)
+            self.z_peak.evict(pos)
+            self.jerk_peak.evict(pos)
+            self.span_us -= self.accel_dt[pos + 1 if pos + 1 < self.window else 0]
+        else:
+            self.accel_n += 1
+        if self.accel_n > 1:
+            # Jerk between the previous sample and this one, keyed by the previous sample
+            prev = pos - 1 if pos else self.window - 1
+            i = 3 * prev
+            dx = x - a[i]
+            dy = y - a[i + 1]
+            dz = z - a[i + 2]
+            if dt:
+                sq = timed_jerk_sq(dx, dy, dz, dt, self.fixed)
+            else:
+                sq = dx * dx + dy * dy + dz * dz
+                if sq > SQ_CLIP_SQ and self.fixed:
+                    sq = sq_clipped(dx, dy, dz)
+            self.jerk_peak.push(prev, sq)
+            self.span_us += dt
+        self.accel_dt[pos] = dt
+        i = 3 * pos
+        a[i] = x
+        a[i + 1] = y
+        a[i + 2] = z
+        self.ax += x
+        self.ay += y
+        self.az += z
+        sq = x * x + y * y + z * z
+        if sq > SQ_CLIP_SQ and self.fixed:
+            sq = sq_clipped(x, y, z)
+        self.accel_peak.push(pos, sq)
+        self.z_peak.push(pos, z if z >= 0 else -z)
+        self.accel_next = pos + 1 if pos + 1 < self.window else 0
+
+    def add_gyro(self, x, y, z):
+        g = self.gyro
+        pos = self.gyro_next
+        i = 3 * pos
+        if self.gyro_n == self.window:
+            self.gx -= g[i]
+            self.gy -= g[i + 1]
+            self.gz -= g[i + 2]
+            self.gyro_peak.evict(pos)
+        else:
+            self.gyro_n += 1
+        g[i] = x
+        g[i + 1] = y
+        g[i + 2] = z
+        self.gx += x
+        self.gy += y
+        self.gz += z
+        sq = x * x + y * y + z * z
+        if sq > SQ_CLIP_SQ and self.fixed:
+            sq = sq_clipped(x, y, z)
+        self.gyro_peak.push(pos, sq)
+        self.gyro_next = pos + 1 if pos + 1 < self.window else 0
+
+    # Write the feature vector (FEATURE_NAMES order) of the current window into out
+    def features(self, out):
+        n = self.accel_n
+        a = self.accel
+        fixed = self.fixed
+        if fixed:
+            out[0] = fixed_mean(self.ax, n)
+            out[1] = fixed_mean(self.ay, n)
+            out[2] = fixed_mean(self.az, n)
+        elif n:
+            out[0] = self.ax / n
+            out[1] = self.ay / n
+            out[2] = self.az / n
+        else:
+            out[0] = out[1] = out[2] = 0.0
+        if n >= 2:
+            last = 3 * (self.accel_next - 1 if self.accel_next else self.window - 1)
+            first = 3 * (self.accel_next if n == self.window else 0)
+            span = self.span_us
+            out[3] = jerk_mean(a[last] - a[first], n - 1, span, fixed)
+            out[4] = jerk_mean(a[last + 1] - a[first + 1], n - 1, span, fixed)
+            out[5] = jerk_mean(a[last + 2] - a[first + 2], n - 1, span, fixed)
+        else:
+            out[3] = out[4] = out[5] = 0 if fixed else 0.0
+        n = self.gyro_n
+        if fixed:
+            out[6] = fixed_mean(self.gx, n)
+            out[7] = fixed_mean(self.gy, n)
+            out[8] = fixed_mean(self.gz, n)
+            out[9] = self.accel_peak.max()
+            out[10] = self.gyro_peak.max()
+            out[11] = self.jerk_peak.max()
+            out[12] = self.z_peak.max()
+            return out
+        if n:
+            out[6] = self.gx / n
+            out[7] = self.gy / n
+            out[8] = self.gz / n
+        else:
+            out[6] = out[7] = out[8] = 0.0
+        out[9] = math.sqrt(self.accel_peak.max())
+        out[10] = math.sqrt(self.gyro_peak.max())
+        out[11] = math.sqrt(self.jerk_peak.max() * JERK_RATE * JERK_RATE)
+        out[12] = self.z_peak.max()
+        return out
+
+
+# Resamples the FIFO stream of a sensor running at hz onto the JERK_RATE grid for acc
+# (SlidingFeatures of a one second window), so the features of every rate profile of
+# governor.py match the ones the forest was trained on. Faster rates are averaged in
+# groups of hz / JERK_RATE samples, jerk then spans the same ~38ms as at 26Hz. Slower rates
+# get the midpoint between two samples inserted. dt as in add_accel, summed or split.
+class GridFeed:
+    def __init__(self, acc, hz=JERK_RATE):
+        self.acc = acc
+        self.set_rate(hz)
+
+    # New sensor rate, a partly summed group is dropped
+    def set_rate(self, hz):
+        self.down = max(1, int(hz / JERK_RATE + 0.5))
+        self.up = self.down == 1 and hz * 3 < JERK_RATE * 2
+        self.an = self.gn = 0
+        self.ax = self.ay = self.az = self.dt = 0
+        self.gx = self.gy = self.gz = 0
+        self.pa = self.pg = None
+
+    def add(self, tag, x, y, z):
+        if tag == 1:
+            self.add_accel(x, y, z)
+        elif tag == 2:
+            self.add_gyro(x, y, z)
+
+    def add_accel(self, x, y, z, dt=0):
+        n = self.down
+        if n > 1:
+            self.ax += x
+            self.ay += y
+            self.az += z
+            self.dt += dt
+            self.an += 1
+            if self.an < n:
+                return
+            x = (2 * self.ax + n) // (2 * n)
+            y = (2 * self.ay + n) // (2 * n)
+            z = (2 * self.az + n) // (2 * n)
+            dt = self.dt
+            self.an = self.ax = self.ay = self.az = self.dt = 0
+        elif self.up:
+            pa = self.pa
+            if pa is not None:
+                half = dt // 2
+                self.acc.add_accel((pa[0] + x) // 2, (pa[1] + y) // 2, (pa[2] + z) // 2, half)
+                dt -= half
+            self.pa = (x, y, z)
+        self.acc.add_accel(x, y, z, dt)
+
+    def add_gyro(self, x, y, z):
+        n = self.down
+        if n > 1:
+            self.gx += x
+            self.gy += y
+            self.gz += z
+            self.gn += 1
+            if self.gn < n:
+                return
+            x = (2 * self.gx + n) // (2 * n)
+            y = (2 * self.gy + n) // (2 * n)
+            z = (2 * self.gz + n) // (2 * n)
+            self.gn = self.gx = self.gy = self.gz = 0
+        elif self.up:
+            pg = self.pg
+            if pg is not None:
+                self.acc.add_gyro((pg[0] + x) // 2, (pg[1] + y) // 2, (pg[2] + z) // 2)
+            self.pg = (x, y, z)
+        self.acc.add_gyro(x, y, z)
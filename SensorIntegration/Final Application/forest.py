@@ -0,0 +1,212 @@
+try:
+    from micropython import native
+except ImportError:
+    # CPython on the host
+    def native(f):
+        return f
+
+from array import array
+import struct
+
+# Class names, as RandomForest.idxToLabel
+LABELS = ('Normal', 'Crash', 'Braking', 'Falling')
+
+# Binary model file (forest_tools.py binary / sklearn), little endian: a header, the class
+# names (length byte + UTF-8) in class index order, then the tables of MODEL_TABLES in
+# that order, each count entries long, with the layout of forest_model.py.
+MODEL_MAGIC = b'SCHF'
+MODEL_VERSION = 2
+# magic, version, classes, features, reserved, trees, nodes, bin edges, reserved
+MODEL_HEADER = '<4sBBBBHHHH'
+MODEL_HEADER_SIZE = 16
+MODEL_TABLES = (
+    ('ROOTS', 'H', 'trees'),
+    ('FEATURE', 'b', 'nodes'),
+    ('RIGHT', 'H', 'nodes'),
+    ('THRESHOLD', 'd', 'nodes'),
+    ('FIXED_THRESHOLD', 'i', 'nodes'),
+    ('BIN_START', 'H', 'bins'),
+    ('BIN_EDGES', 'd', 'edges'),
+    ('FIXED_BIN_EDGES', 'i', 'edges'),
+    ('BIN_THRESHOLD', 'B', 'nodes'),
+    ('PREFILTER', 'd', 'peaks'),
+    ('FIXED_PREFILTER', 'i', 'peaks'),
+)
+TYPE_SIZE = {'b': 1, 'B': 1, 'H': 2, 'i': 4, 'd': 8}
+
+
+# Tables of a binary model, as attributes named like those of forest_model.py
+class ForestModel:
+    pass
+
+
+def read_table(f, typecode, count):
+    data = f.read(count * TYPE_SIZE[typecode])
+    if len(data) != count * TYPE_SIZE[typecode]:
+        raise ValueError('Truncated model file')
+    table = array(typecode)
+    if hasattr(table, 'frombytes'):
+        # CPython
+        table.frombytes(data)
+        return table
+    # MicroPython builds the array straight from the raw bytes
+    return array(typecode, data)
+
+
+# Load a binary model file into a ForestModel for ArrayForest
+def load_model(path):
+    with open(path, 'rb') as f:
+        magic, version, num_classes, num_features, _, num_trees, num_nodes, num_edges, _ = struct.unpack(
+            MODEL_HEADER, f.read(MODEL_HEADER_SIZE))
+        if magic != MODEL_MAGIC or version != MODEL_VERSION:
+            raise ValueError('Not a version {} forest model: {}'.format(MODEL_VERSION, path))
+        model = ForestModel()
+        model.NUM_CLASSES = num_classes
+        labels = []
+        for _ in range(num_classes):
+            labels.append(f.read(f.read(1)[0]).decode())
+        model.LABELS = tuple(labels)
+        counts = {'trees': num_trees, 'nodes': num_nodes, 'bins': num_features + 1, 'edges': num_edges,
+                  'peaks': 3}
+        for name, typecode, count in MODEL_TABLES:
+            setattr(model, name, read_table(f, typecode, counts[count]))
+    return model
+
+
+# The forest of RandomForest.predict as flat node tables (forest_model.py, written by
+# forest_tools.py tables, or a ForestModel from load_model) walked by one loop, instead
+# of 600 lines of generated ifs.
+# With fixed set it compares against the integer thresholds of RandomForestFixed.py.
+# With early_exit set it stops once the remaining trees cannot change the label, the
+# trees run in the order of ROOTS (tuned by forest_tools.py on recorded rides).
+# With binned set each feature is first mapped to its bin among the split thresholds of
+# that feature, then every node compares small ints (BIN_THRESHOLD) with the same result.
+# With prefilter set, windows whose accel, gyro and jerk peaks are all within the
+# calibrated PREFILTER limits are labelled Normal (0) without running the trees.
+# After predict, voted tells whether self.votes holds the votes of that window.
+# peak_limits are the calibrated limits of the loaded model whether or not the pre-filter
+# runs (governor.RateGovernor), -1 entries when the model has none.
+class ArrayForest:
+    def __init__(self, model=None, fixed=False, early_exit=False, binned=False, prefilter=False):
+        if model is None:
+            import forest_model as model
+        self.num_classes = model.NUM_CLASSES
+        self.labels = getattr(model, 'LABELS', LABELS)
+        self.roots = model.ROOTS
+        self.feature = model.FEATURE
+        self.right = model.RIGHT
+        self.threshold = model.FIXED_THRESHOLD if fixed else model.THRESHOLD
+        self.binned = binned
+        if binned:
+            self.threshold = model.BIN_THRESHOLD
+            self.bin_start = model.BIN_START
+            self.bin_edges = model.FIXED_BIN_EDGES if fixed else model.BIN_EDGES
+            self.bins = [0] * (len(model.BIN_START) - 1)
+        self.votes = [0] * model.NUM_CLASSES
+        self.voted = False
+        self.early_exit = early_exit
+        self.peak_limits = model.FIXED_PREFILTER if fixed else model.PREFILTER
+        self.prefilter = self.peak_limits if prefilter else None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.windows = 0
+        self.short_circuited = 0
+        self.predictions = 0
+        self.trees_evaluated = 0
+
+    def mean_trees(self):
+        return self.trees_evaluated / self.predictions if self.predictions else 0
+
+    # Percentage of windows the pre-filter labelled without the trees
+    def short_circuit_percent(self):
+        return 100 * self.short_circuited / self.windows if self.windows else 0
+
+    # Vote counts of every class for feature vector x, in self.votes. With early_exit
+    # only the trees up to the decisive one have voted.
+    @native
+    def vote(self, x):
+        votes = self.votes
+        num_classes = self.num_classes
+        for i in range(num_classes):
+            votes[i] = 0
+        feature = self.feature
+        threshold = self.threshold
+        right = self.right
+        early_exit = self.early_exit
+        remaining = len(self.roots)
+        leader = 0
+        for i in self.roots:
+            f = feature[i]
+            while f >= 0:
+                if x[f] <= threshold[i]:
+                    i += 1
+                else:
+                    i = right[i]
+                f = feature[i]
+            c = right[i]
+            votes[c] += 1
+            remaining -= 1
+            if early_exit:
+                # Leader as the argmax picks it, lowest class index on a tie
+                if votes[c] > votes[leader] or (votes[c] == votes[leader] and c < leader):
+                    leader = c
+                lead = votes[leader]
+                # No class can be out of reach before the leader has as many votes as remain
+                if lead < remaining:
+                    continue
+                decided = True
+                for c in range(num_classes):
+                    if c != leader and (votes[c] + remaining > lead or (votes[c] + remaining == lead and c < leader)):
+                        decided = False
+                        break
+                if decided:
+                    break
+        self.predictions += 1
+        self.trees_evaluated += len(self.roots) - remaining
+        return votes
+
+    # Bin index of every feature of x, in self.bins: the number of split thresholds of
+    # the feature below the value, by binary search
+    @native
+    def bin(self, x):
+        bins = self.bins
+        start = self.bin_start
+        edges = self.bin_edges
+        for f in range(len(bins)):
+            lo = start[f]
+            hi = start[f + 1]
+            if lo == hi:
+                # Feature not used by any split
+                continue
+            base = lo
+            v = x[f]
+            while lo < hi:
+                mid = (lo + hi) >> 1
+                if edges[mid] < v:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            bins[f] = lo - base
+        return bins
+
+    # Same as RandomForest.predict: argmax of the votes, lowest class index wins a tie
+    def predict(self, x):
+        self.windows += 1
+        limits = self.prefilter
+        if limits is not None and x[9] <= limits[0] and x[10] <= limits[1] and x[11] <= limits[2]:
+            self.short_circuited += 1
+            self.voted = False
+            return 0
+        if self.binned:
+            x = self.bin(x)
+        votes = self.vote(x)
+        self.voted = True
+        class_idx = 0
+        for i in range(1, self.num_classes):
+            if votes[i] > votes[class_idx]:
+                class_idx = i
+        return class_idx
+
+    def predict_label(self, x):
+        return self.labels[self.predict(x)]
@@ -0,0 +1,262 @@
+# Generated by forest_tools.py from RandomForest.py, do not edit.
+# 10 trees, 286 nodes, see forest_tools.flatten for the layout.
+# FIXED_THRESHOLD holds the thresholds of RandomForestFixed.py.
+# BIN_THRESHOLD holds the same splits as bin indexes into BIN_EDGES (FIXED_BIN_EDGES),
+# see forest_tools.bin_edges.
+# PREFILTER (FIXED_PREFILTER) holds the accel, gyro and jerk peak limits of the
+# cascade pre-filter, see forest_tools.calibrate_prefilter.
+# ROOTS lists the trees in evaluation order for early exit: #9 #3 #7 #6 #2 #4 #10 #5 #8 #1.
+from array import array
+
+NUM_CLASSES = 4
+LABELS = ('Normal', 'Crash', 'Braking', 'Falling',)
+
+ROOTS = array('H', (
+    222, 62, 168, 147, 29, 87, 257, 118, 199, 0,
+))
+
+FEATURE = array('b', (
+    11, 0, 8, 8, 3, -1, -1, 3, -1, -1, 6, 11, -1, -1, 4, -1,
+    -1, 2, 1, -1, 7, -1, -1, -1, 9, -1, 5, -1, -1, 11, 8, 2,
+    8, -1, 8, -1, -1, 9, -1, 9, -1, -1, 10, 12, -1, 7, -1, -1,
+    10, 7, -1, -1, 2, -1, -1, 7, -1, 12, -1, 7, -1, -1, 8, 10,
+    7, -1, -1, 7, 9, -1, -1, 5, 0, -1, -1, -1, 10, 7, 1, -1,
+    2, -1, -1, -1, 11, -1, -1, 7, 10, 10, 11, -1, 11, -1, -1, 10,
+    12, -1, -1, -1, 6, 11, 9, -1, -1, -1, 11, -1, -1, 2, 5, 3,
+    -1, -1, -1, 10, -1, -1, 12, 6, 7, 8, 5, -1, -1, 6, -1, -1,
+    10, 6, -1, -1, -1, 10, -1, 6, 3, -1, -1, -1, 10, 12, -1, -1,
+    9, -1, -1, 2, 8, 10, 7, -1, -1, 9, 12, -1, -1, -1, 7, 2,
+    12, -1, -1, -1, -1, 9, -1, -1, 7, 4, 4, 1, -1, 12, -1, -1,
+    8, 10, -1, -1, 12, -1, -1, 10, -1, -1, 6, 7, -1, 3, -1, -1,
+    12, -1, 3, -1, 6, -1, -1, 1, 7, 11, 0, 5, -1, -1, -1, 3,
+    9, -1, -1, 10, -1, -1, 1, -1, 10, -1, -1, 9, -1, -1, 7, 12,
+    8, 2, -1, 6, -1, -1, 12, 6, -1, -1, -1, 12, 9, -1, -1, -1,
+    10, 10, 3, 7, -1, -1, 3, -1, -1, 12, 6, -1, -1, -1, 5, -1,
+    -1, 9, 2, 1, -1, 10, 8, -1, -1, -1, 7, 2, 9, -1, -1, 6,
+    -1, -1, 10, 8, -1, -1, 6, -1, -1, 7, -1, 4, -1, -1,
+))
+
+RIGHT = array('H', (
+    24, 17, 10, 7, 6, 0, 0, 9, 0, 3, 14, 13, 2, 0, 16, 1,
+    0, 23, 20, 0, 22, 2, 0, 1, 26, 0, 28, 0, 1, 55, 42, 37,
+    34, 0, 36, 3, 0, 39, 0, 41, 2, 1, 48, 45, 2, 47, 2, 0,
+    52, 51, 2, 0, 54, 3, 1, 57, 1, 59, 0, 61, 1, 0, 76, 67,
+    66, 3, 0, 71, 70, 3, 1, 75, 74, 3, 2, 1, 84, 83, 80, 0,
+    82, 2, 0, 0, 86, 3, 1, 109, 100, 95, 92, 2, 94, 0, 0, 99,
+    98, 2, 3, 2, 106, 105, 104, 3, 1, 1, 108, 3, 1, 115, 114, 113,
+    3, 0, 0, 117, 0, 1, 140, 133, 128, 125, 124, 2, 3, 127, 2, 2,
+    132, 131, 2, 0, 3, 135, 0, 139, 138, 3, 2, 1, 144, 143, 3, 0,
+    146, 3, 1, 165, 158, 153, 152, 3, 0, 157, 156, 3, 3, 1, 164, 163,
+    162, 2, 1, 0, 0, 167, 0, 1, 186, 183, 176, 173, 1, 175, 0, 1,
+    180, 179, 0, 3, 182, 2, 1, 185, 0, 1, 192, 189, 0, 191, 1, 3,
+    194, 0, 196, 0, 198, 3, 0, 219, 214, 207, 206, 205, 2, 3, 0, 211,
+    210, 0, 1, 213, 0, 1, 216, 0, 218, 0, 3, 221, 0, 1, 240, 235,
+    230, 227, 3, 229, 0, 1, 234, 233, 2, 0, 1, 239, 238, 3, 1, 1,
+    254, 249, 246, 245, 0, 0, 248, 2, 0, 253, 252, 2, 3, 0, 256, 3,
+    1, 281, 266, 261, 0, 265, 264, 0, 2, 3, 274, 271, 270, 2, 3, 273,
+    2, 2, 278, 277, 0, 0, 280, 2, 0, 283, 1, 285, 0, 1,
+))
+
+THRESHOLD = array('d', (
+    127387.87109375, 147.23077392578125, 206.15384674072266, -239.3653793334961,
+    -479.9600067138672, 0, 0, -979.6800231933594,
+    0, 0, -1489.5192260742188, 111638.0703125,
+    0, 0, -5039.320068359375, 0,
+    0, 985.1922912597656, 7.730769157409668, 0,
+    545.4999847412109, 0, 0, 0,
+    6000.532470703125, 0, -8990.7998046875, 0,
+    0, 126904.8515625, 207.94231414794922, -31.557692527770996,
+    -596.2692260742188, 0, 202.53846740722656, 0,
+    0, 3541.368896484375, 0, 6079.741943359375,
+    0, 0, 4074.7772216796875, 828.0,
+    0, 516.826904296875, 0, 0,
+    14165.54638671875, 1369.4422912597656, 0, 0,
+    657.3461380004883, 0, 0, 566.0769348144531,
+    0, 4956.5, 0, 1285.0769653320312,
+    0, 0, 161.84615325927734, 4319.7119140625,
+    -283.84616470336914, 0, 0, -301.03846740722656,
+    5820.18115234375, 0, 0, 5325.3199462890625,
+    114.40384674072266, 0, 0, 0,
+    12602.27392578125, 964.4230651855469, -517.4615325927734, 0,
+    332.32122802734375, 0, 0, 0,
+    57050.3125, 0, 0, 991.5192260742188,
+    7729.521728515625, 3427.5054931640625, 20214.8916015625, 0,
+    30069.1728515625, 0, 0, 4973.56103515625,
+    2646.5, 0, 0, 0,
+    -1213.3845825195312, 154576.6875, 5839.49267578125, 0,
+    0, 0, 71584.125, 0,
+    0, -281.01922607421875, -1967.6799926757812, 1642.1600341796875,
+    0, 0, 0, 16363.309326171875,
+    0, 0, 5148.0, -1542.09619140625,
+    328.3653869628906, 133.7115364074707, 70.72000122070312, 0,
+    0, -2038.4230346679688, 0, 0,
+    9492.18359375, -1877.40380859375, 0, 0,
+    0, 5170.685791015625, 0, -817.7307739257812,
+    1180.3999633789062, 0, 0, 0,
+    7335.6875, 6453.5, 0, 0,
+    5901.9833984375, 0, 0, 589.8461608886719,
+    177.9423065185547, 4319.7119140625, -296.9038429260254, 0,
+    0, 6405.352294921875, 2856.0, 0,
+    0, 0, 948.9999694824219, 359.0327606201172,
+    4744.5, 0, 0, 0,
+    0, 4648.9517822265625, 0, 0,
+    991.5192260742188, 1805.9600219726562, -2125.760009765625, -375.4423179626465,
+    0, 4266.5, 0, 0,
+    161.84615325927734, 3632.5399169921875, 0, 0,
+    4881.0, 0, 0, 5199.8646240234375,
+    0, 0, -1750.7114868164062, 1080.3077087402344,
+    0, -1412.3199462890625, 0, 0,
+    3112.0, 0, 429.0, 0,
+    49.519287109375, 0, 0, 594.5576782226562,
+    1014.3461303710938, 126904.8515625, 200.34615325927734, 195.0,
+    0, 0, 0, -2367.0399169921875,
+    7165.477294921875, 0, 0, 6178.5863037109375,
+    0, 0, -97.15384674072266, 0,
+    12685.376708984375, 0, 0, 5035.8453369140625,
+    0, 0, 325.26922607421875, 5216.0,
+    163.40384674072266, 151.0384635925293, 0, -1924.7115478515625,
+    0, 0, 4520.0, -841.1523208618164,
+    0, 0, 0, 5603.5,
+    6225.792236328125, 0, 0, 0,
+    9234.59326171875, 4001.800048828125, 1453.9199829101562, 364.5,
+    0, 0, 1687.9199829101562, 0,
+    0, 3406.0, -1727.3461303710938, 0,
+    0, 0, 3886.4798583984375, 0,
+    0, 6173.097900390625, -47.82692337036133, -295.4038391113281,
+    0, 9759.226806640625, 50.51922941207886, 0,
+    0, 0, 373.51922607421875, -2.9615384340286255,
+    4777.6527099609375, 0, 0, -1788.6345825195312,
+    0, 0, 4074.7772216796875, 246.21153259277344,
+    0, 0, -1575.75, 0,
+    0, 655.6923065185547, 0, -1992.1200256347656,
+    0, 0,
+))
+
+FIXED_THRESHOLD = array('i', (
+    24005428, 37691, 52775, -61278, -122870, 0, 0, -250799,
+    0, 0, -381317, 18436477, 0, 0, -1290066, 0,
+    0, 252209, 1979, 0, 139647, 0, 0, 0,
+    36006389, 0, -2301645, 0, 0, 23823729, 53233, -8079,
+    -152645, 0, 51849, 0, 0, 12541293, 0, 36963262,
+    0, 0, 16603809, 828, 0, 132307, 0, 0,
+    200662704, 350577, 0, 0, 168280, 0, 0, 144915,
+    0, 4956, 0, 328979, 0, 0, 41432, 18659911,
+    -72665, 0, 0, -77066, 33874508, 0, 0, 1363281,
+    29287, 0, 0, 0, 158817308, 246892, -132471, 0,
+    85074, 0, 0, 0, 4814701, 0, 0, 253828,
+    59745506, 11747793, 604499, 0, 1337507, 0, 0, 24736309,
+    2646, 0, 0, 0, -310627, 35346083, 34099674, 0,
+    0, 0, 7580306, 0, 0, -71941, -503727, 420392,
+    0, 0, 0, 267757892, 0, 0, 5148, -394777,
+    84061, 34230, 18104, 0, 0, -521837, 0, 0,
+    90101549, -480616, 0, 0, 0, 26735991, 0, -209340,
+    302182, 0, 0, 0, 53812311, 6453, 0, 0,
+    34833408, 0, 0, 151000, 45553, 18659911, -76008, 0,
+    0, 41028538, 2856, 0, 0, 0, 242943, 91912,
+    4744, 0, 0, 0, 0, 21612752, 0, 0,
+    253828, 462325, -544195, -96114, 0, 4266, 0, 0,
+    41432, 13195346, 0, 0, 4881, 0, 0, 27038592,
+    0, 0, -448183, 276558, 0, -361554, 0, 0,
+    3112, 0, 109824, 0, 12676, 0, 0, 152206,
+    259672, 23823729, 51288, 49920, 0, 0, 0, -605963,
+    51344064, 0, 0, 38174928, 0, 0, -24872, 0,
+    160918782, 0, 0, 25359738, 0, 0, 83268, 5216,
+    41831, 38665, 0, -492727, 0, 0, 4520, -215335,
+    0, 0, 0, 5603, 38760488, 0, 0, 0,
+    85277712, 16014403, 372203, 93312, 0, 0, 432107, 0,
+    0, 3406, -442201, 0, 0, 0, 994938, 0,
+    0, 38107137, -12244, -75624, 0, 95242507, 12932, 0,
+    0, 0, 95620, -759, 22825965, 0, 0, -457891,
+    0, 0, 16603809, 63030, 0, 0, -403392, 0,
+    0, 167857, 0, -509983, 0, 0,
+))
+
+BIN_START = array('H', (
+    0, 3, 9, 19, 28, 32, 38, 51, 69, 80, 93, 111, 119, 133,
+))
+
+BIN_EDGES = array('d', (
+    114.40384674072266, 147.23077392578125, 200.34615325927734, -517.4615325927734,
+    -375.4423179626465, -295.4038391113281, -97.15384674072266, 7.730769157409668,
+    594.5576782226562, -281.01922607421875, -47.82692337036133, -31.557692527770996,
+    -2.9615384340286255, 151.0384635925293, 332.32122802734375, 359.0327606201172,
+    589.8461608886719, 657.3461380004883, 985.1922912597656, -2367.0399169921875,
+    -1412.3199462890625, -979.6800231933594, -479.9600067138672, 429.0,
+    1180.3999633789062, 1453.9199829101562, 1642.1600341796875, 1687.9199829101562,
+    -5039.320068359375, -2125.760009765625, -1992.1200256347656, 1805.9600219726562,
+    -8990.7998046875, -1967.6799926757812, 70.72000122070312, 195.0,
+    3886.4798583984375, 5325.3199462890625, -2038.4230346679688, -1924.7115478515625,
+    -1877.40380859375, -1788.6345825195312, -1750.7114868164062, -1727.3461303710938,
+    -1575.75, -1542.09619140625, -1489.5192260742188, -1213.3845825195312,
+    -841.1523208618164, -817.7307739257812, 49.519287109375, -301.03846740722656,
+    -296.9038429260254, -283.84616470336914, 325.26922607421875, 328.3653869628906,
+    364.5, 373.51922607421875, 516.826904296875, 545.4999847412109,
+    566.0769348144531, 655.6923065185547, 948.9999694824219, 964.4230651855469,
+    991.5192260742188, 1014.3461303710938, 1080.3077087402344, 1285.0769653320312,
+    1369.4422912597656, -596.2692260742188, -239.3653793334961, 50.51922941207886,
+    133.7115364074707, 161.84615325927734, 163.40384674072266, 177.9423065185547,
+    202.53846740722656, 206.15384674072266, 207.94231414794922, 246.21153259277344,
+    3541.368896484375, 4648.9517822265625, 4777.6527099609375, 5035.8453369140625,
+    5820.18115234375, 5839.49267578125, 5901.9833984375, 6000.532470703125,
+    6079.741943359375, 6173.097900390625, 6225.792236328125, 6405.352294921875,
+    7165.477294921875, 3427.5054931640625, 3632.5399169921875, 4001.800048828125,
+    4074.7772216796875, 4319.7119140625, 4973.56103515625, 5170.685791015625,
+    5199.8646240234375, 6178.5863037109375, 7335.6875, 7729.521728515625,
+    9234.59326171875, 9492.18359375, 9759.226806640625, 12602.27392578125,
+    12685.376708984375, 14165.54638671875, 16363.309326171875, 20214.8916015625,
+    30069.1728515625, 57050.3125, 71584.125, 111638.0703125,
+    126904.8515625, 127387.87109375, 154576.6875, 828.0,
+    2646.5, 2856.0, 3112.0, 3406.0,
+    4266.5, 4520.0, 4744.5, 4881.0,
+    4956.5, 5148.0, 5216.0, 5603.5,
+    6453.5,
+))
+
+FIXED_BIN_EDGES = array('i', (
+    29287, 37691, 51288, -132471, -96114, -75624, -24872, 1979,
+    152206, -71941, -12244, -8079, -759, 38665, 85074, 91912,
+    151000, 168280, 252209, -605963, -361554, -250799, -122870, 109824,
+    302182, 372203, 420392, 432107, -1290066, -544195, -509983, 462325,
+    -2301645, -503727, 18104, 49920, 994938, 1363281, -521837, -492727,
+    -480616, -457891, -448183, -442201, -403392, -394777, -381317, -310627,
+    -215335, -209340, 12676, -77066, -76008, -72665, 83268, 84061,
+    93312, 95620, 132307, 139647, 144915, 167857, 242943, 246892,
+    253828, 259672, 276558, 328979, 350577, -152645, -61278, 12932,
+    34230, 41432, 41831, 45553, 51849, 52775, 53233, 63030,
+    12541293, 21612752, 22825965, 25359738, 33874508, 34099674, 34833408, 36006389,
+    36963262, 38107137, 38760488, 41028538, 51344064, 11747793, 13195346, 16014403,
+    16603809, 18659911, 24736309, 26735991, 27038592, 38174928, 53812311, 59745506,
+    85277712, 90101549, 95242507, 158817308, 160918782, 200662704, 267757892, 604499,
+    1337507, 4814701, 7580306, 18436477, 23823729, 24005428, 35346083, 828,
+    2646, 2856, 3112, 3406, 4266, 4520, 4744, 4881,
+    4956, 5148, 5216, 5603, 6453,
+))
+
+BIN_THRESHOLD = array('B', (
+    6, 1, 8, 1, 3, 0, 0, 2, 0, 0, 8, 4, 0, 0, 0, 0,
+    0, 9, 4, 0, 8, 0, 0, 0, 7, 0, 0, 0, 0, 5, 9, 2,
+    0, 0, 7, 0, 0, 0, 0, 8, 0, 0, 3, 0, 0, 7, 0, 0,
+    16, 17, 0, 0, 8, 0, 0, 9, 0, 9, 0, 16, 0, 0, 4, 4,
+    2, 0, 0, 0, 4, 0, 0, 5, 0, 0, 0, 0, 14, 12, 0, 0,
+    5, 0, 0, 0, 2, 0, 0, 13, 10, 0, 0, 0, 1, 0, 0, 5,
+    1, 0, 0, 0, 9, 7, 5, 0, 0, 0, 3, 0, 0, 0, 1, 7,
+    0, 0, 0, 17, 0, 0, 10, 7, 4, 3, 2, 0, 0, 0, 0, 0,
+    12, 2, 0, 0, 0, 6, 0, 11, 5, 0, 0, 0, 9, 13, 0, 0,
+    6, 0, 0, 7, 6, 4, 1, 0, 0, 11, 2, 0, 0, 0, 11, 6,
+    7, 0, 0, 0, 0, 1, 0, 0, 13, 3, 1, 1, 0, 5, 0, 0,
+    4, 1, 0, 0, 8, 0, 0, 7, 0, 0, 4, 15, 0, 1, 0, 0,
+    3, 0, 4, 0, 12, 0, 0, 5, 14, 5, 2, 3, 0, 0, 0, 0,
+    12, 0, 0, 8, 0, 0, 3, 0, 15, 0, 0, 3, 0, 0, 3, 11,
+    5, 4, 0, 1, 0, 0, 6, 10, 0, 0, 0, 12, 10, 0, 0, 0,
+    11, 2, 6, 5, 0, 0, 8, 0, 0, 4, 5, 0, 0, 0, 4, 0,
+    0, 9, 1, 2, 0, 13, 2, 0, 0, 0, 6, 3, 2, 0, 0, 3,
+    0, 0, 3, 10, 0, 0, 6, 0, 0, 10, 0, 2, 0, 0,
+))
+
+PREFILTER = array('d', (
+    2261.3420793856026, 2293.096596308145, 51603.58146485571,
+))
+
+FIXED_PREFILTER = array('i', (
+    5113668, 5258291, 3939245,
+))
@@ -0,0 +1,466 @@
+# Usage: RUN ON PC (CPython)
+#   python forest_tools.py fixed     writes RandomForestFixed.py
+#   python forest_tools.py tables [trace.csv ...]
+#                                    writes forest_model.py for forest.ArrayForest, with the
+#                                    trees ordered for early exit on the traces (or a
+#                                    synthetic ride)
+#   python forest_tools.py binary [trace.csv ...]
+#                                    writes the same tables to forest.bin for forest.load_model
+#   python forest_tools.py sklearn model.pkl [trace.csv ...]
+#                                    writes forest.bin from a fitted scikit-learn
+#                                    RandomForestClassifier (joblib or pickle)
+# Model build tools: parse the trees out of the generated RandomForest.predict and emit
+# other representations of the same forest.
+import ast
+import math
+import struct
+import sys
+from array import array
+from fractions import Fraction
+
+import features
+import forest
+from lsm6dsox_sim import load_trace, synthetic_trace, TAG_XL_NC, TAG_GYRO_NC
+
+MODEL_FILE = 'RandomForest.py'
+FIXED_FILE = 'RandomForestFixed.py'
+TABLES_FILE = 'forest_model.py'
+BINARY_FILE = 'forest.bin'
+
+# Class names of RandomForest.idxToLabel
+LABELS = forest.LABELS
+
+NUM_CLASSES = 4
+
+# Pre-filter calibration (calibrate_prefilter): recall kept for Braking and classes
+# never short-circuited (Crash, Falling)
+PREFILTER_RECALL = 1.0
+PREFILTER_KEEP = (1, 3)
+# Hop in samples between the recorded windows used for tuning, main.py's SLIDING_HOP_MS
+CALIBRATION_HOP = 6
+
+
+# A tree node is ('leaf', class) or ('split', feature, threshold, left, right),
+# left being taken when x[feature] <= threshold
+def load_trees(path=MODEL_FILE):
+    with open(path) as f:
+        module = ast.parse(f.read())
+    for stmt in module.body:
+        if isinstance(stmt, ast.FunctionDef) and stmt.name == 'predict':
+            return [parse_node([node]) for node in stmt.body if isinstance(node, ast.If)]
+    raise ValueError('No predict() in ' + path)
+
+
+def parse_node(body):
+    stmt = body[0]
+    if isinstance(stmt, ast.If):
+        test = stmt.test
+        if not (isinstance(test, ast.Compare) and isinstance(test.ops[0], ast.LtE)):
+            raise ValueError('Unexpected split at line {}'.format(stmt.lineno))
+        feature = ast.literal_eval(test.left.slice)
+        threshold = ast.literal_eval(test.comparators[0])
+        return ('split', feature, threshold, parse_node(stmt.body), parse_node(stmt.orelse))
+    if isinstance(stmt, ast.AugAssign):
+        return ('leaf', ast.literal_eval(stmt.target.slice))
+    raise ValueError('Unexpected statement at line {}'.format(stmt.lineno))
+
+
+# Reference evaluation of the parsed forest, returns the vote counts
+def votes(trees, x):
+    counts = [0] * NUM_CLASSES
+    for node in trees:
+        while node[0] == 'split':
+            node = node[3] if x[node[1]] <= node[2] else node[4]
+        counts[node[1]] += 1
+    return counts
+
+
+# Same argmax as RandomForest.predict: lowest class index wins a tie
+def argmax(counts):
+    best = 0
+    for i in range(1, len(counts)):
+        if counts[i] > counts[best]:
+            best = i
+    return best
+
+
+# True once no other class can overtake (or tie ahead of) the leader with the
+# remaining votes, the same test as forest.ArrayForest with early_exit
+def decided(counts, remaining):
+    leader = argmax(counts)
+    for c in range(len(counts)):
+        if c == leader:
+            continue
+        most = counts[c] + remaining
+        if most > counts[leader] or (most == counts[leader] and c < leader):
+            return False
+    return True
+
+
+# Trees evaluated for x with early exit in the given tree order
+def trees_evaluated(trees, order, x):
+    counts = [0] * NUM_CLASSES
+    for k, t in enumerate(order):
+        counts[votes([trees[t]], x).index(1)] += 1
+        if decided(counts, len(order) - k - 1):
+            return k + 1
+    return len(order)
+
+
+# Feature vectors of the windows of a trace, one every hop samples, as main.py classifies
+# them: the samples carry the FIFO tags of the sensor, as read_data stores them in the ring
+def trace_vectors(accel, gyro, window=26, hop=None):
+    vectors = []
+    for start in range(0, len(accel) - window + 1, hop or window):
+        words = []
+        for k in range(start, start + window):
+            words += [TAG_GYRO_NC] + list(gyro[k])
+            words += [TAG_XL_NC] + list(accel[k])
+        vectors.append(list(features.stream_features(words, [0.0] * features.NUM_FEATURES)))
+    return vectors
+
+
+# Greedy tree order for early exit: each position takes the tree after which the most
+# vectors are decided, ties going to the tree agreeing most often with the forest
+def tune_order(trees, vectors):
+    leaves = [[votes([tree], x).index(1) for tree in trees] for x in vectors]
+    labels = [argmax(votes(trees, x)) for x in vectors]
+    agreement = [sum(1 for v, label in zip(leaves, labels) if v[t] == label) for t in range(len(trees))]
+    order = []
+    counts = [[0] * NUM_CLASSES for _ in vectors]
+    while len(order) < len(trees):
+        remaining = len(trees) - len(order) - 1
+        best = None
+        for t in range(len(trees)):
+            if t in order:
+                continue
+            done = 0
+            for v, c in zip(leaves, counts):
+                c[v[t]] += 1
+                done += decided(c, remaining)
+                c[v[t]] -= 1
+            key = (done, agreement[t])
+            if best is None or key > best[0]:
+                best = (key, t)
+        t = best[1]
+        order.append(t)
+        for v, c in zip(leaves, counts):
+            c[v[t]] += 1
+    return order
+
+
+def mean_trees(trees, order, vectors):
+    return sum(trees_evaluated(trees, order, x) for x in vectors) / max(len(vectors), 1)
+
+
+def map_thresholds(node, fn):
+    if node[0] == 'leaf':
+        return node
+    return ('split', node[1], fn(node[1], node[2]), map_thresholds(node[3], fn), map_thresholds(node[4], fn))
+
+
+# Threshold in the integer units of features.KinematicAccumulator(fixed=True):
+# means in Q MEAN_Q, squared peaks (jerk without the JERK_RATE scale) and |z| in LSB.
+# x <= t holds for the float feature exactly when the integer feature <= the result,
+# up to the sub-LSB rounding of the means.
+def fixed_threshold(feature, t):
+    t = Fraction(t)
+    if feature < 9:
+        return math.floor(t * (1 << features.MEAN_Q))
+    if feature == 12:
+        return math.floor(t)
+    if t < 0:
+        return -1
+    if feature == 11:
+        t = t / features.JERK_RATE
+    if t >= features.SQ_CLIP:
+        raise ValueError('Peak threshold {} of feature {} above the clip level'.format(float(t), feature))
+    return math.floor(t * t)
+
+
+def fixed_trees(trees):
+    return [map_thresholds(tree, fixed_threshold) for tree in trees]
+
+
+def emit_node(node, depth, lines):
+    indent = '    ' * depth
+    if node[0] == 'leaf':
+        lines.append('{}votes[{}] += 1'.format(indent, node[1]))
+        lines.append('')
+        return
+    lines.append('{}if x[{}] <= {}:'.format(indent, node[1], node[2]))
+    emit_node(node[3], depth + 1, lines)
+    lines.append('{}else:'.format(indent))
+    emit_node(node[4], depth + 1, lines)
+
+
+# Source of a predict(x) module in the layout of RandomForest.py
+def emit_predict(trees, header):
+    lines = header + ['def predict(x):', '    votes = [0, 0, 0, 0]']
+    for i, tree in enumerate(trees):
+        if i:
+            lines.append('    # tree #{}'.format(i + 1))
+        emit_node(tree, 1, lines)
+    lines += [
+        '    # return argmax of votes',
+        '    classIdx = 0',
+        '    maxVotes = votes[0]',
+        '',
+        '    for i in range(1, 4):',
+        '        if votes[i] > maxVotes:',
+        '            classIdx = i',
+        '            maxVotes = votes[i]',
+        '',
+        '    return int(classIdx)',
+        '',
+    ]
+    return '\n'.join(lines)
+
+
+def write_fixed(trees, path=FIXED_FILE):
+    header = [
+        '# Generated by forest_tools.py from ' + MODEL_FILE + ', do not edit.',
+        '# Integer thresholds for features computed by KinematicAccumulator(fixed=True)',
+        '# or SlidingFeatures(window, fixed=True): means in Q{}, squared peaks, |z| in LSB.'.format(features.MEAN_Q),
+        '',
+    ]
+    with open(path, 'w') as f:
+        f.write(emit_predict(fixed_trees(trees), header))
+    print('Wrote ' + path)
+
+
+# Preorder node tables of the forest, as read by forest.ArrayForest: a split node i
+# compares x[FEATURE[i]] with THRESHOLD[i] and continues at i + 1 (<=) or RIGHT[i],
+# a leaf has FEATURE[i] == -1 and its class in RIGHT[i]. ROOTS holds each tree's first node.
+def flatten(trees):
+    feature = []
+    threshold = []
+    right = []
+    roots = []
+
+    def add(node):
+        i = len(feature)
+        feature.append(-1 if node[0] == 'leaf' else node[1])
+        threshold.append(0 if node[0] == 'leaf' else node[2])
+        right.append(node[1] if node[0] == 'leaf' else 0)
+        if node[0] == 'split':
+            add(node[3])
+            right[i] = len(feature)
+            add(node[4])
+
+    for tree in trees:
+        roots.append(len(feature))
+        add(tree)
+    return feature, threshold, right, roots
+
+
+# Sorted distinct split thresholds of every feature, flattened: the edges of feature f
+# are edges[start[f]:start[f + 1]]. A value falls in bin #{edges < value}, so
+# value <= edges[start[f] + j] exactly when its bin <= j. Also returns the bin index
+# of every node of the flattened tables (0 for leaves).
+def bin_edges(feature, threshold, num_features=features.NUM_FEATURES):
+    per_feature = [sorted(set(t for f, t in zip(feature, threshold) if f == k)) for k in range(num_features)]
+    edges = []
+    start = []
+    for values in per_feature:
+        start.append(len(edges))
+        edges += values
+    start.append(len(edges))
+    bins = [per_feature[f].index(t) if f >= 0 else 0 for f, t in zip(feature, threshold)]
+    if max(bins) > 0xFF:
+        raise ValueError('More than 256 thresholds on one feature')
+    return edges, start, bins
+
+
+def emit_array(name, typecode, values, lines, per_line=8):
+    lines.append('{} = array({!r}, ('.format(name, typecode))
+    for i in range(0, len(values), per_line):
+        lines.append('    ' + ' '.join(repr(v) + ',' for v in values[i:i + per_line]))
+    lines.append('))')
+    lines.append('')
+
+
+# Every table of forest.MODEL_TABLES for trees, ROOTS in the given tree order and the
+# pre-filter limits of calibrate_prefilter
+def model_tables(trees, order=None, prefilter=(-1, -1, -1)):
+    if order is None:
+        order = list(range(len(trees)))
+    feature, threshold, right, roots = flatten(trees)
+    if len(feature) > 0xFFFF:
+        raise ValueError('{} nodes do not fit the RIGHT table'.format(len(feature)))
+    edges, start, bins = bin_edges(feature, threshold)
+    # fixed_threshold is monotonic, so the fixed edges keep the order of the float ones
+    fixed_edges = [fixed_threshold(f, t) for f in range(features.NUM_FEATURES) for t in edges[start[f]:start[f + 1]]]
+    return {
+        'ROOTS': [roots[t] for t in order],
+        'FEATURE': feature,
+        'RIGHT': right,
+        'THRESHOLD': threshold,
+        'FIXED_THRESHOLD': flatten(fixed_trees(trees))[1],
+        'BIN_START': start,
+        'BIN_EDGES': edges,
+        'FIXED_BIN_EDGES': fixed_edges,
+        'BIN_THRESHOLD': bins,
+        'PREFILTER': list(prefilter),
+        'FIXED_PREFILTER': [fixed_threshold(9 + k, t) for k, t in enumerate(prefilter)],
+    }
+
+
+def write_tables(trees, order=None, prefilter=(-1, -1, -1), labels=LABELS, source=MODEL_FILE, path=TABLES_FILE):
+    if order is None:
+        order = list(range(len(trees)))
+    tables = model_tables(trees, order, prefilter)
+    nodes = len(tables['FEATURE'])
+    lines = [
+        '# Generated by forest_tools.py from ' + source + ', do not edit.',
+        '# {} trees, {} nodes, see forest_tools.flatten for the layout.'.format(len(trees), nodes),
+        '# FIXED_THRESHOLD holds the thresholds of RandomForestFixed.py.',
+        '# BIN_THRESHOLD holds the same splits as bin indexes into BIN_EDGES (FIXED_BIN_EDGES),',
+        '# see forest_tools.bin_edges.',
+        '# PREFILTER (FIXED_PREFILTER) holds the accel, gyro and jerk peak limits of the',
+        '# cascade pre-filter, see forest_tools.calibrate_prefilter.',
+        '# ROOTS lists the trees in evaluation order for early exit: {}.'.format(
+            ' '.join('#{}'.format(t + 1) for t in order)),
+        'from array import array',
+        '',
+        'NUM_CLASSES = {}'.format(len(labels)),
+        'LABELS = ({})'.format(' '.join(repr(label) + ',' for label in labels)),
+        '',
+    ]
+    per_line = {'b': 16, 'B': 16, 'H': 16, 'i': 8, 'd': 4}
+    for name, typecode, _ in forest.MODEL_TABLES:
+        emit_array(name, typecode, tables[name], lines, per_line[typecode])
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines))
+    edges = len(tables['BIN_EDGES'])
+    bins = nodes + 2 * len(tables['BIN_START'])
+    print('Wrote {}: {} trees, {} nodes, {} bin edges'.format(path, len(trees), nodes, edges))
+    print('Threshold bytes: {} float, {} fixed, {} binned float, {} binned fixed'.format(
+        8 * nodes, 4 * nodes, bins + 8 * edges, bins + 4 * edges))
+
+
+# Binary model file read by forest.load_model, see forest.MODEL_HEADER
+def write_binary(trees, order=None, prefilter=(-1, -1, -1), labels=LABELS, path=BINARY_FILE):
+    tables = model_tables(trees, order, prefilter)
+    data = struct.pack(forest.MODEL_HEADER, forest.MODEL_MAGIC, forest.MODEL_VERSION, len(labels),
+                       features.NUM_FEATURES, 0, len(trees), len(tables['FEATURE']), len(tables['BIN_EDGES']), 0)
+    for label in labels:
+        name = label.encode()
+        data += bytes([len(name)]) + name
+    for name, typecode, _ in forest.MODEL_TABLES:
+        table = array(typecode, tables[name])
+        if sys.byteorder != 'little':
+            table.byteswap()
+        data += table.tobytes()
+    with open(path, 'wb') as f:
+        f.write(data)
+    print('Wrote {}: {} trees, {} nodes, {} bytes'.format(path, len(trees), len(tables['FEATURE']), len(data)))
+
+
+# Trees and class names of a fitted scikit-learn RandomForestClassifier. Each leaf votes
+# for its majority class, as the generated predict does.
+def sklearn_trees(estimator):
+    trees = []
+    for tree in estimator.estimators_:
+        t = tree.tree_
+
+        def node(i):
+            if t.children_left[i] == -1:
+                return ('leaf', int(t.value[i][0].argmax()))
+            return ('split', int(t.feature[i]), float(t.threshold[i]),
+                    node(t.children_left[i]), node(t.children_right[i]))
+
+        trees.append(node(0))
+    if all(isinstance(c, str) for c in estimator.classes_):
+        labels = [str(c) for c in estimator.classes_]
+    else:
+        labels = [LABELS[int(c)] for c in estimator.classes_]
+    return trees, labels
+
+
+def load_sklearn(path):
+    try:
+        import joblib
+        estimator = joblib.load(path)
+    except ImportError:
+        import pickle
+        with open(path, 'rb') as f:
+            estimator = pickle.load(f)
+    if estimator.n_features_in_ != features.NUM_FEATURES:
+        raise ValueError('Model takes {} features, not {}'.format(estimator.n_features_in_, features.NUM_FEATURES))
+    return sklearn_trees(estimator)
+
+
+# Feature vectors of the traces (a synthetic ride without traces), windows overlapping
+# by CALIBRATION_HOP samples to cover sliding-window classification too
+def trace_set(traces):
+    vectors = []
+    for path in traces or [None]:
+        accel, gyro = load_trace(path) if path else synthetic_trace(600)
+        vectors += trace_vectors(accel, gyro, hop=CALIBRATION_HOP)
+    return vectors
+
+
+# Early-exit tree order tuned on recorded feature vectors
+def tuned_order(trees, vectors):
+    order = tune_order(trees, vectors)
+    print('Trees per window with early exit on {} windows: {:.2f} in model order, {:.2f} tuned'.format(
+        len(vectors), mean_trees(trees, list(range(len(trees))), vectors), mean_trees(trees, order, vectors)))
+    return order
+
+
+# Pre-filter of the cascade: windows with accel_peak, gyro_peak and jerk_peak all at or
+# below the returned limits are labelled Normal without running the forest. The box
+# holds as many windows the forest labels Normal as possible, while keeping every
+# window of PREFILTER_KEEP out and a recall of at least `recall` for the other classes,
+# all relative to the forest labels. (-1, -1, -1) disables it.
+def calibrate_prefilter(trees, vectors, recall=PREFILTER_RECALL, steps=40):
+    labels = [argmax(votes(trees, x)) for x in vectors]
+    normal = [x for x, label in zip(vectors, labels) if label == 0]
+    others = [(x, label) for x, label in zip(vectors, labels) if label != 0]
+    allowed = int((1 - recall) * sum(1 for _, label in others if label not in PREFILTER_KEEP))
+    best = (0, (-1, -1, -1))
+
+    def candidates(k):
+        values = sorted(set(x[k] for x in normal))
+        return values[::max(1, len(values) // steps)] + values[-1:]
+
+    for a in candidates(9):
+        for g in candidates(10):
+            inside = [(x[11], label) for x, label in others if x[9] <= a and x[10] <= g]
+            limit = min([j for j, label in inside if label in PREFILTER_KEEP] or [float('inf')])
+            rest = sorted(j for j, label in inside if label not in PREFILTER_KEEP)
+            if len(rest) > allowed:
+                limit = min(limit, rest[allowed])
+            jerks = [x[11] for x in normal if x[9] <= a and x[10] <= g and x[11] < limit]
+            if len(jerks) > best[0]:
+                best = (len(jerks), (a, g, max(jerks)))
+    print('Pre-filter on {} windows: accel_peak <= {:.1f}, gyro_peak <= {:.1f}, jerk_peak <= {:.1f}, '
+          '{:.1%} of windows short-circuited'.format(len(vectors), *best[1], best[0] / max(len(vectors), 1)))
+    return best[1]
+
+
+def main(argv):
+    command = argv[0] if argv else 'fixed'
+    if command == 'sklearn':
+        trees, labels = load_sklearn(argv[1])
+        vectors = trace_set(argv[2:])
+        write_binary(trees, tuned_order(trees, vectors), calibrate_prefilter(trees, vectors), labels)
+        return
+    trees = load_trees()
+    if command == 'fixed':
+        write_fixed(trees)
+    elif command in ('tables', 'binary'):
+        vectors = trace_set(argv[1:])
+        order = tuned_order(trees, vectors)
+        prefilter = calibrate_prefilter(trees, vectors)
+        if command == 'tables':
+            write_tables(trees, order, prefilter)
+        else:
+            write_binary(trees, order, prefilter)
+    else:
+        print('Unknown command ' + command)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
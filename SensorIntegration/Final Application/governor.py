@@ -0,0 +1,111 @@
+from perf import ticks_ms, ticks_diff
+
+# Rate profiles: name, ODR/BDR field of CTRL1_XL, CTRL2_G and FIFO_CTRL3, sample rate in
+# Hz, the hop (FIFO watermark) in ms and the sensor low-power modes (set_rate). Low while
+# the ride is calm, high around events. The gyro is never powered down, the features
+# tagged accel come from it. Whatever the rate, the features are computed on the 26Hz
+# grid (features.GridFeed).
+PROFILES = (
+    ('low', 1, 12.5, 2000, True),
+    ('normal', 2, 26, 250, False),
+    ('high', 4, 104, 125, False),
+)
+LOW = 0
+NORMAL = 1
+HIGH = 2
+# Peaks above ESCALATE times the pre-filter limits switch to the high profile
+ESCALATE = 1.25
+# Time the high profile is held after the last escalating window
+HIGH_HOLD_MS = 3000
+# Time of Normal windows with every peak within the limits before dropping to low
+CALM_MS = 5000
+
+
+# FIFO watermark in words for one hop of profile, words per sample pair as in
+# main.hop_watermark (3 with a timestamp word each)
+def profile_watermark(profile, words=3):
+    hz, hop_ms = PROFILES[profile][2:4]
+    return words * max(1, int(hz * hop_ms / 1000))
+
+
+# Switch the driver p to profile, with the free-fall duration of the events too. Returns
+# the new sample rate in Hz (GridFeed.set_rate).
+def set_profile(p, profile, events=False, words=3):
+    _, odr, hz, _, low_power = PROFILES[profile]
+    p.set_rate(odr, profile_watermark(profile, words), low_power)
+    if events:
+        p.load_event_settings(hz)
+    return hz
+
+
+# Picks the rate profile from the label and peaks of every window: HIGH while the accel or
+# jerk peak is well above the calibrated pre-filter limits (forest_model.PREFILTER, the
+# squared FIXED_PREFILTER with fixed) and for HIGH_HOLD_MS after, LOW after CALM_MS of
+# Normal windows within the limits, NORMAL otherwise. The features stay comparable across
+# rates only with FIFO timestamps and GridFeed, jerk then spans the real time of the grid
+# samples. clock gives the time in ms (ticks_ms, or the simulated time on the host).
+# limits are those of the running model (forest.ArrayForest.peak_limits, forest_model's
+# if None). A model without calibrated limits (-1) keeps the profile at NORMAL.
+class RateGovernor:
+    def __init__(self, limits=None, fixed=False, clock=ticks_ms):
+        if limits is None:
+            import forest_model
+            limits = forest_model.FIXED_PREFILTER if fixed else forest_model.PREFILTER
+        self.enabled = limits[0] >= 0 and limits[1] >= 0 and limits[2] >= 0
+        # Squared peaks need the squared factor
+        factor = ESCALATE * ESCALATE if fixed else ESCALATE
+        self.limits = limits
+        self.accel_limit = limits[0] * factor
+        self.jerk_limit = limits[2] * factor
+        self.clock = clock
+        self.profile = NORMAL
+        self.high_ms = 0
+        self.calm_ms = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.switches = 0
+        self.time_ms = [0] * len(PROFILES)
+        self.last_ms = self.clock()
+
+    # Label (True for Normal) and feature vector x of the last window. Returns the new
+    # profile after a switch, None while it stays.
+    def update(self, normal, x):
+        if not self.enabled:
+            return None
+        now = self.clock()
+        if x[9] > self.accel_limit or x[11] > self.jerk_limit:
+            self.high_ms = now
+            self.calm_ms = None
+            target = HIGH
+        elif self.profile == HIGH and ticks_diff(now, self.high_ms) < HIGH_HOLD_MS:
+            target = HIGH
+        else:
+            limits = self.limits
+            if normal and x[9] <= limits[0] and x[10] <= limits[1] and x[11] <= limits[2]:
+                if self.calm_ms is None:
+                    self.calm_ms = now
+            else:
+                self.calm_ms = None
+            if self.calm_ms is not None and ticks_diff(now, self.calm_ms) >= CALM_MS:
+                target = LOW
+            else:
+                target = NORMAL
+        if target == self.profile:
+            return None
+        self._account(now)
+        self.profile = target
+        self.switches += 1
+        return target
+
+    def _account(self, now):
+        self.time_ms[self.profile] += ticks_diff(now, self.last_ms)
+        self.last_ms = now
+
+    def report(self):
+        if not self.enabled:
+            return 'Rate: no calibrated peak limits, normal only'
+        self._account(self.clock())
+        total = max(sum(self.time_ms), 1)
+        return 'Rate: {} switches, {}'.format(self.switches, ', '.join(
+            '{} {:.0f}%'.format(PROFILES[i][0], 100 * t / total) for i, t in enumerate(self.time_ms)))
@@ -0,0 +1,127 @@
+from array import array
+
+# FIFO tags as used by calculate_kinematic_features: 1 = accel, 2 = gyro
+TAG_ACCEL		=	1
+TAG_GYRO		=	2
+# FIFO timestamp word (CTRL10_C TIMESTAMP_EN), stamps the sensor words after it
+TAG_TIMESTAMP	=	4
+# Timestamp counter resolution
+TS_TICK_US		=	25
+
+# Number of window slots kept in the ring (replaces ml_data = [[], [], [], []])
+RING_WINDOWS	=	4
+
+
+class IMURing:
+    def __init__(self, capacity):
+        # Number of samples kept per channel
+        self.capacity = capacity
+
+        # Signed x, y, z samples interleaved, one channel per sensor
+        self.accel = array('h', bytes(6 * capacity))
+        self.gyro = array('h', bytes(6 * capacity))
+
+        # Sensor timestamp (TS_TICK_US ticks) of every sample, set once the FIFO carries
+        # timestamp words (timed)
+        self.accel_ts = array('I', bytes(4 * capacity))
+        self.gyro_ts = array('I', bytes(4 * capacity))
+        self.ts = 0
+        self.timed = False
+
+        # Next sample index to write in each channel
+        self.accel_head = 0
+        self.gyro_head = 0
+        # Whether the head went round once, index 0 then has a sample before it
+        self.accel_wrapped = False
+        self.gyro_wrapped = False
+
+        # Start index and number of samples of the last RING_WINDOWS windows
+        self.accel_start = array('H', bytes(2 * RING_WINDOWS))
+        self.accel_count = array('H', bytes(2 * RING_WINDOWS))
+        self.gyro_start = array('H', bytes(2 * RING_WINDOWS))
+        self.gyro_count = array('H', bytes(2 * RING_WINDOWS))
+
+        # Slot of the window currently being filled
+        self.slot = 0
+
+    # Decode raw 7-byte FIFO words (tag + X/Y/Z little endian) straight into the channels
+    def push_fifo(self, buf, words):
+        end = words * 7
+        offset = 0
+        while offset < end:
+            tag = buf[offset] >> 3
+            x = buf[offset + 1] | (buf[offset + 2] << 8)
+            y = buf[offset + 3] | (buf[offset + 4] << 8)
+            if tag == TAG_TIMESTAMP:
+                # TIMESTAMP[31:0] in the X and Y bytes
+                self.ts = x | (y << 16)
+                self.timed = True
+                offset += 7
+                continue
+            z = buf[offset + 5] | (buf[offset + 6] << 8)
+            self.push(tag,
+                      x - 65536 if x >= 32768 else x,
+                      y - 65536 if y >= 32768 else y,
+                      z - 65536 if z >= 32768 else z)
+            offset += 7
+
+    # Store a single signed sample in the channel selected by its tag
+    def push(self, tag, x, y, z):
+        slot = self.slot
+        if tag == TAG_ACCEL:
+            channel = self.accel
+            i = self.accel_head
+            self.accel_ts[i] = self.ts
+            if i + 1 < self.capacity:
+                self.accel_head = i + 1
+            else:
+                self.accel_head = 0
+                self.accel_wrapped = True
+            if self.accel_count[slot] < self.capacity:
+                self.accel_count[slot] += 1
+        elif tag == TAG_GYRO:
+            channel = self.gyro
+            i = self.gyro_head
+            self.gyro_ts[i] = self.ts
+            if i + 1 < self.capacity:
+                self.gyro_head = i + 1
+            else:
+                self.gyro_head = 0
+                self.gyro_wrapped = True
+            if self.gyro_count[slot] < self.capacity:
+                self.gyro_count[slot] += 1
+        else:
+            return
+        i *= 3
+        channel[i] = x
+        channel[i + 1] = y
+        channel[i + 2] = z
+
+    # Microseconds between the sample at index i of a channel's timestamps and the one
+    # before it, 0 without timestamps or for the first sample the channel got
+    def dt_us(self, ts, i):
+        if not self.timed:
+            return 0
+        if i:
+            prev = i - 1
+        elif self.accel_wrapped if ts is self.accel_ts else self.gyro_wrapped:
+            prev = self.capacity - 1
+        else:
+            return 0
+        return ((ts[i] - ts[prev]) & 0xFFFFFFFF) * TS_TICK_US
+
+    # Close the window being filled and start the next one, returns the closed slot
+    def end_window(self):
+        slot = self.slot
+        # A window longer than the ring keeps only its newest samples
+        if self.accel_count[slot] == self.capacity:
+            self.accel_start[slot] = self.accel_head
+        if self.gyro_count[slot] == self.capacity:
+            self.gyro_start[slot] = self.gyro_head
+        nxt = (slot + 1) % RING_WINDOWS
+        self.accel_start[nxt] = self.accel_head
+        self.gyro_start[nxt] = self.gyro_head
+        self.accel_count[nxt] = 0
+        self.gyro_count[nxt] = 0
+        self.slot = nxt
+        return slot
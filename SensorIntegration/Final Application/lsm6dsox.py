@@ -0,0 +1,533 @@
+try:
+    from machine import I2C, Pin
+except ImportError:
+    # Off-target (CPython / unix port), the bus and pins come from lsm6dsox_sim.py
+    I2C = Pin = None
+from perf import ticks_us, ticks_diff, LatencyStats
+from imu_ring import IMURing
+import time
+
+# Define register addresses
+LSM6DSOX_ADDR	= 	0x6A
+FUNC_CFG_ACCESS	=	0x01
+FIFO_CTRL1 		= 	0x07
+FIFO_CTRL2 		= 	0x08
+FIFO_CTRL3 		= 	0x09
+FIFO_CTRL4 		= 	0x0A
+INT1_CTRL 		= 	0x0D
+INT2_CTRL 		= 	0x0E
+WHO_AM_I_REG 	= 	0x0F
+CTRL1_XL 		= 	0x10
+CTRL2_G 		= 	0x11
+CTRL3_C			= 	0x12
+CTRL6_C			=	0x15
+CTRL7_G			=	0x16
+CTRL10_C		=	0x19
+WAKE_UP_SRC 	= 	0x1B
+TAP_SRC			=	0x1C
+FIFO_STATUS1	=	0x3A
+FIFO_STATUS2	=	0x3B
+MLC_STATUS_MAINPAGE	=	0x38
+WAKE_UP_THS		= 	0x5B
+WAKE_UP_DUR		=	0x5C
+FREE_FALL		=	0x5D
+MD1_CFG			=	0x5E
+MD2_CFG			=	0x5F
+FIFO_DO_TAG		=	0x78
+FIFO_DO_XL		=  	0x79
+FIFO_DO_XH		=	0x7A
+FIFO_DO_YL		=  	0x7B
+FIFO_DO_YH		=	0x7C
+FIFO_DO_ZL		=  	0x7D
+FIFO_DO_ZH		=	0x7E
+TAP_CFG0		=	0x56
+TAP_CFG1		=	0x57
+TAP_CFG2		=	0x58
+TAP_THS_6D		=	0x59
+INT_DUR2		=	0x5A
+
+# Embedded functions registers, reached with FUNC_CFG_ACCESS bit 7 set
+PAGE_RW			=	0x17
+EMB_FUNC_EN_B	=	0x05
+MLC_INT1		=	0x0D
+EMB_FUNC_ODR_CFG_C	=	0x60
+EMB_FUNC_INIT_B	=	0x67
+MLC0_SRC		=	0x70
+
+# Free-fall time before the event, see load_event_settings
+FF_DURATION_S	=	0.23
+
+# WAKE_UP_SRC event bits
+FF_IA			=	0x20
+WU_IA			=	0x08
+# TAP_SRC event bit
+TAP_IA			=	0x40
+# Single-tap threshold of the crash alert in FS_XL/2^5 steps, see load_event_settings
+CRASH_TAP_THS	=	6
+
+# FIFO burst read
+FIFO_WORD_SIZE	=	7		# 1 byte tag + 6 bytes data
+FIFO_BURST_WORDS=	32		# Words read per auto-incrementing transaction
+FIFO_MAX_WORDS	=	256		# Size of the preallocated drain buffer in words
+FIFO_WATERMARK	=	0x34	# Words per window (accel + gyro at 26Hz for 1 second)
+FIFO_TS_WATERMARK=	0x4E	# Words per window with a timestamp word per sample pair
+RING_CAPACITY	=	512		# Samples kept per channel in the IMU ring buffer
+
+# Shadow registers
+# Read/write control register blocks mirrored by the shadow (first, last), WHO_AM_I is skipped
+SHADOW_BLOCKS	=	((FIFO_CTRL1, CTRL10_C), (TAP_CFG0, MD2_CFG))
+# Unchanged registers a burst write may re-write to join two changed ones
+SHADOW_MAX_GAP	=	2
+
+
+class Adafruit_LSM6DSOX:
+    def __init__(self, pin_scl, pin_sda, freq, i2c=None, int1=None, int2=None):
+        # An I2C bus and INT pins can be passed in, e.g. the host simulator in lsm6dsox_sim.py
+        self.device = i2c if i2c is not None else I2C(1, scl = pin_scl, sda = pin_sda, freq = freq)
+        self.int1 = int1 if int1 is not None else Pin(32, Pin.IN)
+        self.int2 = int2 if int2 is not None else Pin(33, Pin.IN)
+        self.fifo_over = 0
+        # Decoded samples of the last windows, replaces ml_data = [[], [], [], []]
+        self.ring = IMURing(RING_CAPACITY)
+        # Preallocated buffer the FIFO is burst read into
+        self.fifo_buf = bytearray(FIFO_MAX_WORDS * FIFO_WORD_SIZE)
+        self.fifo_mv = memoryview(self.fifo_buf)
+        self.fifo_words = 0
+        self.i2c_time_us = 0
+        # Bus time and words of every drain since the last reset, for the periodic stats
+        self.drain_time = LatencyStats()
+        self.drain_words = 0
+        # Watermark interrupt hand-off, see enable_fifo_irq
+        self.fifo_pending = False
+        self.irq_us = 0
+        self.wake_latency = LatencyStats()
+        # Set by the irq handlers as well if given (a uasyncio.ThreadSafeFlag a task waits on)
+        self.irq_flag = None
+        # Last value written to/read from each control register, see write_config
+        self.shadow = bytearray(0x80)
+        self.shadow_valid = bytearray(0x80)
+        self.verify = False
+        self.config_transactions = 0
+        self.config_bytes = 0
+        # Machine Learning Core interrupt hand-off, see enable_mlc
+        self.mlc_pending = False
+        self.mlc_class = 0
+    
+    def scan(self):
+        return self.device.scan()
+    
+# Write one byte     
+    def write_8(self, addr, data):
+        try:
+            self.device.writeto_mem(LSM6DSOX_ADDR, addr, bytes([data]), addrsize = 8)
+            self.shadow[addr] = data
+            self.shadow_valid[addr] = 1
+        except OSError:
+            self.shadow_valid[addr] = 0
+            print('Failed to write the register' + str(addr))
+# Read one byte  
+    def read_8(self, addr):
+        try :
+            data = self.device.readfrom_mem(LSM6DSOX_ADDR, addr, 1)
+        except OSError :
+            print('Failed to read from register' + str(addr))
+        return data[0]
+    
+# Read two bytes
+    def read_16(self, addr):
+        try :
+            data = self.device.readfrom_mem(LSM6DSOX_ADDR, addr, 2)
+        except OSError:
+            print('Failed to read from register' + str(addr))
+        return (data[1] << 8 | data[0])
+    
+# Registers the shadow may cover
+    def shadowed(self, addr):
+        if addr == WHO_AM_I_REG:
+            return False
+        for first, last in SHADOW_BLOCKS:
+            if first <= addr <= last:
+                return True
+        return False
+
+# Read the control register blocks into the shadow, e.g. after a wake from deep sleep
+# where the sensor kept its configuration and only the MCU state was lost
+    def sync_shadow(self):
+        for first, last in SHADOW_BLOCKS:
+            try:
+                data = self.device.readfrom_mem(LSM6DSOX_ADDR, first, last - first + 1)
+            except OSError:
+                print('Failed to read registers from ' + str(first))
+                continue
+            for i in range(len(data)):
+                if self.shadowed(first + i):
+                    self.shadow[first + i] = data[i]
+                    self.shadow_valid[first + i] = 1
+
+# Control register blocks of the shadow as bytes, the configuration a warm boot checks
+# the sensor still holds (resume)
+    def shadow_image(self):
+        image = bytearray()
+        for first, last in SHADOW_BLOCKS:
+            image.extend(self.shadow[first:last + 1])
+        return bytes(image)
+
+# Warm boot from deep sleep: read the sensor's registers into the shadow instead of
+# writing the settings. Returns True if it still holds the configuration of image (it
+# kept power, the FIFO and its samples are left alone), False if it has to be set up
+# again with begin and the load_* settings.
+    def resume(self, image):
+        if not image or self.read_8(WHO_AM_I_REG) != 0x6c:
+            return False
+        self.sync_shadow()
+        return self.shadow_image() == image
+
+    def invalidate_shadow(self):
+        for i in range(len(self.shadow_valid)):
+            self.shadow_valid[i] = 0
+
+# Write a sequence of (register, value) pairs. Registers whose shadow already holds the
+# value are skipped, and changed registers close to each other are merged into a single
+# auto-increment write (re-writing the unchanged ones in between from the shadow).
+# With verify set every write is read back. Returns False if a write failed.
+    def write_config(self, settings):
+        changes = {}
+        for addr, value in settings:
+            if self.shadow_valid[addr] and self.shadow[addr] == value:
+                changes.pop(addr, None)
+            else:
+                changes[addr] = value
+        if not changes:
+            return True
+        # Bursts rely on IF_INC (CTRL3_C bit 2, set after reset)
+        burst = not self.shadow_valid[CTRL3_C] or self.shadow[CTRL3_C] & 0x04
+        addrs = sorted(changes)
+        ok = True
+        i = 0
+        while i < len(addrs):
+            first = last = addrs[i]
+            i += 1
+            while burst and i < len(addrs) and addrs[i] - last - 1 <= SHADOW_MAX_GAP \
+                    and self.joinable(last, addrs[i]):
+                last = addrs[i]
+                i += 1
+            data = bytearray(last - first + 1)
+            for addr in range(first, last + 1):
+                data[addr - first] = changes[addr] if addr in changes else self.shadow[addr]
+            ok = self.write_block(first, data) and ok
+        return ok
+
+# True if every register between two changed ones can be re-written from the shadow
+    def joinable(self, last, addr):
+        for gap in range(last + 1, addr):
+            if not self.shadowed(gap) or not self.shadow_valid[gap]:
+                return False
+        return self.shadowed(last) and self.shadowed(addr)
+
+    def write_block(self, first, data):
+        self.config_transactions += 1
+        self.config_bytes += len(data)
+        try:
+            self.device.writeto_mem(LSM6DSOX_ADDR, first, data, addrsize = 8)
+        except OSError:
+            print('Failed to write the registers from ' + str(first))
+            for i in range(len(data)):
+                self.shadow_valid[first + i] = 0
+            return False
+        for i in range(len(data)):
+            self.shadow[first + i] = data[i]
+            self.shadow_valid[first + i] = 1
+        # Software reset and reboot bits clear themselves and reset the other registers
+        if first <= CTRL3_C < first + len(data) and data[CTRL3_C - first] & 0x81:
+            self.invalidate_shadow()
+            return True
+        if self.verify:
+            try:
+                readback = self.device.readfrom_mem(LSM6DSOX_ADDR, first, len(data))
+            except OSError:
+                readback = b''
+            if readback != bytes(data):
+                print('Register verify failed from ' + str(first))
+                for i in range(len(data)):
+                    self.shadow_valid[first + i] = 0
+                return False
+        return True
+
+# Configure FIFO settings. With timestamps every batch of samples is preceded by a
+# timestamp word (tag 0x04) the ring buffer stamps the samples with, 3 words per sample
+# pair, so the watermark has to count them (FIFO_TS_WATERMARK)
+    def load_fifo_settings(self, watermark=FIFO_WATERMARK, timestamps=False):
+        self.write_config((
+            # Register depth of FIFO threshold, default 52d/0x34
+            # 26 words (1 byte tag + 6 bytes data) per second
+            # 1 second of both accelerometer and gyroscope data
+            (FIFO_CTRL1, watermark & 0xFF),
+
+            # Limit the FIFO depth to threshold - 8th bit is high
+            (FIFO_CTRL2, 0x80 | (watermark >> 8) & 0x01),
+
+            # Register the batch data rate (26Hz) for the gyro and accelerometer
+            (FIFO_CTRL3, 0x22),
+
+            # Register FIFO fill mode to continuous mode
+            # DEC_TS_BATCH (7-6th bits) batches a timestamp with every sample
+            (FIFO_CTRL4, 0x46 if timestamps else 0x06),
+
+            # Enable the timestamp counter (TIMESTAMP_EN, 25us resolution)
+            (CTRL10_C, 0x20 if timestamps else 0x00),
+
+            # Register interrupt control register - fifo threshold interrupts to INT1
+            (INT1_CTRL, 0x08),
+        ))
+    
+
+# Switch accelerometer, gyroscope and FIFO batching to another ODR field (1 = 12.5Hz,
+# 2 = 26Hz, 3 = 52Hz, 4 = 104Hz ...) and the FIFO watermark to the new hop, full scales
+# as in load_settings. low_power leaves high-performance mode (XL_HM_MODE, G_HM_MODE)
+# for the ODR dependent low-power modes. The sleep duration counts 512 samples per step,
+# it is rescaled to stay near the 19.69s of load_settings. Only the changed registers
+# are written. A switch restarts the inactivity count by turning INACT_EN off and on
+# again, the samples counted at the old ODR would otherwise count against the new
+# SLEEP_DUR and sleep the sensor early (11.2s after a 104Hz to 26Hz switch).
+    def set_rate(self, odr, watermark, low_power=False):
+        sleep_dur = min(15, max(1, int(12.5 * (1 << (odr - 1)) / 26 + 0.5)))
+        switch = not self.shadow_valid[CTRL1_XL] or self.shadow[CTRL1_XL] >> 4 != odr
+        ok = self.write_config((
+            (WAKE_UP_DUR, 0b01100000 | sleep_dur),
+            (CTRL6_C, 0x10 if low_power else 0x00),
+            (CTRL7_G, 0x80 if low_power else 0x00),
+            (FIFO_CTRL1, watermark & 0xFF),
+            (FIFO_CTRL2, 0x80 | (watermark >> 8) & 0x01),
+            (FIFO_CTRL3, odr << 4 | odr),
+            (CTRL1_XL, odr << 4 | 0b0100),
+            (CTRL2_G, odr << 4 | 0b1100),
+        ))
+        inact = self.shadow[TAP_CFG2]
+        if switch and self.shadow_valid[TAP_CFG2] and inact & 0x60:
+            self.write_8(TAP_CFG2, inact & ~0x60)
+            self.write_8(TAP_CFG2, inact)
+        return ok
+
+# Configure the registers
+    def load_settings(self):
+        self.write_config((
+            # Register output data rate (26Hz) and full scale (+/-16g) for accelerometer
+            (CTRL1_XL, 0b00100100),
+
+            # Register output data rate (26Hz) and full scale (+/-2000dps) for gyroscope
+            (CTRL2_G,  0b00101100),
+
+            # Register wake up duration threshold set to 3 * (1/ODR) = 0.115s
+            # Wake up lsb setting to FS_XL/2^6 = 0.25g
+            # Sleep duration event to 1 * 512/ODR = 19.69s
+            (WAKE_UP_DUR, 0b01100001),
+
+            # Register wake-up threshold to 3 * 0.25g = 0.75g
+            (WAKE_UP_THS, 0b00000011),
+
+            # Enable the basic interrupts bit, activity/inactivity function (8th bit)
+            # Sets accelerometer to low-power mode (12.5Hz)/ gyroscope in power-down
+            # when in sleep mode (7-6th bits)
+            (TAP_CFG2, 0b11100000),
+
+            # Enable sleep status reporting on INT2 pins
+            (TAP_CFG0, 0x20),
+
+            # Register interrupt control register to detect inactivity/activity on INT2
+            (MD2_CFG, 0x80),
+        ))
+           
+        
+# Check if the right sensor is connected, and load all settings/configuration registers                                                    
+    def begin(self):
+        if self.read_8(WHO_AM_I_REG) == 0x6c:
+            # Only registers that differ from what the sensor holds are written
+            self.sync_shadow()
+            self.load_settings()
+            print('Device setup successful' )
+        else:
+            print('Failed to communicate with LSM6DSOX. Check connections')
+        
+# Route free-fall and single-tap events to INT1 next to the FIFO watermark, latched until
+# read_events reads WAKE_UP_SRC and TAP_SRC. Every INT1 edge then needs a read_events before
+# the drain. The free-fall duration is counted in samples, rate_hz keeps it at 0.23s (set_rate)
+    def load_event_settings(self, rate_hz=26):
+        ff_dur = min(31, max(1, int(FF_DURATION_S * rate_hz + 0.5)))
+        self.write_config((
+            # Free-fall below 312mg on all axes for 6 samples (0.23s at 26Hz)
+            (FREE_FALL, ff_dur << 3 | 0b011),
+
+            # Latch the events (LIR), sleep status reporting on INT2 as in load_settings,
+            # single tap on X, Y and Z
+            (TAP_CFG0, 0x2F),
+
+            # Tap threshold lsb setting to FS_XL/2^5 = 0.5g, 6 * 0.5g = 3g on each axis.
+            # The crash alert's own threshold: the 0.75g of WAKE_UP_THS also drives the
+            # activity/inactivity function and is crossed by road bumps
+            (TAP_CFG1, CRASH_TAP_THS),
+            # Interrupts and activity/inactivity function as in load_settings
+            (TAP_CFG2, 0b11100000 | CRASH_TAP_THS),
+            (TAP_THS_6D, CRASH_TAP_THS),
+
+            # Shock window 4/ODR (SHOCK = 0), the slope has to drop back within it
+            (INT_DUR2, 0x00),
+
+            # Free-fall and single-tap events to INT1
+            (MD1_CFG, 0x50),
+        ))
+
+# Free-fall bit of WAKE_UP_SRC and tap bit of TAP_SRC, read together. Reading them
+# clears the latched events
+    def read_events(self):
+        events = self.read_16(WAKE_UP_SRC)
+        return events & FF_IA | events >> 8 & TAP_IA
+
+# Poll fifo interrupts                 
+    def fifo_interrupt_en(self):
+        self.fifo_over = 0
+        if self.int1.value():
+            # Edge timestamped by fifo_irq when the irq is enabled
+            if self.fifo_pending:
+                self.fifo_pending = False
+                self.wake_latency.add(ticks_diff(ticks_us(), self.irq_us))
+            self.read_data()
+
+# Route the INT1 watermark line to an irq handler instead of polling it
+# The handler only timestamps the edge and flags the drain for the main loop
+    def enable_fifo_irq(self):
+        self.int1.irq(handler=self.fifo_irq, trigger=self.int1.IRQ_RISING)
+        # A watermark already pending has no rising edge left to catch
+        if self.int1.value():
+            self.fifo_irq(self.int1)
+
+    def fifo_irq(self, pin):
+        self.irq_us = ticks_us()
+        self.fifo_pending = True
+        if self.irq_flag is not None:
+            self.irq_flag.set()
+
+# Drain the FIFO flagged by fifo_irq and record the wake-to-drain latency
+    def service_fifo(self):
+        self.fifo_over = 0
+        if not self.fifo_pending:
+            return
+        self.fifo_pending = False
+        self.wake_latency.add(ticks_diff(ticks_us(), self.irq_us))
+        self.read_data()
+        # INT1 stays high if the drain left the level above the watermark
+        if self.int1.value():
+            self.fifo_irq(self.int1)
+
+# Burst read a number of FIFO words into the drain buffer
+# FIFO_DATA_OUT rolls over from 0x7E back to FIFO_DO_TAG while the FIFO is not empty,
+# so each transaction returns whole 7-byte words (tag + X/Y/Z)
+    def read_fifo_burst(self, words):
+        offset = 0
+        while words > 0:
+            n = min(words, FIFO_BURST_WORDS) * FIFO_WORD_SIZE
+            try:
+                self.device.readfrom_mem_into(LSM6DSOX_ADDR, FIFO_DO_TAG, self.fifo_mv[offset:offset + n])
+            except OSError:
+                print('Failed to burst read the FIFO')
+                return offset // FIFO_WORD_SIZE
+            offset += n
+            words -= FIFO_BURST_WORDS
+        return offset // FIFO_WORD_SIZE
+
+# Read and store the FIFO data if an interrupt is detected                
+    def read_data(self):
+        fifo_status = self.read_16(FIFO_STATUS1)
+        fifo_full = fifo_status >> 15 
+        fifo_size = min(int(fifo_status & 0x03FF), FIFO_MAX_WORDS)
+        if fifo_full == 1:
+            start = ticks_us()
+            words = self.read_fifo_burst(fifo_size)
+            self.i2c_time_us = ticks_diff(ticks_us(), start)
+            self.fifo_words = words
+            self.drain_time.add(self.i2c_time_us)
+            self.drain_words += words
+            # Decode the words straight into the ring buffer channels
+            self.ring.push_fifo(self.fifo_buf, words)
+            self.fifo_over = 1
+
+
+# Read one byte of the embedded functions bank
+    def read_emb(self, addr):
+        self.device.writeto_mem(LSM6DSOX_ADDR, FUNC_CFG_ACCESS, b'\x80', addrsize = 8)
+        try:
+            data = self.device.readfrom_mem(LSM6DSOX_ADDR, addr, 1)
+        finally:
+            self.device.writeto_mem(LSM6DSOX_ADDR, FUNC_CFG_ACCESS, b'\x00', addrsize = 8)
+        return data[0]
+
+# Write a sequence of (register, value) pairs to the embedded functions bank. The bank
+# shares addresses with the main page (MLC_INT1 is INT1_CTRL), so the shadow is bypassed
+    def write_emb(self, settings):
+        try:
+            self.device.writeto_mem(LSM6DSOX_ADDR, FUNC_CFG_ACCESS, b'\x80', addrsize = 8)
+            for addr, value in settings:
+                self.device.writeto_mem(LSM6DSOX_ADDR, addr, bytes([value]), addrsize = 8)
+            self.device.writeto_mem(LSM6DSOX_ADDR, FUNC_CFG_ACCESS, b'\x00', addrsize = 8)
+        except OSError:
+            print('Failed to write the embedded functions registers')
+            return False
+        return True
+
+# Play a .ucf register file (ST's MLC tool output with the MLC program): "Ac <reg> <value>"
+# writes and "WAIT <ms>" delays, in hex. The file switches register banks itself, so the
+# writes bypass the shadow, which is read back from the sensor afterwards
+    def load_ucf(self, path):
+        with open(path) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) == 3 and fields[0] == 'Ac':
+                    self.device.writeto_mem(LSM6DSOX_ADDR, int(fields[1], 16), bytes([int(fields[2], 16)]),
+                                            addrsize = 8)
+                elif len(fields) == 2 and fields[0] == 'WAIT':
+                    time.sleep(int(fields[1]) / 1000)
+        self.invalidate_shadow()
+        self.sync_shadow()
+
+# Run the Machine Learning Core program loaded by load_ucf at 26Hz and route a change of
+# its MLC0_SRC result to INT1, latched until mlc_irq's handler reads it (read_mlc).
+# INT1 then no longer carries the FIFO watermark, the FIFO is not needed for the MLC.
+    def enable_mlc(self):
+        ok = self.write_emb((
+            # EMB_FUNC_LIR, latch the embedded function interrupts
+            (PAGE_RW, 0x80),
+            # MLC_ODR 26Hz (bits 0 and 2 must stay set)
+            (EMB_FUNC_ODR_CFG_C, 0x15),
+            # INT1_MLC1
+            (MLC_INT1, 0x01),
+            # MLC_EN
+            (EMB_FUNC_EN_B, 0x10),
+            # MLC_INIT, restart the windows with the new program
+            (EMB_FUNC_INIT_B, 0x10),
+        ))
+        # INT1_EMB_FUNC, nothing else on INT1
+        ok = self.write_config(((INT1_CTRL, 0x00), (MD1_CFG, 0x02))) and ok
+        self.mlc_pending = False
+        self.int1.irq(handler=self.mlc_irq, trigger=self.int1.IRQ_RISING)
+        if self.int1.value():
+            self.mlc_irq(self.int1)
+        return ok
+
+    def mlc_irq(self, pin):
+        self.irq_us = ticks_us()
+        self.mlc_pending = True
+        if self.irq_flag is not None:
+            self.irq_flag.set()
+
+# Class of the last MLC window (MLC0_SRC), reading MLC_STATUS_MAINPAGE clears the interrupt
+    def read_mlc(self):
+        self.read_8(MLC_STATUS_MAINPAGE)
+        self.mlc_class = self.read_emb(MLC0_SRC)
+        return self.mlc_class
+
+# New class flagged by mlc_irq, None if the MLC result has not changed
+    def service_mlc(self):
+        if not self.mlc_pending:
+            return None
+        self.mlc_pending = False
+        self.wake_latency.add(ticks_diff(ticks_us(), self.irq_us))
+        return self.read_mlc()
@@ -0,0 +1,639 @@
+# Usage: RUN ON PC (CPython or the MicroPython unix port)
+# Register level LSM6DSOX simulator behind a fake I2C bus, fed from recorded traces.
+# Exposes the machine.I2C readfrom_mem/readfrom_mem_into/writeto_mem interface and
+# machine.Pin style INT1/INT2 lines so lsm6dsox.Adafruit_LSM6DSOX runs unmodified.
+import random
+from lsm6dsox import (LSM6DSOX_ADDR, FIFO_CTRL1, FIFO_CTRL2, FIFO_CTRL3, FIFO_CTRL4,
+                      INT1_CTRL, INT2_CTRL, WHO_AM_I_REG, CTRL1_XL, CTRL2_G, CTRL3_C, CTRL6_C,
+                      CTRL7_G, CTRL10_C,
+                      WAKE_UP_SRC, FIFO_STATUS1, FIFO_STATUS2, WAKE_UP_THS, WAKE_UP_DUR,
+                      FREE_FALL, MD1_CFG, MD2_CFG, FIFO_DO_TAG, FIFO_DO_ZH, TAP_CFG0, TAP_CFG1,
+                      TAP_CFG2, TAP_THS_6D, INT_DUR2, TAP_SRC,
+                      FUNC_CFG_ACCESS, MLC_STATUS_MAINPAGE, PAGE_RW, EMB_FUNC_EN_B, MLC_INT1,
+                      EMB_FUNC_ODR_CFG_C, EMB_FUNC_INIT_B, MLC0_SRC)
+
+# Output data rates in Hz for the ODR_XL, ODR_G and BDR fields
+ODR_HZ			=	(0, 12.5, 26, 52, 104, 208, 416, 833, 1666, 3333, 6667, 1.6, 0, 0, 0, 0)
+# Accelerometer full scale in g for the FS_XL field
+FS_XL_G			=	(2, 16, 4, 8)
+# Free-fall thresholds in mg for the FF_THS field
+FF_THS_MG		=	(156, 219, 250, 312, 344, 406, 469, 500)
+# Accelerometer rate while the sensor is in sleep state (low-power 12.5 Hz)
+SLEEP_ODR_XL	=	12.5
+
+# FIFO depth in words (1 byte tag + 6 bytes data)
+FIFO_DEPTH		=	512
+
+# FIFO tag sensor codes
+TAG_GYRO_NC		=	0x01
+TAG_XL_NC		=	0x02
+TAG_TIMESTAMP	=	0x04
+# Timestamp counter resolution, and batches per timestamp word for the DEC_TS_BATCH field
+TS_TICK_US		=	25
+TS_DECIMATION	=	(0, 1, 8, 32)
+
+# Supply current in uA, approximate typical datasheet figures for the energy estimate:
+# high-performance mode draws the same at any ODR, the low-power modes (XL_HM_MODE,
+# G_HM_MODE) scale with the ODR (index of ODR_HZ, up to 208Hz)
+XL_HP_UA		=	170
+G_HP_UA			=	380
+XL_LP_UA		=	(0, 12, 20, 35, 65, 120)
+G_LP_UA			=	(0, 290, 320, 360, 420, 540)
+POWER_DOWN_UA	=	3
+SUPPLY_V		=	1.8
+
+# Registers that cannot be written
+READ_ONLY = (WHO_AM_I_REG, WAKE_UP_SRC, TAP_SRC, FIFO_STATUS1, FIFO_STATUS2, MLC_STATUS_MAINPAGE)
+
+
+class SimPin:
+    IN = 1
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+
+    def __init__(self):
+        self.level = 0
+        self.handler = None
+        self.trigger = 0
+
+    def value(self, level=None):
+        if level is None:
+            return self.level
+        self.set(level)
+
+    def irq(self, handler=None, trigger=IRQ_RISING):
+        self.handler = handler
+        self.trigger = trigger
+
+    # Drive the line, calling the irq handler on a matching edge
+    def set(self, level):
+        level = 1 if level else 0
+        if level == self.level:
+            return
+        self.level = level
+        if self.handler is not None:
+            if (level and self.trigger & SimPin.IRQ_RISING) or (not level and self.trigger & SimPin.IRQ_FALLING):
+                self.handler(self)
+
+
+class SimI2C:
+    def __init__(self, freq=100000):
+        self.freq = freq
+        self.devices = {}
+        # Bus statistics
+        self.transactions = 0
+        self.bytes = 0
+        self.bus_us = 0
+
+    def attach(self, addr, device):
+        self.devices[addr] = device
+
+    def scan(self):
+        return sorted(self.devices)
+
+    def _device(self, addr):
+        if addr not in self.devices:
+            raise OSError(19)
+        return self.devices[addr]
+
+    # Bus time of one register transaction: address, register and (for reads) a repeated
+    # start with the address again, 9 clocks per byte plus start/stop
+    def _account(self, nbytes, read):
+        bits = 9 * (2 + nbytes) + 2
+        if read:
+            bits += 9 + 1
+        self.transactions += 1
+        self.bytes += nbytes
+        self.bus_us += bits * 1000000 // self.freq
+
+    def readfrom_mem(self, addr, memaddr, nbytes, addrsize=8):
+        buf = bytearray(nbytes)
+        self.readfrom_mem_into(addr, memaddr, buf, addrsize)
+        return bytes(buf)
+
+    def readfrom_mem_into(self, addr, memaddr, buf, addrsize=8):
+        self._device(addr).read(memaddr, buf)
+        self._account(len(buf), True)
+
+    def writeto_mem(self, addr, memaddr, buf, addrsize=8):
+        self._device(addr).write(memaddr, buf)
+        self._account(len(buf), False)
+
+
+class SimLSM6DSOX:
+    # accel and gyro are lists of raw (x, y, z) samples recorded at rate Hz
+    def __init__(self, accel, gyro, rate=26, loop=False):
+        self.accel = accel
+        self.gyro = gyro
+        self.rate = rate
+        self.loop = loop
+        self.int1 = SimPin()
+        self.int2 = SimPin()
+        self.now_us = 0
+        # Supply charge since the start in uA*us, see current_ua
+        self.charge = 0
+        # Machine Learning Core program, see attach_mlc
+        self.mlc = None
+        self.reset()
+
+    def reset(self):
+        self.regs = bytearray(128)
+        self.regs[WHO_AM_I_REG] = 0x6C
+        self.regs[CTRL3_C] = 0x04
+        self.fifo = bytearray(FIFO_DEPTH * 7)
+        self.fifo_first = 0
+        self.fifo_level = 0
+        self.fifo_ovr = 0
+        self.fifo_ovr_latched = 0
+        self.tag_cnt = 0
+        self.ts_slot_us = -1
+        self.ts_slots = 0
+        self.next_xl_us = -1
+        self.next_g_us = -1
+        self.xl_n = 0
+        self.g_n = 0
+        # Embedded function state
+        self.last_xl = None
+        self.wu_count = 0
+        self.ff_count = 0
+        self.inactive_samples = 0
+        self.sleep_state = 0
+        self.wu_ia = 0
+        self.ff_ia = 0
+        self.sleep_change_ia = 0
+        self.wu_axes = 0
+        self.tap_samples = 0
+        self.tap_ia = 0
+        self.tap_axes = 0
+        # Embedded functions register bank (FUNC_CFG_ACCESS) and the MLC interrupt
+        self.emb = bytearray(128)
+        self.emb[EMB_FUNC_ODR_CFG_C] = 0x15
+        self.mlc_ia = 0
+        self.exhausted = False
+        self._update_pins()
+
+    # Bus side register access with IF_INC auto-increment, rounding from
+    # FIFO_DATA_OUT_Z_H back to FIFO_DATA_OUT_TAG
+    def read(self, reg, buf):
+        for k in range(len(buf)):
+            buf[k] = self._read_reg(reg)
+            if self.regs[CTRL3_C] & 0x04:
+                reg = FIFO_DO_TAG if reg == FIFO_DO_ZH else (reg + 1) & 0x7F
+        self._update_pins()
+
+    def write(self, reg, buf):
+        for k in range(len(buf)):
+            self._write_reg(reg, buf[k])
+            if self.regs[CTRL3_C] & 0x04:
+                reg = (reg + 1) & 0x7F
+        self._update_pins()
+
+    def _read_reg(self, reg):
+        if self.regs[FUNC_CFG_ACCESS] & 0x80 and reg != FUNC_CFG_ACCESS:
+            return self.emb[reg]
+        if reg == MLC_STATUS_MAINPAGE:
+            value = self.mlc_ia
+            # EMB_FUNC_LIR latches the MLC interrupt until this register is read
+            if self.emb[PAGE_RW] & 0x80:
+                self.mlc_ia = 0
+            return value
+        if reg == FIFO_STATUS1:
+            return self.fifo_level & 0xFF
+        if reg == FIFO_STATUS2:
+            value = (self._wtm_ia() << 7 | self.fifo_ovr << 6 | self._full_ia() << 5
+                     | self.fifo_ovr_latched << 3 | (self.fifo_level >> 8) & 0x03)
+            self.fifo_ovr_latched = 0
+            return value
+        if reg == WAKE_UP_SRC:
+            value = (self.sleep_change_ia << 6 | self.ff_ia << 5 | self.sleep_state << 4
+                     | self.wu_ia << 3 | self.wu_axes)
+            # Latched events are cleared by reading the source register
+            if self.regs[TAP_CFG0] & 0x01:
+                self.sleep_change_ia = self.ff_ia = self.wu_ia = 0
+            return value
+        if reg == TAP_SRC:
+            # Single taps only (SINGLE_DOUBLE_TAP = 0): TAP_IA and SINGLE_TAP together
+            value = self.tap_ia << 6 | self.tap_ia << 5 | self.tap_axes
+            if self.regs[TAP_CFG0] & 0x01:
+                self.tap_ia = 0
+            return value
+        if reg == FIFO_DO_TAG:
+            self._pop_fifo()
+        return self.regs[reg]
+
+    def _write_reg(self, reg, value):
+        if self.regs[FUNC_CFG_ACCESS] & 0x80 and reg != FUNC_CFG_ACCESS:
+            if reg == EMB_FUNC_INIT_B and value & 0x10 and self.mlc is not None:
+                # MLC_INIT restarts the windows, the bit clears itself
+                self.mlc.restart()
+                value &= ~0x10
+            if reg != MLC0_SRC:
+                self.emb[reg] = value
+            return
+        if reg in READ_ONLY or reg >= FIFO_DO_TAG:
+            return
+        if reg == CTRL3_C and value & 0x01:
+            self.reset()
+            return
+        self.regs[reg] = value
+        if reg == FIFO_CTRL4 and value & 0x07 == 0:
+            # Bypass mode empties the FIFO
+            self.fifo_level = 0
+            self.fifo_ovr = 0
+        if reg == TAP_CFG2 and value & 0x60 == 0:
+            # Inactivity off: back to the active state, the count starts over when it is on again
+            self.inactive_samples = 0
+            if self.sleep_state:
+                self.sleep_state = 0
+                self._schedule()
+        if reg == CTRL1_XL or reg == CTRL2_G:
+            self._schedule()
+
+    def _pop_fifo(self):
+        regs = self.regs
+        if self.fifo_level == 0:
+            for reg in range(FIFO_DO_TAG, FIFO_DO_ZH + 1):
+                regs[reg] = 0
+            return
+        offset = self.fifo_first * 7
+        regs[FIFO_DO_TAG:FIFO_DO_ZH + 1] = self.fifo[offset:offset + 7]
+        self.fifo_first = (self.fifo_first + 1) % FIFO_DEPTH
+        self.fifo_level -= 1
+        self.fifo_ovr = 0
+
+    def _push_fifo(self, tag, sample):
+        mode = self.regs[FIFO_CTRL4] & 0x07
+        if mode == 0:
+            return
+        if tag != TAG_TIMESTAMP and self.regs[CTRL10_C] & 0x20 and self.now_us != self.ts_slot_us:
+            # First word of a batch: every DEC_TS_BATCH batches a timestamp word goes first
+            self.ts_slot_us = self.now_us
+            decimation = TS_DECIMATION[self.regs[FIFO_CTRL4] >> 6]
+            if decimation and self.ts_slots % decimation == 0:
+                ts = (self.now_us // TS_TICK_US) & 0xFFFFFFFF
+                self._push_fifo(TAG_TIMESTAMP, (ts & 0xFFFF, ts >> 16, 0))
+            self.ts_slots += 1
+        depth = FIFO_DEPTH
+        if self.regs[FIFO_CTRL2] & 0x80:
+            depth = min(max(self._wtm(), 1), FIFO_DEPTH)
+        if self.fifo_level >= depth:
+            if mode == 1:
+                # FIFO mode stops collecting once full
+                return
+            # Continuous mode overwrites the oldest word
+            self.fifo_first = (self.fifo_first + 1) % FIFO_DEPTH
+            self.fifo_level -= 1
+            self.fifo_ovr = 1
+            self.fifo_ovr_latched = 1
+        # TAG_SENSOR[7:3], TAG_CNT[2:1] and odd parity in bit 0
+        tag_byte = tag << 3 | self.tag_cnt << 1
+        parity = 0
+        b = tag_byte
+        while b:
+            parity ^= b & 1
+            b >>= 1
+        offset = ((self.fifo_first + self.fifo_level) % FIFO_DEPTH) * 7
+        fifo = self.fifo
+        fifo[offset] = tag_byte | (parity ^ 1)
+        for axis in range(3):
+            v = sample[axis] & 0xFFFF
+            fifo[offset + 1 + 2 * axis] = v & 0xFF
+            fifo[offset + 2 + 2 * axis] = v >> 8
+        self.fifo_level += 1
+
+    def _wtm(self):
+        return self.regs[FIFO_CTRL1] | (self.regs[FIFO_CTRL2] & 0x01) << 8
+
+    def _wtm_ia(self):
+        wtm = self._wtm()
+        return 1 if wtm and self.fifo_level >= wtm else 0
+
+    def _full_ia(self):
+        depth = FIFO_DEPTH
+        if self.regs[FIFO_CTRL2] & 0x80:
+            depth = min(max(self._wtm(), 1), FIFO_DEPTH)
+        return 1 if self.fifo_level >= depth else 0
+
+    # Effective sensor rates, including the sleep state power modes selected by INACT_EN
+    def _odr_xl(self):
+        odr = ODR_HZ[self.regs[CTRL1_XL] >> 4]
+        if self.sleep_state and self.regs[TAP_CFG2] & 0x60 and odr > SLEEP_ODR_XL:
+            return SLEEP_ODR_XL
+        return odr
+
+    def _odr_g(self):
+        if self.sleep_state and (self.regs[TAP_CFG2] & 0x60) >= 0x40:
+            return 0
+        return ODR_HZ[self.regs[CTRL2_G] >> 4]
+
+    def _schedule(self):
+        if self._odr_xl() == 0:
+            self.next_xl_us = -1
+        elif self.next_xl_us < 0:
+            self.next_xl_us = self.now_us + int(1000000 / self._odr_xl())
+        if self._odr_g() == 0:
+            self.next_g_us = -1
+        elif self.next_g_us < 0:
+            self.next_g_us = self.now_us + int(1000000 / self._odr_g())
+
+    # Trace sample at the current time. A sensor running faster than the trace rate gets
+    # samples linearly interpolated between the recorded ones instead of repeats.
+    def _sample(self, trace, odr):
+        pos = self.now_us * self.rate
+        idx = int(pos // 1000000)
+        if idx >= len(trace):
+            self.exhausted = True
+            idx = idx % len(trace) if self.loop else len(trace) - 1
+            return trace[idx]
+        sample = trace[idx]
+        if odr <= self.rate or idx + 1 >= len(trace):
+            return sample
+        frac = pos % 1000000
+        nxt = trace[idx + 1]
+        return tuple(int(a + (b - a) * frac // 1000000) for a, b in zip(sample, nxt))
+
+    # Batching decimation of a sensor running at odr into the FIFO at the BDR field rate
+    def _batched(self, n, odr, bdr_field):
+        bdr = ODR_HZ[bdr_field]
+        if bdr == 0:
+            return False
+        step = max(1, int(odr / bdr + 0.5))
+        return n % step == 0
+
+    def _xl_event(self):
+        odr = self._odr_xl()
+        sample = self._sample(self.accel, odr)
+        if self._batched(self.xl_n, odr, self.regs[FIFO_CTRL3] & 0x0F):
+            self._push_fifo(TAG_XL_NC, sample)
+        self.xl_n += 1
+        self._embedded_functions(sample)
+        self._machine_learning_core(sample)
+        self.next_xl_us += int(1000000 / odr)
+        if self._odr_xl() != odr:
+            self.next_xl_us = self.now_us + int(1000000 / self._odr_xl())
+
+    def _g_event(self):
+        odr = self._odr_g()
+        sample = self._sample(self.gyro, odr)
+        if self._batched(self.g_n, odr, self.regs[FIFO_CTRL3] >> 4):
+            self._push_fifo(TAG_GYRO_NC, sample)
+        self.g_n += 1
+        self.next_g_us += int(1000000 / odr)
+        self.tag_cnt = (self.tag_cnt + 1) & 0x03
+
+    # Run an emulated MLC program (mlc_tools.MLCEmulator, standing in for the program a
+    # .ucf file loads) on the sample stream while MLC_EN is set
+    def attach_mlc(self, emulator):
+        self.mlc = emulator
+
+    # MLC at the accelerometer rate (26Hz, the MLC_ODR enable_mlc selects), a change of
+    # the class of a window is written to MLC0_SRC and raises the MLC interrupt
+    def _machine_learning_core(self, sample):
+        if not self.emb[PAGE_RW] & 0x80:
+            self.mlc_ia = 0
+        if self.mlc is None or not self.emb[EMB_FUNC_EN_B] & 0x10:
+            return
+        if self.mlc.push(sample, self._sample(self.gyro, self._odr_g())):
+            self.emb[MLC0_SRC] = self.mlc.src
+            self.mlc_ia = 1
+
+    # Wake-up (slope filter), single tap, free-fall and activity/inactivity detection on
+    # each accelerometer sample
+    def _embedded_functions(self, sample):
+        regs = self.regs
+        latched = regs[TAP_CFG0] & 0x01
+        if not latched:
+            self.wu_ia = self.ff_ia = self.sleep_change_ia = self.tap_ia = 0
+        fs = FS_XL_G[(regs[CTRL1_XL] >> 2) & 0x03]
+        slopes = (0, 0, 0)
+        if self.last_xl is not None:
+            slopes = [abs(sample[axis] - self.last_xl[axis]) // 2 for axis in range(3)]
+        self.last_xl = sample
+
+        # Wake-up: slope (a[n] - a[n-1]) / 2 above WK_THS on any axis for more than WAKE_DUR samples
+        wk_ths = regs[WAKE_UP_THS] & 0x3F
+        threshold = wk_ths * (128 if regs[WAKE_UP_DUR] & 0x10 else 512)
+        axes = 0
+        if wk_ths:
+            for axis in range(3):
+                if slopes[axis] > threshold:
+                    axes |= 4 >> axis
+        if axes:
+            self.wu_count += 1
+        else:
+            self.wu_count = 0
+        woke = self.wu_count > (regs[WAKE_UP_DUR] >> 5) & 0x03
+        if woke:
+            self.wu_ia = 1
+            self.wu_axes = axes
+
+        # Single tap: slope above TAP_THS_X/Y/Z (FS_XL/2^5 steps) on an enabled axis, back
+        # below it within the SHOCK window (4/ODR when 0, SHOCK * 8/ODR otherwise)
+        tap_axes = 0
+        for axis, ths in enumerate((regs[TAP_CFG1], regs[TAP_CFG2], regs[TAP_THS_6D])):
+            ths &= 0x1F
+            if regs[TAP_CFG0] & (8 >> axis) and ths and slopes[axis] > ths * 1024:
+                tap_axes |= 4 >> axis
+        if tap_axes:
+            self.tap_samples += 1
+            self.tap_axes = tap_axes
+        elif self.tap_samples:
+            shock = regs[INT_DUR2] & 0x03
+            if self.tap_samples <= (shock * 8 if shock else 4):
+                self.tap_ia = 1
+            self.tap_samples = 0
+
+        # Free-fall: all axes below FF_THS for FF_DUR samples
+        ff_threshold = FF_THS_MG[regs[FREE_FALL] & 0x07] * 32768 // (1000 * fs)
+        ff_dur = (regs[WAKE_UP_DUR] >> 7) << 5 | regs[FREE_FALL] >> 3
+        if abs(sample[0]) < ff_threshold and abs(sample[1]) < ff_threshold and abs(sample[2]) < ff_threshold:
+            self.ff_count += 1
+        else:
+            self.ff_count = 0
+        if ff_dur and self.ff_count >= ff_dur:
+            self.ff_ia = 1
+
+        # Activity/inactivity: sleep after SLEEP_DUR without a wake-up event
+        if regs[TAP_CFG2] & 0x60:
+            sleep_dur = regs[WAKE_UP_DUR] & 0x0F
+            limit = sleep_dur * 512 if sleep_dur else 16
+            if woke:
+                self.inactive_samples = 0
+                if self.sleep_state:
+                    self.sleep_state = 0
+                    self.sleep_change_ia = 1
+                    self._schedule()
+            else:
+                self.inactive_samples += 1
+                if not self.sleep_state and self.inactive_samples >= limit:
+                    self.sleep_state = 1
+                    self.sleep_change_ia = 1
+                    self._schedule()
+
+    def _update_pins(self):
+        regs = self.regs
+        wtm = self._wtm_ia()
+        full = self._full_ia()
+        ovr = self.fifo_ovr
+        int1 = (regs[INT1_CTRL] & 0x08 and wtm) or (regs[INT1_CTRL] & 0x10 and ovr) \
+            or (regs[INT1_CTRL] & 0x20 and full)
+        int2 = (regs[INT2_CTRL] & 0x08 and wtm) or (regs[INT2_CTRL] & 0x10 and ovr) \
+            or (regs[INT2_CTRL] & 0x20 and full)
+        if regs[MD1_CFG] & 0x02 and self.emb[MLC_INT1] & 0x01 and self.mlc_ia:
+            int1 = True
+        if regs[TAP_CFG2] & 0x80:
+            # SLEEP_STATUS_ON_INT routes the sleep state instead of the change event
+            sleep = self.sleep_state if regs[TAP_CFG0] & 0x20 else self.sleep_change_ia
+            for md, route in ((regs[MD1_CFG], 1), (regs[MD2_CFG], 2)):
+                event = (md & 0x10 and self.ff_ia) or (md & 0x20 and self.wu_ia) or (md & 0x40 and self.tap_ia) \
+                    or (md & 0x80 and sleep)
+                if route == 1:
+                    int1 = int1 or event
+                else:
+                    int2 = int2 or event
+        # H_LACTIVE makes both lines active low
+        if regs[CTRL3_C] & 0x20:
+            int1 = not int1
+            int2 = not int2
+        self.int1.set(int1)
+        self.int2.set(int2)
+
+    # Supply current in the current configuration and sleep state
+    def current_ua(self):
+        ua = POWER_DOWN_UA
+        odr = self._odr_xl()
+        if odr:
+            if self.regs[CTRL6_C] & 0x10 or odr != ODR_HZ[self.regs[CTRL1_XL] >> 4]:
+                # Low-power mode, or the sleep state's 12.5Hz low-power mode
+                ua += XL_LP_UA[min(ODR_HZ.index(odr), len(XL_LP_UA) - 1)]
+            else:
+                ua += XL_HP_UA
+        odr = self._odr_g()
+        if odr:
+            if self.regs[CTRL7_G] & 0x80:
+                ua += G_LP_UA[min(ODR_HZ.index(odr), len(G_LP_UA) - 1)]
+            else:
+                ua += G_HP_UA
+        return ua
+
+    # Sensor energy in mWh since the start
+    def energy_mwh(self):
+        return self.charge * SUPPLY_V / 3.6e12
+
+    def _elapse(self, until_us):
+        self.charge += self.current_ua() * (until_us - self.now_us)
+        self.now_us = until_us
+
+    # Run the sensor for us microseconds of simulated time
+    def advance(self, us):
+        self.run_until(None, 0, us)
+
+    # Run until pin reads level or limit_us elapse, returns True if the level was reached
+    def run_until(self, pin, level, limit_us):
+        end = self.now_us + limit_us
+        while pin is None or pin.level != level:
+            t = -1
+            if self.next_xl_us >= 0:
+                t = self.next_xl_us
+            if self.next_g_us >= 0 and (t < 0 or self.next_g_us < t):
+                t = self.next_g_us
+            if t < 0 or t > end:
+                self._elapse(end)
+                return pin is not None and pin.level == level
+            self._elapse(t)
+            if t == self.next_g_us:
+                self._g_event()
+            if t == self.next_xl_us:
+                self._xl_event()
+            self._update_pins()
+        return True
+
+
+# Load a trace as (accel, gyro) lists of raw (x, y, z) samples. Accepts the rows
+# BleWindows.py records (batch id followed by tag, x, y, z groups) or a CSV with an
+# ax,ay,az,gx,gy,gz header
+def load_trace(path):
+    accel = []
+    gyro = []
+    with open(path) as f:
+        header = None
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            fields = line.split(',')
+            if header is None and not fields[0].lstrip('-').isdigit():
+                header = [name.strip() for name in fields]
+                continue
+            if header is not None:
+                row = dict(zip(header, fields))
+                accel.append((int(row['ax']), int(row['ay']), int(row['az'])))
+                gyro.append((int(row['gx']), int(row['gy']), int(row['gz'])))
+                continue
+            values = [int(v) for v in fields]
+            for i in range(1, len(values) - 3, 4):
+                tag = values[i]
+                sample = (values[i + 1], values[i + 2], values[i + 3])
+                if tag == TAG_XL_NC:
+                    accel.append(sample)
+                elif tag == TAG_GYRO_NC:
+                    gyro.append(sample)
+    n = min(len(accel), len(gyro))
+    return accel[:n], gyro[:n]
+
+
+# Generate a ride-like trace at rate Hz (+/-16g, +/-2000dps raw units) when no recording
+# is at hand: riding with road noise, braking, stops long enough to reach sleep state and
+# the odd fall or crash
+def synthetic_trace(seconds, rate=26, seed=1):
+    rng = random.Random(seed) if hasattr(random, 'Random') else random
+    if rng is random:
+        random.seed(seed)
+    g = 2048
+    n = int(seconds * rate)
+    accel = []
+    gyro = []
+    event = 'ride'
+    left = 0
+    for _ in range(n):
+        if left <= 0:
+            r = rng.randint(0, 99)
+            if r < 70:
+                event, left = 'ride', rng.randint(5, 20) * rate
+            elif r < 85:
+                event, left = 'brake', rng.randint(1, 3) * rate
+            elif r < 93:
+                event, left = 'stop', rng.randint(25, 40) * rate
+            elif r < 97:
+                event, left = 'fall', rate
+            else:
+                event, left = 'crash', rate // 2
+        left -= 1
+        # Helmet orientation puts gravity on -x
+        noise = 30 if event == 'stop' else 250
+        spin = 30 if event == 'stop' else 900
+        ax = -g + rng.randint(-noise, noise)
+        ay = 400 + rng.randint(-noise, noise)
+        az = 150 + rng.randint(-noise, noise)
+        gx = rng.randint(-spin, spin)
+        gy = rng.randint(-spin, spin)
+        gz = rng.randint(-spin, spin)
+        if event == 'ride' and rng.randint(0, 50) == 0:
+            # Road bump
+            ax -= 2 * g
+        elif event == 'brake':
+            ay += g // 2
+            gz += 1500
+        elif event == 'fall':
+            if left > rate // 3:
+                ax = ay = az = rng.randint(-100, 100)
+            else:
+                ax -= 6 * g
+            gx += 8000
+        elif event == 'crash':
+            ax += rng.randint(-12, 12) * g
+            ay += rng.randint(-8, 8) * g
+            gz += rng.randint(-20000, 20000)
+        accel.append((max(-32768, min(32767, ax)), max(-32768, min(32767, ay)), max(-32768, min(32767, az))))
+        gyro.append((max(-32768, min(32767, gx)), max(-32768, min(32767, gy)), max(-32768, min(32767, gz))))
+    return accel, gyro
@@ -1,186 +1,305 @@
-from machine import I2C, Pin, deepsleep
+from machine import Pin, deepsleep
 import machine
 import time, esp32
 from time import sleep
-import RandomForest
-from bluetooth import BLE
-import ubluetooth
-
-# Define register addresses
-LSM6DSOX_ADDR	= 	0x6A
-FIFO_CTRL1 		= 	0x07
-FIFO_CTRL2 		= 	0x08
-FIFO_CTRL3 		= 	0x09
-FIFO_CTRL4 		= 	0x0A
-INT1_CTRL 		= 	0x0D
-INT2_CTRL 		= 	0x0E
-WHO_AM_I_REG 	= 	0x0F
-CTRL1_XL 		= 	0x10
-CTRL2_G 		= 	0x11
-CTRL3_C			= 	0x12
-CTRL10_C		=	0x19
-WAKE_UP_SRC 	= 	0x1B
-TAP_SRC			=	0x1C
-FIFO_STATUS1	=	0x3A
-FIFO_STATUS2	=	0x3B
-WAKE_UP_THS		= 	0x5B
-WAKE_UP_DUR		=	0x5C
-FREE_FALL		=	0x5D
-MD1_CFG			=	0x5E
-MD2_CFG			=	0x5F
-FIFO_DO_TAG		=	0x78
-FIFO_DO_XL		=  	0x79
-FIFO_DO_XH		=	0x7A
-FIFO_DO_YL		=  	0x7B
-FIFO_DO_YH		=	0x7C
-FIFO_DO_ZL		=  	0x7D
-FIFO_DO_ZH		=	0x7E
-TAP_CFG0		=	0x56
-TAP_CFG2		=	0x58
-
-
-start_fifo = 0
-j = 0
-ml_data = [[], [], [], []]
-
-
-class Adafruit_LSM6DSOX:
-    def __init__(self, pin_scl, pin_sda, freq):
-        self.device = I2C(1, scl = pin_scl, sda = pin_sda, freq = freq)
-        self.int1 = Pin(32, Pin.IN)
-        self.int2 = Pin(33, Pin.IN)
-        self.fifo_over = 0
-        self.data = []
-    
-    def scan(self):
-        return self.device.scan()
-    
-# Write one byte     
-    def write_8(self, addr, data):
-        try:
-            self.device.writeto_mem(LSM6DSOX_ADDR, addr, bytes([data]), addrsize = 8)
-        except OSError:
-            print('Failed to write the register' + str(addr))
-# Read one byte  
-    def read_8(self, addr):
-        try :
-            data = self.device.readfrom_mem(LSM6DSOX_ADDR, addr, 1)
-        except OSError :
-            print('Failed to read from register' + str(addr))
-        return data[0]
-    
-# Read two bytes
-    def read_16(self, addr):
-        try :
-            data = self.device.readfrom_mem(LSM6DSOX_ADDR, addr, 2)
-        except OSError:
-            print('Failed to read from register' + str(addr))
-        return (data[1] << 8 | data[0])
-    
-# Configure FIFO settings
-    def load_fifo_settings(self):
-        # Register depth of FIFO threshold to 130d/0x82
-        # 26 words (1 byte tag + 6 bytes data) per second
-        # 2.5 seconds of both accelerometer and gyroscope data         
-        self.write_8(FIFO_CTRL1, 0x34)
-        
-        # Limit the FIFO depth to threshold - 8th bit is high        
-        self.write_8(FIFO_CTRL2, 0x80)
+import features
+from lsm6dsox import Adafruit_LSM6DSOX, FIFO_WATERMARK, FIFO_TS_WATERMARK
+from perf import DutyCycle
+from power import PowerManager
+import bootstate
 
-        # Register the batch data rate (26Hz) for the gyro and accelerometer
-        self.write_8(FIFO_CTRL3, 0x22)
-        
-        # Register FIFO fill mode to continuous mode
-        self.write_8(FIFO_CTRL4, 0x06)
-        
-        # Register interrupt control register - fifo threshold interrupts to INT1
-        self.write_8(INT1_CTRL, 0x08)
-        
-#         self.fifo_interrupt_en()
-    
+# A wake from deepsleep() with the state saved before it skips the I2C power cycle and
+# the sensor setup when the sensor kept its settings, BLE starts after the first label
+boot_state, warm_boot = bootstate.load_rtc()
 
-# Configure the registers
-    def load_settings(self):
+# Drain the FIFO from the INT1 watermark irq (True) or by polling INT1 (False)
+USE_FIFO_IRQ = True
+# Drain the FIFO on a second thread handing ring slots to the classification loop
+# (pipeline.py) so the sensor is drained while the forest runs. MicroPython runs both
+# threads on one core under the GIL, what overlaps is the I2C transfer time, which
+# releases it. Light sleep is not used meanwhile.
+USE_THREADS = False
+# Run drain, classify, notify, rear light and sleep policy as uasyncio tasks with
+# deadlines and per-task timing (scheduler.py) instead of the polling loop and the
+# hardware timer (FIFO irq path, no threads, the scheduler's own wait replaces light sleep)
+USE_ASYNCIO = False
+# Task deadlines in ms: INT1 edge to drained, closed window to label, label to notified,
+# and how late the rear light may switch off and the sleep policy may check INT2
+DRAIN_DEADLINE_MS = 30
+CLASSIFY_DEADLINE_MS = 100
+NOTIFY_DEADLINE_MS = 50
+LIGHT_DEADLINE_MS = 20
+SLEEP_DEADLINE_MS = 50
+SLEEP_CHECK_MS = 500
+# Time the rear light stays on after braking or an alert
+REAR_LIGHT_MS = 3000
+# Light sleep between INT1 edges instead of machine.idle (irq mode, see power.py). Not
+# while the rear light timer runs, timers stop in light sleep. Off until a BLE central is
+# confirmed to stay connected through it on the hardware: without a low-power clock for
+# the BT controller the stock ESP32 builds may not keep the link timed across lightsleep().
+LIGHT_SLEEP = False
+# Period for printing CPU duty cycle and wake-to-drain latency
+STATS_PERIOD_MS = 10000
+# Classify the last window every SLIDING_HOP_MS instead of once per full window, 0 disables
+SLIDING_HOP_MS = 250
+# Batch a sensor timestamp with every sample pair, jerk then uses the real time between
+# samples instead of 1/ODR_HZ (e.g. in sleep state, or when a drain comes late)
+FIFO_TIMESTAMPS = True
+# Sample rate and samples per sensor in a classification window (FIFO_WATERMARK / 2)
+ODR_HZ = 26
+WINDOW_SAMPLES = 26
+# Integer features and RandomForestFixed (True) or float features and RandomForest (False)
+USE_FIXED_POINT = True
+# Walk the forest tables of forest_model.py (True) or run the generated if/else predict (False)
+USE_ARRAY_FOREST = True
+# Stop voting once the remaining trees cannot change the label (array forest only)
+FOREST_EARLY_EXIT = True
+# Bin each feature once per window and compare bin indexes at the nodes (array forest only)
+FOREST_BINNED = False
+# Label clearly normal windows from the accel/gyro/jerk peaks alone (array forest only),
+# enable once the limits in the model are calibrated on recorded rides
+FOREST_PREFILTER = False
+# Binary model written by forest_tools.py (array forest only), forest_model.py if missing
+MODEL_PATH = 'forest.bin'
+# Classify on the sensor's Machine Learning Core with the .ucf program ST's MLC tool builds
+# from the mlc_tools.py tree, the ESP32 only wakes when the class changes
+USE_MLC = False
+MLC_UCF_PATH = 'mlc.ucf'
+# Raise a provisional crash/fall alert on the sensor's single-tap/free-fall interrupt, before
+# the window is classified, and confirm or retract it with the forest labels (FIFO path only)
+FAST_ALERTS = True
+# Switch between the rate profiles of governor.py: 12.5Hz with a 2s hop after a calm
+# stretch of Normal windows, 104Hz with a 125ms hop while accel or jerk peaks climb, 26Hz
+# otherwise (sliding windows with FIFO_TIMESTAMPS only, the jerk needs the real spacing)
+RATE_GOVERNOR = False
+# Notify 5-byte binary verdict frames (verdict.py: class id, votes out of the trees that
+# ran, sequence number, ticks_ms) instead of the label strings, BleWindows.py decodes both
+VERDICT_FRAMES = True
 
-        # Register output data rate (26Hz) and full scale (+/-16g) for accelerometer 
-        self.write_8(CTRL1_XL, 0b00100100)
-        
-        # Register output data rate (26Hz) and full scale (+/-2000dps) for gyroscope
-        self.write_8(CTRL2_G,  0b00101100)
-        
-        # Register wake up duration threshold set to 3 * (1/ODR) = 0.115s
-        # Wake up lsb setting to FS_XL/2^6 = 0.25g
-        # Sleep duration event to 1 * 512/ODR = 19.69s         
-        self.write_8(WAKE_UP_DUR, 0b01100001)
-        
-        # Register wake-up threshold to 3 * 0.25g = 0.75g        
-        self.write_8(WAKE_UP_THS, 0b00000011)
-        
-        # Enable the basic interrupts bit, activity/inactivity function (8th bit)
-        # Sets accelerometer to low-power mode (12.5Hz)/ gyroscope in power-down
-        # when in sleep mode (7-6th bits)         
-        self.write_8(TAP_CFG2, 0b11100000)
-        
-        # Enable sleep status reporting on INT2 pins
-        self.write_8(TAP_CFG0, 0x20)
+# Feature vector of the last window, reused for every prediction
+feature_buf = [0] * features.NUM_FEATURES
+sliding = features.SlidingFeatures(WINDOW_SAMPLES, fixed=USE_FIXED_POINT)
+duty = DutyCycle()
+if FAST_ALERTS:
+    from alerts import FastAlert
+    # A sliding window holds the event for a whole window of hops
+    fast_alert = FastAlert(confirm_windows=1000 // SLIDING_HOP_MS + 1 if SLIDING_HOP_MS else 2)
+if RATE_GOVERNOR:
+    import governor
+    # Every rate profile feeds the sliding window on the 26Hz grid
+    sliding_feed = features.GridFeed(sliding, ODR_HZ)
+else:
+    sliding_feed = sliding
+if USE_ASYNCIO:
+    import uasyncio as asyncio
+    from scheduler import TaskStats
+    task_stats = (
+        TaskStats('drain', DRAIN_DEADLINE_MS),
+        TaskStats('classify', CLASSIFY_DEADLINE_MS),
+        TaskStats('notify', NOTIFY_DEADLINE_MS),
+        TaskStats('light', LIGHT_DEADLINE_MS),
+        TaskStats('sleep', SLEEP_DEADLINE_MS),
+    )
+    DRAIN, CLASSIFY, NOTIFY, LIGHT, SLEEP = range(5)
+    # Wake-ups of the tasks: INT1 edge, closed window, queued notification, light on
+    int1_flag = asyncio.ThreadSafeFlag()
+    window_flag = asyncio.ThreadSafeFlag()
+    notify_flag = asyncio.ThreadSafeFlag()
+    light_flag = asyncio.ThreadSafeFlag()
+    # Closed ring slots and notifications waiting, with the ticks_us they became due
+    windows = []
+    notifications = []
+    window_overruns = 0
+    light_off_us = 0
+if VERDICT_FRAMES:
+    import verdict
+    verdict_sender = verdict.VerdictSender()
+if USE_THREADS:
+    import _thread
+    from pipeline import SlotHandoff
+    handoff = SlotHandoff()
+    bus_lock = _thread.allocate_lock()
 
-        # Register interrupt control register to detect inactivity/activity on INT2
-        self.write_8(MD2_CFG, 0x80)
-           
-        
-# Check if the right sensor is connected, and load all settings/configuration registers                                                    
-    def begin(self):
-        if self.read_8(WHO_AM_I_REG) == 0x6c:
-            self.load_settings()
-            print('Device setup successful' )
+# Only the selected model is imported, each one costs its compile time and RAM
+model_start = time.ticks_us()
+if USE_MLC:
+    from forest import LABELS
+elif USE_ARRAY_FOREST:
+    from forest import ArrayForest, load_model
+    try:
+        model = load_model(MODEL_PATH)
+    except OSError:
+        model = None
+    forest = ArrayForest(model, fixed=USE_FIXED_POINT, early_exit=FOREST_EARLY_EXIT, binned=FOREST_BINNED,
+                          prefilter=FOREST_PREFILTER)
+    predict_label = forest.predict_label
+else:
+    import RandomForest
+    if USE_FIXED_POINT:
+        import RandomForestFixed
+        def predict_label(x):
+            return RandomForest.idxToLabel(RandomForestFixed.predict(x))
+    else:
+        predict_label = RandomForest.predictLabel
+    if VERDICT_FRAMES:
+        # Class ids of the frames
+        from forest import LABELS
+print(f"Model loaded in {time.ticks_diff(time.ticks_us(), model_start)} us")
+if RATE_GOVERNOR:
+    # Peak limits of the loaded model, forest_model.py's with the generated forest
+    rate_governor = governor.RateGovernor(forest.peak_limits if USE_ARRAY_FOREST and not USE_MLC else None,
+                                          fixed=USE_FIXED_POINT)
+# Milliseconds from reset to the first label, 0 until then
+first_inference_ms = 0
+# Started once the first label is out (start_ble)
+ble_peripheral = None
+
+# FIFO watermark in words for one hop of accel and gyro samples (and their timestamps)
+def hop_watermark(hop_ms):
+    return (3 if FIFO_TIMESTAMPS else 2) * max(1, hop_ms * ODR_HZ // 1000)
+
+# Drain the FIFO into the ring buffer, returns the ring slot of a completed window or -1
+def drain():
+    if FAST_ALERTS and p.fifo_pending:
+        # Every INT1 edge may also be a latched free-fall/single-tap event
+        alert = fast_alert.check(p)
+        if alert:
+            provisional_alert(alert)
+    if USE_FIFO_IRQ:
+        p.service_fifo()
+    else:
+        p.fifo_interrupt_en()
+    if p.fifo_over == 1:
+        return p.ring.end_window()
+    return -1
+
+# Drain the FIFO into the ring buffer and classify the window
+def collect_data():
+    slot = drain()
+    if slot >= 0:
+        classify(slot)
+
+# Acquisition thread of USE_THREADS: drain every watermark and hand the window over,
+# the bus lock keeps the classification thread's rate switches off the bus meanwhile
+def acquisition_thread():
+    while True:
+        if p.fifo_pending or (not USE_FIFO_IRQ and p.int1.value()):
+            bus_lock.acquire()
+            slot = drain()
+            bus_lock.release()
+            if slot >= 0:
+                handoff.put(slot)
         else:
-            print('Failed to communicate with LSM6DSOX. Check connections')
-        
-# Poll fifo interrupts                 
-    def fifo_interrupt_en(self):
-        self.fifo_over = 0
-        if self.int1.value():
-            self.read_data()
-
-# Read and store the FIFO data if an interrupt is detected                
-    def read_data(self):
-        i = 0
-        self.data = []
-        a = [0, 0, 0, 0]
-        fifo_status = self.read_16(FIFO_STATUS1)
-        fifo_full = fifo_status >> 15 
-        fifo_size = int(fifo_status & 0x03FF)
-        if fifo_full == 1:
-            while (i <= fifo_size):
-                a[0] = self.read_8(FIFO_DO_TAG) >>3
-                a[1] = self.read_16(FIFO_DO_XL)
-                a[2] = self.read_16(FIFO_DO_YL)
-                a[3] = self.read_16(FIFO_DO_ZL)
-                self.data = self.data + a
-                i += 1
-            self.fifo_over = 1
-        
-    def collect_data(self):
-        global j
-        self.fifo_interrupt_en()
-        if self.fifo_over == 1:
-            ml_data[j] = self.data
-            #print(ml_data[j])
-            #print(f"New data of ID {j} collected at {time.ticks_ms()}")
-            j = (j + 1) % 4
-            IMU_Data = [self.to_signed_int16(x) for x in p.data]
-            features_Dictonary = RandomForest.calculate_kinematic_features(IMU_Data)
-            features = [features_Dictonary[key] for key in features_Dictonary]
-            prediction = RandomForest.predictLabel(features)
-            print(prediction)
-            global ble_peripheral
-            ble_peripheral.send_data(prediction)
-            if(prediction=='Braking'):
-                global RearLight_timer
-                RearLight.value(1)
-                RearLight_timer.init(period=3000, mode=machine.Timer.ONE_SHOT, callback=Turn_RearLight_OFF)
-    def to_signed_int16(self,value):
-        return value - 65536 if value >= 32768 else value
+            time.sleep_ms(1)
+
+# Features, label and notifications of a ring window
+def classify(slot):
+    if SLIDING_HOP_MS:
+        # Only the samples of the new hop are added to the sliding window
+        features.ring_feed(p.ring, slot, sliding_feed)
+        sliding.features(feature_buf)
+        prediction = predict_label(feature_buf)
+        if RATE_GOVERNOR:
+            profile = rate_governor.update(prediction == 'Normal', feature_buf)
+            if profile is not None:
+                if USE_THREADS:
+                    bus_lock.acquire()
+                set_rate_profile(profile)
+                if USE_THREADS:
+                    bus_lock.release()
+    else:
+        features.ring_features(p.ring, slot, feature_buf, USE_FIXED_POINT)
+        prediction = predict_label(feature_buf)
+    #print(f"New data of slot {slot} collected at {time.ticks_ms()}")
+    global first_inference_ms
+    if not first_inference_ms:
+        first_inference_ms = time.ticks_ms()
+        print(boot_state.report(first_inference_ms, warm_boot))
+        boot_state.first_prediction(first_inference_ms, warm_boot)
+    publish(prediction)
+    if FAST_ALERTS and fast_alert.settle(prediction) == 'retracted':
+        retract()
+
+# Reprogram the sensor for a rate profile of governor.py, the sliding window goes on
+# with the new rate resampled onto its grid
+def set_rate_profile(profile):
+    sliding_feed.set_rate(governor.set_profile(p, profile, FAST_ALERTS, 3 if FIFO_TIMESTAMPS else 2))
+    if FAST_ALERTS:
+        fast_alert.confirm_windows = 1000 // governor.PROFILES[profile][3] + 1
+    print(f"Rate profile: {governor.PROFILES[profile][0]}")
+
+# Read the class the MLC flagged on INT1
+def collect_mlc():
+    label = p.service_mlc()
+    if label is not None:
+        publish(LABELS[label] if label < len(LABELS) else str(label), label)
+
+# Alert ahead of the forest: the label with a '?' over BLE and the rear light on
+def provisional_alert(label):
+    print(f"Provisional alert: {label}")
+    if VERDICT_FRAMES:
+        notify(verdict_sender.frame(verdict.VERDICT_ALERT, class_id(label), label=label + '?'))
+    else:
+        notify(label + '?')
+    rear_light()
+
+# The pending provisional alert was wrong
+def retract():
+    if VERDICT_FRAMES:
+        notify(verdict_sender.frame(verdict.VERDICT_RETRACT, verdict.NO_CLASS, label='Retracted'))
+    else:
+        notify('Retracted')
+
+# Send the label over BLE and light the rear light on braking. class_idx is the class id
+# of the frame, looked up from the label if None.
+def publish(prediction, class_idx=None):
+    print(prediction)
+    if VERDICT_FRAMES:
+        if class_idx is None:
+            class_idx = class_id(prediction)
+        votes = trees = 0
+        if USE_ARRAY_FOREST and not USE_MLC and forest.voted:
+            # Out of the trees that ran, fewer than the forest after an early exit
+            votes = forest.votes[class_idx]
+            trees = sum(forest.votes)
+        notify(verdict_sender.frame(verdict.VERDICT_LABEL, class_idx, votes, trees, prediction))
+    else:
+        notify(prediction)
+    if(prediction=='Braking'):
+        rear_light()
+
+# Index of label in the labels of the selected model, verdict.NO_CLASS if it has none
+def class_id(label):
+    labels = forest.labels if USE_ARRAY_FOREST and not USE_MLC else LABELS
+    return labels.index(label) if label in labels else verdict.NO_CLASS
+
+# Rear light on for REAR_LIGHT_MS, switched off by the hardware timer or rear_light_task
+def rear_light():
+    RearLight.value(1)
+    if USE_ASYNCIO:
+        global light_off_us
+        light_off_us = time.ticks_add(time.ticks_us(), REAR_LIGHT_MS * 1000)
+        light_flag.set()
+    else:
+        RearLight_timer.init(period=REAR_LIGHT_MS, mode=machine.Timer.ONE_SHOT, callback=Turn_RearLight_OFF)
+
+# Notify a connected central, nothing before BLE is up. notify_task sends it with USE_ASYNCIO.
+def notify(data):
+    if USE_ASYNCIO:
+        notifications.append((data, time.ticks_us()))
+        notify_flag.set()
+    elif ble_peripheral is not None:
+        ble_peripheral.send_data(data)
+
+# Deferred until the first label: BLE stack, GATT registration and advertising
+def start_ble():
+    global ble_peripheral, BLE, ubluetooth
+    start = time.ticks_ms()
+    from bluetooth import BLE
+    import ubluetooth
+    ble_peripheral = BLEPeripheral()
+    print(f"BLE started in {time.ticks_diff(time.ticks_ms(), start)} ms")
+
 class BLEPeripheral:
     def __init__(self):
         self.name = 'Smart Cycle Helmet'
@@ -211,6 +330,8 @@ class BLEPeripheral:
         
         # Boolean to track whether we are conencted or not
         self.connected = False
+        # With USE_ASYNCIO a disconnect only flags the re-advertising for notify_task
+        self.readvertise = False
         
         # Calls advertise function to become discoverable
         self.advertise()
@@ -239,7 +360,11 @@ class BLEPeripheral:
         elif event == 2:
             self.connected = False
             print("Disconnected")
-            self.advertise()
+            if USE_ASYNCIO:
+                self.readvertise = True
+                notify_flag.set()
+            else:
+                self.advertise()
 
     # Sends data to a connected device
     def send_data(self,CurrentPrediction):
@@ -251,26 +376,247 @@ class BLEPeripheral:
 def Turn_RearLight_OFF(_timer):
     global RearLight
     RearLight.value(0)
+
+# INT1 edge to drained FIFO, the window goes to classify_task. A window closed while two
+# still wait is dropped (the ring slots are reused after that, see pipeline.py).
+async def drain_task():
+    global window_overruns
+    while True:
+        if not p.fifo_pending:
+            await int1_flag.wait()
+            continue
+        start = time.ticks_us()
+        due = p.irq_us
+        slot = drain()
+        task_stats[DRAIN].record(due, start)
+        if slot >= 0:
+            if len(windows) >= 2:
+                windows.pop(0)
+                window_overruns += 1
+            windows.append((slot, time.ticks_us()))
+            window_flag.set()
+        # Let the other tasks run between two watermarks
+        await asyncio.sleep_ms(0)
+
+# Closed window to label
+async def classify_task():
+    while True:
+        await window_flag.wait()
+        while windows:
+            slot, due = windows.pop(0)
+            start = time.ticks_us()
+            classify(slot)
+            task_stats[CLASSIFY].record(due, start)
+            await asyncio.sleep_ms(0)
+
+# Queued label to BLE notification, re-advertising after a disconnect, and BLE start
+# once the first label is out
+async def notify_task():
+    while True:
+        await notify_flag.wait()
+        while notifications:
+            data, due = notifications.pop(0)
+            start = time.ticks_us()
+            if ble_peripheral is not None:
+                ble_peripheral.send_data(data)
+            task_stats[NOTIFY].record(due, start)
+        if ble_peripheral is None and first_inference_ms:
+            start_ble()
+        elif ble_peripheral is not None and ble_peripheral.readvertise:
+            ble_peripheral.readvertise = False
+            ble_peripheral.advertise()
+
+# Rear light off REAR_LIGHT_MS after the last rear_light()
+async def rear_light_task():
+    while True:
+        await light_flag.wait()
+        if not RearLight.value():
+            # Set again while the last switch-off was pending, already off
+            continue
+        left_us = time.ticks_diff(light_off_us, time.ticks_us())
+        while left_us > 0:
+            await asyncio.sleep_ms(left_us // 1000 + 1)
+            # A later rear_light() moves the time on
+            left_us = time.ticks_diff(light_off_us, time.ticks_us())
+        start = time.ticks_us()
+        RearLight.value(0)
+        task_stats[LIGHT].record(light_off_us, start)
+
+# Deep sleep once INT2 reports inactivity, checked every SLEEP_CHECK_MS, and the stats
+async def sleep_policy_task():
+    due = time.ticks_us()
+    last_stats = time.ticks_ms()
+    while True:
+        due = time.ticks_add(due, SLEEP_CHECK_MS * 1000)
+        await asyncio.sleep_ms(max(0, time.ticks_diff(due, time.ticks_us()) // 1000))
+        start = time.ticks_us()
+        if p.int2.value():
+            print(f"Going to sleep at {time.ticks_ms()}")
+            enter_deepsleep()
+        task_stats[SLEEP].record(due, start)
+        if time.ticks_diff(time.ticks_ms(), last_stats) >= STATS_PERIOD_MS:
+            print_stats()
+            for stats in task_stats:
+                print(stats.report())
+                stats.reset_stats()
+            print(f"Window overruns: {window_overruns}")
+            last_stats = time.ticks_ms()
+
+async def run_tasks():
+    p.irq_flag = int1_flag
+    if p.fifo_pending:
+        int1_flag.set()
+    for task in (drain_task, classify_task, notify_task, rear_light_task):
+        asyncio.create_task(task())
+    await sleep_policy_task()
+
+# CPU, latency and per-feature statistics of the last STATS_PERIOD_MS
+def print_stats():
+    if not USE_ASYNCIO:
+        # The scheduler's waits are not tracked as idle time
+        print(duty.report('CPU'))
+    # With LIGHT_SLEEP from the resume, the ESP32's own wake-up comes on top
+    print(p.wake_latency.report('Wake-to-drain'))
+    if not USE_MLC:
+        print(p.drain_time.report('FIFO drain') + f", {p.drain_words} words")
+    if LIGHT_SLEEP:
+        print(power.report())
+        power.reset_stats()
+    if USE_ARRAY_FOREST and not USE_MLC:
+        print(f"Forest: {forest.mean_trees():.2f} trees per window, "
+              f"{forest.short_circuit_percent():.0f}% short-circuited")
+        forest.reset_stats()
+    if FAST_ALERTS and not USE_MLC:
+        print(fast_alert.report())
+        print(fast_alert.alert_latency.report('Edge-to-alert'))
+        print(fast_alert.confirm_latency.report('Alert-to-forest'))
+        fast_alert.reset_stats()
+    if USE_THREADS and not USE_MLC:
+        print(handoff.report())
+        handoff.reset_stats()
+    if RATE_GOVERNOR and not USE_MLC:
+        print(rate_governor.report())
+        rate_governor.reset_stats()
+    if VERDICT_FRAMES:
+        print(verdict_sender.report())
+        verdict_sender.reset_stats()
+    duty.reset()
+    p.wake_latency.reset()
+    p.drain_time.reset()
+    p.drain_words = 0
+# Write the settings of the selected mode to the sensor (cold boot, or a warm boot
+# after the sensor lost them)
+def configure_IMU():
+    p.begin()
+    if USE_MLC:
+        # The MLC program replaces the FIFO windows, INT1 carries its result changes
+        p.load_ucf(MLC_UCF_PATH)
+        boot_state.flags |= bootstate.FLAG_MLC
+    else:
+        # FIFO settings are written once, the watermark irq is also used in polling
+        # mode to timestamp the edge for the latency statistics
+        if SLIDING_HOP_MS:
+            watermark = hop_watermark(SLIDING_HOP_MS)
+        else:
+            watermark = FIFO_TS_WATERMARK if FIFO_TIMESTAMPS else FIFO_WATERMARK
+        p.load_fifo_settings(watermark, FIFO_TIMESTAMPS)
+        if FAST_ALERTS:
+            p.load_event_settings()
+        boot_state.flags &= ~bootstate.FLAG_MLC
+        boot_state.profile = governor.NORMAL if RATE_GOVERNOR else 0
+
+# Keep what the next warm boot needs in RTC memory, then deep sleep until INT2
+def enter_deepsleep():
+    boot_state.image = p.shadow_image()
+    if RATE_GOVERNOR and not USE_MLC:
+        boot_state.profile = rate_governor.profile
+    bootstate.save_rtc(boot_state)
+    # Only INT2 may wake the deep sleep, the sensor stays powered through it
+    power.disarm()
+    NEOI2C_PWR.init(hold=True)
+    esp32.gpio_deep_sleep_hold(True)
+    deepsleep()
+
 def initialize_IMU():
     global p
-    global ble_peripheral
-    ble_peripheral = BLEPeripheral()
     p = Adafruit_LSM6DSOX(Pin(20), Pin(22), freq=100000)
-    p.begin()
+    start = time.ticks_ms()
+    mode = bootstate.FLAG_MLC if USE_MLC else 0
+    if warm_boot and (boot_state.flags & bootstate.FLAG_MLC) == mode and p.resume(boot_state.image):
+        # Settings, FIFO samples (or the MLC program) kept from before the deep sleep
+        print(f"Warm boot: sensor settings kept, resumed in {time.ticks_diff(time.ticks_ms(), start)} ms")
+        if RATE_GOVERNOR and not USE_MLC and boot_state.profile != governor.NORMAL:
+            rate_governor.profile = boot_state.profile
+            set_rate_profile(boot_state.profile)
+    else:
+        configure_IMU()
+        print(f"Sensor configured in {time.ticks_diff(time.ticks_ms(), start)} ms")
     esp32.wake_on_ext0(pin=p.int2, level=esp32.WAKEUP_ALL_LOW)
+    global power
+    power = PowerManager(p.int1, p.int2)
+    if USE_MLC:
+        p.enable_mlc()
+    else:
+        p.enable_fifo_irq()
+        if USE_THREADS:
+            _thread.stack_size(8192)
+            _thread.start_new_thread(acquisition_thread, ())
+    duty.reset()
+    if USE_ASYNCIO and not USE_MLC:
+        asyncio.run(run_tasks())
+    last_stats = time.ticks_ms()
     while True:
         if p.int2.value() == 0 :
-            p.load_fifo_settings()
-            p.collect_data()
+            if USE_MLC and p.mlc_pending:
+                collect_mlc()
+            elif USE_THREADS and not USE_MLC:
+                # The acquisition thread drains the FIFO, classify the windows it hands over
+                slot = handoff.take()
+                if slot >= 0:
+                    classify(slot)
+                    handoff.done()
+                elif ble_peripheral is None and first_inference_ms:
+                    start_ble()
+                else:
+                    duty.idle_begin()
+                    time.sleep_ms(1)
+                    duty.idle_end()
+            elif ble_peripheral is None and (first_inference_ms or USE_MLC) and not p.fifo_pending:
+                # Nothing to drain right after the first label. Ahead of the drain, which
+                # polls INT1 on every pass without USE_FIFO_IRQ.
+                start_ble()
+            elif not USE_MLC and (p.fifo_pending or not USE_FIFO_IRQ):
+                collect_data()
+            else:
+                # Idle the core until the next interrupt
+                duty.idle_begin()
+                if LIGHT_SLEEP and USE_FIFO_IRQ and not RearLight.value():
+                    if power.sleep(ble_peripheral is not None and ble_peripheral.connected):
+                        # The edge came in light sleep, the irq may not have run
+                        if USE_MLC:
+                            p.mlc_irq(p.int1)
+                        else:
+                            p.fifo_irq(p.int1)
+                else:
+                    machine.idle()
+                duty.idle_end()
+            if time.ticks_diff(time.ticks_ms(), last_stats) >= STATS_PERIOD_MS:
+                print_stats()
+                last_stats = time.ticks_ms()
         else:
             print(f"Going to sleep at {time.ticks_ms()}")
             print(f"Sleep")
-            deepsleep()
+            enter_deepsleep()
 
-NEOI2C_PWR = Pin(2, Pin.OUT)
-NEOI2C_PWR.value(0)
-sleep(0.5)
-NEOI2C_PWR.value(1)
+if warm_boot:
+    # The I2C port stayed powered (held) through the deep sleep, and the sensor with it
+    esp32.gpio_deep_sleep_hold(False)
+    NEOI2C_PWR = Pin(2, Pin.OUT, value=1, hold=False)
+else:
+    NEOI2C_PWR = Pin(2, Pin.OUT)
+    NEOI2C_PWR.value(0)
+    sleep(0.5)
+    NEOI2C_PWR.value(1)
 RearLight = Pin(13, Pin.OUT)		
 RearLight.value(0)
 RearLight_timer = machine.Timer(1) 	#Use HW timer 1 to turn on rear light for 3 seconds
@@ -0,0 +1,194 @@
+# Usage: RUN ON PC (CPython)
+#   python main_sim.py [FLAG=value ...] [-s seconds] [-v]
+# Runs main.py itself against the simulated LSM6DSOX, where sim_run.py re-implements its
+# loop. machine, esp32 and bluetooth are replaced by stand-ins on the simulated clock
+# (time.sleep_ms, machine.idle and every INT1 poll let it run), a BLE central connects as
+# soon as main.py advertises. FLAG=value overrides a setting at the top of main.py, e.g.
+# USE_FIFO_IRQ=False. The synthetic ride of lsm6dsox_sim plays until main.py deep sleeps
+# or -s seconds (60) have passed, -v prints what main.py printed.
+# Reports when BLE started, the notifications and the deep sleep, and exits with 1 when
+# labels were made but BLE never started. Not for USE_THREADS (CPython rejects the ESP32
+# thread stack size) or USE_MLC without an mlc.ucf.
+import sys
+import re
+import io
+import types
+import contextlib
+import time as host_time
+from lsm6dsox_sim import SimI2C, SimLSM6DSOX, synthetic_trace
+
+
+class Stop(Exception):
+    pass
+
+
+def main(argv):
+    seconds = 60
+    verbose = False
+    flags = []
+    i = 0
+    while i < len(argv):
+        if argv[i] == '-s':
+            seconds = float(argv[i + 1])
+            i += 1
+        elif argv[i] == '-v':
+            verbose = True
+        else:
+            flags.append(argv[i].split('=', 1))
+        i += 1
+
+    accel, gyro = synthetic_trace(int(seconds) + 5)
+    sim = SimLSM6DSOX(accel, gyro)
+    bus = SimI2C(100000)
+    state = {'ble_s': None, 'notifications': 0, 'bytes': 0, 'deepsleep_s': None}
+
+    def run(us, pin=None):
+        sim.run_until(pin, 1, us)
+        if sim.now_us > seconds * 1000000:
+            raise Stop()
+
+    # MicroPython's time on the simulated clock
+    clock = types.ModuleType('time')
+    clock.ticks_us = lambda: sim.now_us
+    clock.ticks_ms = lambda: sim.now_us // 1000
+    clock.ticks_diff = lambda a, b: a - b
+    clock.ticks_add = lambda a, b: a + b
+    clock.sleep_ms = lambda ms: run(int(ms * 1000))
+    clock.sleep = lambda s: run(int(s * 1000000))
+    clock.perf_counter_ns = host_time.perf_counter_ns
+
+    machine = types.ModuleType('machine')
+
+    class Pin:
+        IN = 1
+        OUT = 2
+
+        def __init__(self, n=0, mode=None, value=0, hold=None):
+            self.level = value
+
+        def value(self, level=None):
+            if level is None:
+                return self.level
+            self.level = level
+
+        def init(self, *args, **kwargs):
+            pass
+
+    class Timer:
+        ONE_SHOT = 0
+
+        def __init__(self, n):
+            pass
+
+        def init(self, **kwargs):
+            pass
+
+    class RTC:
+        def memory(self, data=None):
+            return b''
+
+    def deepsleep(*args):
+        state['deepsleep_s'] = sim.now_us / 1000000
+        raise Stop()
+
+    machine.Pin = Pin
+    machine.Timer = Timer
+    machine.RTC = RTC
+    machine.I2C = None
+    machine.deepsleep = deepsleep
+    machine.idle = lambda: run(10000, sim.int1)
+    machine.lightsleep = lambda ms: run(ms * 1000, sim.int1)
+    machine.reset_cause = lambda: 0
+    machine.DEEPSLEEP_RESET = 4
+
+    esp32 = types.ModuleType('esp32')
+    esp32.wake_on_ext0 = esp32.wake_on_ext1 = esp32.gpio_deep_sleep_hold = lambda *args, **kwargs: None
+    esp32.WAKEUP_ALL_LOW = esp32.WAKEUP_ANY_HIGH = 0
+
+    bluetooth = types.ModuleType('bluetooth')
+
+    class BLE:
+        def active(self, *args):
+            pass
+
+        def config(self, *args, **kwargs):
+            return 512
+
+        def irq(self, handler):
+            self.handler = handler
+
+        def gatts_register_services(self, services):
+            return ((1,),)
+
+        def gap_advertise(self, *args):
+            if state['ble_s'] is None:
+                state['ble_s'] = sim.now_us / 1000000
+            # _IRQ_CENTRAL_CONNECT
+            self.handler(1, None)
+
+        def gatts_write(self, handle, data, notify=False):
+            state['notifications'] += 1
+            state['bytes'] += len(data)
+
+    bluetooth.BLE = BLE
+    ubluetooth = types.ModuleType('ubluetooth')
+    ubluetooth.UUID = lambda uuid: uuid
+    ubluetooth.FLAG_READ = 0x02
+    ubluetooth.FLAG_NOTIFY = 0x10
+
+    sys.modules.update({'time': clock, 'machine': machine, 'esp32': esp32, 'bluetooth': bluetooth,
+                        'ubluetooth': ubluetooth})
+    # perf picked up the host clock when lsm6dsox_sim imported it
+    for name in ('perf', 'lsm6dsox', 'power', 'bootstate', 'governor', 'alerts', 'verdict'):
+        sys.modules.pop(name, None)
+    import lsm6dsox
+
+    driver = lsm6dsox.Adafruit_LSM6DSOX
+    poll = driver.fifo_interrupt_en
+
+    # Polling INT1 takes time on the ESP32 too
+    def fifo_interrupt_en(self):
+        run(1000, sim.int1)
+        poll(self)
+
+    driver.fifo_interrupt_en = fifo_interrupt_en
+
+    def simulated(pin_scl, pin_sda, freq):
+        bus.attach(lsm6dsox.LSM6DSOX_ADDR, sim)
+        return driver(None, None, freq, i2c=bus, int1=sim.int1, int2=sim.int2)
+
+    lsm6dsox.Adafruit_LSM6DSOX = simulated
+
+    with open('main.py') as f:
+        source = f.read()
+    for name, value in flags:
+        source, n = re.subn(r'^{} = .*$'.format(name), '{} = {}'.format(name, value), source, count=1,
+                            flags=re.M)
+        if not n:
+            print('No setting {} in main.py'.format(name))
+            sys.exit(2)
+    out = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(out):
+            exec(compile(source, 'main.py', 'exec'), {'__name__': '__main__'})
+    except Stop:
+        pass
+    lines = out.getvalue().splitlines()
+    if verbose:
+        print('\n'.join(lines))
+    labels = sum(1 for line in lines if line in ('Normal', 'Crash', 'Braking', 'Falling'))
+
+    print('Simulated time: {:.1f} s, labels: {}'.format(sim.now_us / 1000000, labels))
+    if state['ble_s'] is None:
+        print('BLE: never started')
+    else:
+        print('BLE: started at {:.1f} s, {} notifications, {} bytes'.format(
+            state['ble_s'], state['notifications'], state['bytes']))
+    if state['deepsleep_s'] is not None:
+        print('Deep sleep at {:.1f} s'.format(state['deepsleep_s']))
+    if labels and state['ble_s'] is None:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
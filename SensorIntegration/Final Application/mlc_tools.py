@@ -0,0 +1,345 @@
+# Usage: RUN ON PC (CPython)
+#   python mlc_tools.py tree [trace.csv ...]
+#                                    distils the forest into one decision tree on features
+#                                    the LSM6DSOX Machine Learning Core computes, writes it
+#                                    to mlc_tree.txt (Weka J48 text) and the feature setup to
+#                                    mlc_features.txt, and prints its agreement with the forest
+#   python mlc_tools.py check [trace.csv ...]
+#                                    agreement of mlc_tree.txt, run by the MLC emulator, with
+#                                    the forest on the traces (or a synthetic ride)
+# Machine Learning Core offload. The MLC runs decision trees on window features of the
+# sensor data (in g and dps, half precision) and reports the class of every window in
+# MLC0_SRC, so the ESP32 only wakes when the label changes. The forest features (means,
+# peaks and jerk over tagged FIFO words) are not all MLC features, so a single tree is
+# fitted to the forest labels on MLC features instead. ST's MLC tool (MEMS Studio/Unico)
+# turns mlc_tree.txt and the setup of mlc_features.txt into the .ucf register file that
+# Adafruit_LSM6DSOX.load_ucf plays, the encoding of the MLC program is not documented.
+import math
+import struct
+import sys
+
+import forest_tools
+from lsm6dsox_sim import load_trace, synthetic_trace
+
+TREE_FILE = 'mlc_tree.txt'
+FEATURES_FILE = 'mlc_features.txt'
+
+# Window in samples at the MLC rate, the 1 second window of the forest
+MLC_ODR_HZ = 26
+MLC_WINDOW = 26
+# Full scales of load_settings: +/-16g and +/-2000dps
+ACC_G_PER_LSB = 16 / 32768
+GY_DPS_PER_LSB = 0.07
+
+# Distilled tree size, the MLC holds a few hundred nodes for all its trees
+MAX_DEPTH = 8
+MIN_LEAF = 4
+
+# Features of the MLC configuration: (feature, input, filter). Inputs are the sensor axes
+# and the norms ACC_V and GY_V, the DIFF filter is an IIR1 with b1 = 1, b2 = -1 (sample to
+# sample difference, the jerk of the forest features). Gyro variance and energy are left
+# out, they overflow half precision.
+MLC_FEATURES = (
+    ('MEAN', 'ACC_X', None), ('MEAN', 'ACC_Y', None), ('MEAN', 'ACC_Z', None),
+    ('MEAN', 'GY_X', None), ('MEAN', 'GY_Y', None), ('MEAN', 'GY_Z', None),
+    ('MAX', 'ACC_V', None), ('MAX', 'GY_V', None),
+    ('VAR', 'ACC_V', None), ('PeakToPeak', 'ACC_V', None),
+    ('MAX', 'ACC_Z', None), ('MIN', 'ACC_Z', None),
+    ('MAX', 'GY_Z', None), ('MIN', 'GY_Z', None),
+    ('MEAN', 'GY_X', 'DIFF'), ('MEAN', 'GY_Y', 'DIFF'), ('MEAN', 'GY_Z', 'DIFF'),
+    ('PeakToPeak', 'ACC_X', 'DIFF'), ('PeakToPeak', 'ACC_Y', 'DIFF'), ('PeakToPeak', 'ACC_Z', 'DIFF'),
+    ('PeakToPeak', 'GY_X', 'DIFF'), ('PeakToPeak', 'GY_Y', 'DIFF'), ('PeakToPeak', 'GY_Z', 'DIFF'),
+)
+INPUTS = ('ACC_X', 'ACC_Y', 'ACC_Z', 'ACC_V', 'GY_X', 'GY_Y', 'GY_Z', 'GY_V')
+
+
+# Round to half precision as the MLC stores inputs, filter outputs and features
+def fp16(value):
+    try:
+        return struct.unpack('<e', struct.pack('<e', value))[0]
+    except OverflowError:
+        return math.copysign(math.inf, value)
+
+
+# Name of a feature as the MLC tool writes it in the tree and the ARFF header
+def feature_name(index):
+    feature, source, filt = MLC_FEATURES[index]
+    if filt:
+        source = 'filter_{}_on_{}'.format(filt, source)
+    return 'F{}_{}_on_{}'.format(index + 1, feature, source)
+
+
+# Half precision inputs of one accel/gyro sample pair in g and dps, in INPUTS order
+def sample_inputs(accel, gyro):
+    ax, ay, az = (fp16(v * ACC_G_PER_LSB) for v in accel)
+    gx, gy, gz = (fp16(v * GY_DPS_PER_LSB) for v in gyro)
+    return (ax, ay, az, fp16(math.sqrt(ax * ax + ay * ay + az * az)),
+            gx, gy, gz, fp16(math.sqrt(gx * gx + gy * gy + gz * gz)))
+
+
+# MLC feature vector of one window of raw accel and gyro samples. prev is the input
+# sample before the window (the filters run over the whole stream), None at the start.
+def window_features(accel, gyro, prev=None):
+    inputs = [sample_inputs(a, g) for a, g in zip(accel, gyro)]
+    previous = [prev] + inputs[:-1] if prev is not None else inputs[:1] + inputs[:-1]
+    out = []
+    for feature, source, filt in MLC_FEATURES:
+        k = INPUTS.index(source)
+        values = [s[k] for s in inputs]
+        if filt == 'DIFF':
+            values = [fp16(s[k] - p[k]) for s, p in zip(inputs, previous)]
+        if feature == 'MEAN':
+            value = sum(values) / len(values)
+        elif feature == 'VAR':
+            mean = sum(values) / len(values)
+            value = sum(v * v for v in values) / len(values) - mean * mean
+        elif feature == 'MAX':
+            value = max(values)
+        elif feature == 'MIN':
+            value = min(values)
+        else:
+            value = max(values) - min(values)
+        out.append(fp16(value))
+    return out
+
+
+# MLC feature vectors of the windows of a trace, the windows of forest_tools.trace_vectors
+def trace_features(accel, gyro, window=MLC_WINDOW, hop=None):
+    vectors = []
+    for start in range(0, len(accel) - window + 1, hop or window):
+        prev = sample_inputs(accel[start - 1], gyro[start - 1]) if start else None
+        vectors.append(window_features(accel[start:start + window], gyro[start:start + window], prev))
+    return vectors
+
+
+# Feature vectors, MLC feature vectors and forest labels of the traces (a synthetic ride
+# without any), at the forest tuning hop
+def training_set(traces, trees):
+    vectors = []
+    mlc_vectors = []
+    for path in traces or [None]:
+        accel, gyro = load_trace(path) if path else synthetic_trace(600)
+        vectors += forest_tools.trace_vectors(accel, gyro, hop=forest_tools.CALIBRATION_HOP)
+        mlc_vectors += trace_features(accel, gyro, hop=forest_tools.CALIBRATION_HOP)
+    labels = [forest_tools.argmax(forest_tools.votes(trees, x)) for x in vectors]
+    return mlc_vectors, labels
+
+
+def gini(counts, n):
+    return 1 - sum(c * c for c in counts) / (n * n) if n else 0
+
+
+# Best (impurity decrease, feature, threshold) split of the rows, None if no split helps.
+# Thresholds are half precision values between two neighbouring feature values.
+def best_split(x, y, rows, num_classes):
+    n = len(rows)
+    total = [0] * num_classes
+    for r in rows:
+        total[y[r]] += 1
+    parent = gini(total, n)
+    best = None
+    for f in range(len(x[0])):
+        ordered = sorted(rows, key=lambda r: x[r][f])
+        left = [0] * num_classes
+        for i in range(n - 1):
+            left[y[ordered[i]]] += 1
+            lo = x[ordered[i]][f]
+            hi = x[ordered[i + 1]][f]
+            if lo == hi or i + 1 < MIN_LEAF or n - i - 1 < MIN_LEAF:
+                continue
+            right = [t - l for t, l in zip(total, left)]
+            gain = parent - ((i + 1) * gini(left, i + 1) + (n - i - 1) * gini(right, n - i - 1)) / n
+            if best is None or gain > best[0] + 1e-12:
+                threshold = fp16((lo + hi) / 2)
+                if not lo <= threshold < hi:
+                    threshold = lo
+                best = (gain, f, threshold)
+    if best is None or best[0] <= 0:
+        return None
+    return best
+
+
+# CART (Gini) tree fitted to the labels, in the node format of forest_tools.load_trees
+def grow(x, y, rows, num_classes, depth=0):
+    counts = [0] * num_classes
+    for r in rows:
+        counts[y[r]] += 1
+    majority = forest_tools.argmax(counts)
+    if depth >= MAX_DEPTH or counts[majority] == len(rows):
+        return ('leaf', majority)
+    split = best_split(x, y, rows, num_classes)
+    if split is None:
+        return ('leaf', majority)
+    _, f, threshold = split
+    left = [r for r in rows if x[r][f] <= threshold]
+    right = [r for r in rows if x[r][f] > threshold]
+    node = ('split', f, threshold, grow(x, y, left, num_classes, depth + 1),
+            grow(x, y, right, num_classes, depth + 1))
+    # Both sides voting the same class is a leaf
+    if node[3] == node[4] and node[3][0] == 'leaf':
+        return node[3]
+    return node
+
+
+def distil(x, labels, num_classes=forest_tools.NUM_CLASSES):
+    return grow(x, labels, list(range(len(x))), num_classes)
+
+
+def classify(node, x):
+    while node[0] == 'split':
+        node = node[3] if x[node[1]] <= node[2] else node[4]
+    return node[1]
+
+
+def count_nodes(node):
+    if node[0] == 'leaf':
+        return 1, 1
+    nodes_left, leaves_left = count_nodes(node[3])
+    nodes_right, leaves_right = count_nodes(node[4])
+    return 1 + nodes_left + nodes_right, leaves_left + leaves_right
+
+
+# Weka J48 text of the tree, the decision tree format the MLC tool imports
+def emit_j48(node, labels, depth, lines):
+    for test, child in (('<=', node[3]), ('>', node[4])):
+        line = '|   ' * depth + '{} {} {}'.format(feature_name(node[1]), test, repr(node[2]))
+        if child[0] == 'leaf':
+            lines.append(line + ': ' + labels[child[1]])
+        else:
+            lines.append(line)
+            emit_j48(child, labels, depth + 1, lines)
+
+
+def write_tree(tree, labels=forest_tools.LABELS, path=TREE_FILE):
+    lines = []
+    if tree[0] == 'leaf':
+        lines.append(': ' + labels[tree[1]])
+    else:
+        emit_j48(tree, labels, 0, lines)
+    nodes, leaves = count_nodes(tree)
+    lines += ['', 'Number of Leaves  : \t{}'.format(leaves), '', 'Size of the tree : \t{}'.format(nodes)]
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    print('Wrote {} ({} nodes, {} leaves)'.format(path, nodes, leaves))
+
+
+# Tree of a J48 text file, class names mapped to their index in labels
+def read_tree(path=TREE_FILE, labels=forest_tools.LABELS):
+    names = [feature_name(i) for i in range(len(MLC_FEATURES))]
+    rows = []
+    with open(path) as f:
+        for line in f:
+            line = line.rstrip()
+            if line.startswith('Number of Leaves'):
+                break
+            if line:
+                rows.append(line)
+    if len(rows) == 1 and rows[0].startswith(':'):
+        return ('leaf', labels.index(rows[0][1:].strip()))
+    pos = [0]
+
+    def parse(depth):
+        branches = []
+        for _ in range(2):
+            line = rows[pos[0]]
+            pos[0] += 1
+            test, _, leaf = line[4 * depth:].partition(':')
+            name, op, threshold = test.split()
+            if branches and op != '>' or not branches and op != '<=':
+                raise ValueError('Unexpected split: ' + line)
+            if leaf:
+                branches.append(('leaf', labels.index(leaf.strip())))
+            else:
+                branches.append(parse(depth + 1))
+        return ('split', names.index(name), float(threshold), branches[0], branches[1])
+
+    return parse(0)
+
+
+# Feature setup of the tree for the MLC tool, in feature index order
+def write_features(labels=forest_tools.LABELS, path=FEATURES_FILE):
+    lines = [
+        'MLC configuration of {}'.format(TREE_FILE),
+        'Accelerometer: 26 Hz, full scale 16 g',
+        'Gyroscope: 26 Hz, full scale 2000 dps',
+        'MLC ODR: {} Hz'.format(MLC_ODR_HZ),
+        'Window length: {} samples'.format(MLC_WINDOW),
+        'Inputs: ' + ', '.join(INPUTS),
+        'Filter DIFF: IIR1, b1 = 1, b2 = -1, a2 = 0',
+        'Decision trees: 1, results in MLC0_SRC',
+        '',
+        'Features:',
+    ]
+    lines += ['  ' + feature_name(i) for i in range(len(MLC_FEATURES))]
+    lines += ['', 'Results:']
+    lines += ['  {} = {}'.format(label, idx) for idx, label in enumerate(labels)]
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    print('Wrote ' + path)
+
+
+# Runs a tree the way the MLC does on the stream of accel/gyro sample pairs: features of
+# every full window, its class in src (MLC0_SRC) and a change flagged as the interrupt
+class MLCEmulator:
+    def __init__(self, tree, window=MLC_WINDOW):
+        self.tree = tree
+        self.window = window
+        self.src = 0
+        self.windows = 0
+        self.restart()
+
+    # Drop the partial window and the filter state, as MLC_INIT does
+    def restart(self):
+        self.accel = []
+        self.gyro = []
+        self.prev = None
+
+    # Add one sample pair, returns True when a window ended with a new class
+    def push(self, accel, gyro):
+        self.accel.append(accel)
+        self.gyro.append(gyro)
+        if len(self.accel) < self.window:
+            return False
+        x = window_features(self.accel, self.gyro, self.prev)
+        self.prev = sample_inputs(self.accel[-1], self.gyro[-1])
+        self.accel = []
+        self.gyro = []
+        self.windows += 1
+        result = classify(self.tree, x)
+        changed = result != self.src
+        self.src = result
+        return changed
+
+
+# Share of vectors the tree labels as the forest, overall and per forest class
+def agreement(tree, x, labels, num_classes=forest_tools.NUM_CLASSES):
+    hits = [0] * num_classes
+    totals = [0] * num_classes
+    for row, label in zip(x, labels):
+        totals[label] += 1
+        hits[label] += classify(tree, row) == label
+    print('Agreement with the forest: {}/{} windows ({:.1f}%)'.format(
+        sum(hits), len(labels), 100 * sum(hits) / max(len(labels), 1)))
+    for idx in range(num_classes):
+        if totals[idx]:
+            print('  {:8s} {}/{}'.format(forest_tools.LABELS[idx], hits[idx], totals[idx]))
+    return sum(hits) / max(len(labels), 1)
+
+
+def main(argv):
+    command = argv[0] if argv else 'tree'
+    trees = forest_tools.load_trees()
+    x, labels = training_set(argv[1:], trees)
+    if command == 'tree':
+        tree = distil(x, labels)
+        write_tree(tree)
+        write_features()
+        agreement(tree, x, labels)
+    elif command == 'check':
+        agreement(read_tree(), x, labels)
+    else:
+        print('Unknown command ' + command)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
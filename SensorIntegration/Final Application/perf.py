@@ -0,0 +1,66 @@
+try:
+    from time import ticks_us, ticks_ms, ticks_diff
+except ImportError:
+    # CPython on the host (simulator and benchmarks)
+    from time import perf_counter_ns
+
+    def ticks_us():
+        return perf_counter_ns() // 1000
+
+    def ticks_ms():
+        return perf_counter_ns() // 1000000
+
+    def ticks_diff(new, old):
+        return new - old
+
+
+# Count, mean, min and max of latencies in microseconds
+class LatencyStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total_us = 0
+        self.min_us = 0
+        self.max_us = 0
+
+    def add(self, us):
+        if self.count == 0 or us < self.min_us:
+            self.min_us = us
+        if us > self.max_us:
+            self.max_us = us
+        self.count += 1
+        self.total_us += us
+
+    def mean_us(self):
+        return self.total_us // self.count if self.count else 0
+
+    def report(self, name):
+        return '{}: n={} mean={} min={} max={} us'.format(name, self.count, self.mean_us(), self.min_us, self.max_us)
+
+
+# Fraction of time the core is busy, i.e. not inside idle_begin()/idle_end()
+class DutyCycle:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.start_us = ticks_us()
+        self.idle_us = 0
+        self.idle_start_us = 0
+
+    def idle_begin(self):
+        self.idle_start_us = ticks_us()
+
+    def idle_end(self):
+        self.idle_us += ticks_diff(ticks_us(), self.idle_start_us)
+
+    def percent(self):
+        elapsed = ticks_diff(ticks_us(), self.start_us)
+        if elapsed <= 0:
+            return 100
+        return 100 * (elapsed - self.idle_us) // elapsed
+
+    def report(self, name):
+        return '{}: {}% busy over {} ms'.format(name, self.percent(), ticks_diff(ticks_us(), self.start_us) // 1000)
@@ -0,0 +1,95 @@
+import _thread
+from imu_ring import RING_WINDOWS
+
+# Closed ring windows the consumer may hold at once (the one it reads and the next one).
+# The producer fills a third and end_window clears the fourth, so with RING_WINDOWS = 4
+# no slot in use by the consumer is ever reused. Windows also have to stay below a third
+# of the ring capacity so their samples are not overwritten meanwhile.
+HANDOFF_DEPTH = RING_WINDOWS - 2
+
+
+# Lock protected double buffer of closed IMURing slots between an acquisition thread
+# (FIFO drain, put) and a classification thread (features, forest, BLE: take, done).
+# A window closed while the consumer still holds HANDOFF_DEPTH is an overrun: the oldest
+# waiting one is dropped, or with block set (benchmarks on the simulator, which runs
+# faster than real time) the producer waits for the consumer and counts a stall.
+# The ready and space locks are held while there is nothing to wait for, the other
+# thread releases them to wake a waiter.
+class SlotHandoff:
+    def __init__(self, block=False):
+        self.block = block
+        self.lock = _thread.allocate_lock()
+        self.ready = _thread.allocate_lock()
+        self.space = _thread.allocate_lock()
+        self.ready.acquire()
+        self.space.acquire()
+        self.pending = [0] * HANDOFF_DEPTH
+        self.count = 0
+        self.reading = -1
+        self.closed = False
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.handoffs = 0
+        self.overruns = 0
+        self.stalls = 0
+
+    def _held(self):
+        return self.count + (1 if self.reading >= 0 else 0)
+
+    # Producer: hand over a slot closed by end_window
+    def put(self, slot):
+        self.lock.acquire()
+        while self._held() >= HANDOFF_DEPTH:
+            if not self.block:
+                # Drop the oldest window the consumer has not started
+                self.overruns += 1
+                for i in range(1, self.count):
+                    self.pending[i - 1] = self.pending[i]
+                self.count -= 1
+                break
+            self.stalls += 1
+            self.lock.release()
+            self.space.acquire()
+            self.lock.acquire()
+        self.pending[self.count] = slot
+        self.count += 1
+        self.handoffs += 1
+        self.lock.release()
+        if self.ready.locked():
+            self.ready.release()
+
+    # Consumer: oldest waiting slot, held until done, -1 if there is none. With wait set
+    # it blocks until the producer hands one over, or returns -1 once it closed.
+    def take(self, wait=False):
+        while True:
+            self.lock.acquire()
+            slot = -1
+            if self.count:
+                slot = self.pending[0]
+                for i in range(1, self.count):
+                    self.pending[i - 1] = self.pending[i]
+                self.count -= 1
+                self.reading = slot
+            self.lock.release()
+            if slot >= 0 or not wait or self.closed:
+                return slot
+            self.ready.acquire()
+
+    # Consumer: the slot of the last take is no longer read
+    def done(self):
+        self.lock.acquire()
+        self.reading = -1
+        self.lock.release()
+        if self.space.locked():
+            self.space.release()
+
+    # Producer: no more windows, wakes a waiting consumer
+    def close(self):
+        self.closed = True
+        if self.ready.locked():
+            self.ready.release()
+
+    def report(self):
+        return 'Pipeline: {} windows handed over, {} overruns, {} stalls'.format(
+            self.handoffs, self.overruns, self.stalls)
@@ -0,0 +1,78 @@
+try:
+    from machine import lightsleep
+    import esp32
+except ImportError:
+    # CPython / unix port, sim_run.py passes a simulated sleep
+    lightsleep = esp32 = None
+from perf import ticks_us, ticks_diff
+
+# Longest light sleep while a BLE central is connected. The radio misses the connection
+# events meanwhile, a link can only survive if the BT controller keeps its timing through
+# the sleep (not confirmed on hardware yet, see main.LIGHT_SLEEP) and this stays well
+# below its supervision timeout (720ms at the least centrals use).
+BLE_MAX_SLEEP_MS = 250
+# Longest light sleep without a connection, advertising pauses meanwhile
+MAX_SLEEP_MS = 1000
+
+
+# Light sleep between FIFO watermarks instead of machine.idle. The ESP32 sleeps until the
+# INT1 watermark line goes high (ext1) or the sleep limit passes, then the drain and
+# classification resume where they left off. INT2 wakes the chip from deep sleep through
+# ext0 instead, while it is low (sensor active) it would end every light sleep at once, so
+# arm and disarm swap the two sources. sleep and clock can stand in for the ESP32 on the
+# host (simulated time, see sim_run.py).
+class PowerManager:
+    def __init__(self, wake_pin, sleep_pin=None, sleep=lightsleep, clock=ticks_us):
+        self.wake_pin = wake_pin
+        self.sleep_pin = sleep_pin
+        self.lightsleep = sleep
+        self.clock = clock
+        self.armed = False
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.start_us = self.clock()
+        self.sleep_us = 0
+        self.sleeps = 0
+        self.woken = 0
+
+    # INT1 wakes the ESP32 from light sleep
+    def arm(self):
+        if esp32 is not None and not self.armed:
+            esp32.wake_on_ext0(pin=None)
+            esp32.wake_on_ext1(pins=(self.wake_pin,), level=esp32.WAKEUP_ANY_HIGH)
+        self.armed = True
+
+    # Only INT2 going low (activity) wakes the ESP32, for deepsleep
+    def disarm(self):
+        if esp32 is not None and self.armed:
+            esp32.wake_on_ext1(pins=None)
+            if self.sleep_pin is not None:
+                esp32.wake_on_ext0(pin=self.sleep_pin, level=esp32.WAKEUP_ALL_LOW)
+        self.armed = False
+
+    # Light sleep until INT1 or the limit for the BLE state, returns True if INT1 is
+    # high after the wake. The irq may have missed an edge that came in light sleep,
+    # the caller flags the drain itself.
+    def sleep(self, connected=False):
+        if self.wake_pin.value():
+            return True
+        self.arm()
+        start = self.clock()
+        self.lightsleep(BLE_MAX_SLEEP_MS if connected else MAX_SLEEP_MS)
+        self.sleep_us += ticks_diff(self.clock(), start)
+        self.sleeps += 1
+        if self.wake_pin.value():
+            self.woken += 1
+            return True
+        return False
+
+    def awake_percent(self):
+        elapsed = ticks_diff(self.clock(), self.start_us)
+        if elapsed <= 0:
+            return 100
+        return 100 * (elapsed - self.sleep_us) / elapsed
+
+    def report(self):
+        return 'Light sleep: {:.1f}% awake, {} sleeps, {} woken by INT1, {} timed out'.format(
+            self.awake_percent(), self.sleeps, self.woken, self.sleeps - self.woken)
@@ -0,0 +1,75 @@
+# Usage: RUN ON PC (CPython)
+#   import quickscorer; quickscorer.predict(x)
+# QuickScorer evaluation of the RandomForest.py forest for scoring recorded data on the
+# host: the split nodes of every feature are kept sorted by threshold, and the nodes
+# a feature value makes false (value > threshold) clear the leaves of their left
+# subtree from a per-tree leaf bitmask. The exit leaf of a tree is the lowest set bit,
+# so no node is branched on. Votes and labels are the same as RandomForest.predict.
+from bisect import bisect_left
+import forest_tools
+
+
+class QuickScorer:
+    def __init__(self, trees, num_classes=forest_tools.NUM_CLASSES):
+        self.num_classes = num_classes
+        # Class of every leaf of every tree, leaves numbered left to right
+        self.leaf_class = []
+        self.full = []
+        nodes = {}
+        for t, tree in enumerate(trees):
+            leaves = []
+            splits = []
+            self.number_leaves(tree, leaves, splits)
+            full = (1 << len(leaves)) - 1
+            for feature, threshold, first, mid in splits:
+                left = ((1 << mid) - 1) ^ ((1 << first) - 1)
+                nodes.setdefault(feature, []).append((threshold, t, full & ~left))
+            self.leaf_class.append(leaves)
+            self.full.append(full)
+        # Per feature: thresholds ascending with the tree and mask of each node
+        self.features = []
+        for feature in sorted(nodes):
+            entries = sorted(nodes[feature], key=lambda e: e[0])
+            self.features.append((feature, [e[0] for e in entries], [e[1] for e in entries], [e[2] for e in entries]))
+
+    # Append the leaves of node to leaves and (feature, threshold, first leaf, first
+    # right leaf) of its splits to splits
+    def number_leaves(self, node, leaves, splits):
+        if node[0] == 'leaf':
+            leaves.append(node[1])
+            return
+        first = len(leaves)
+        self.number_leaves(node[3], leaves, splits)
+        splits.append((node[1], node[2], first, len(leaves)))
+        self.number_leaves(node[4], leaves, splits)
+
+    def vote(self, x):
+        masks = list(self.full)
+        for feature, thresholds, tree_ids, node_masks in self.features:
+            # Nodes with threshold < x[feature] are false, they come first
+            for k in range(bisect_left(thresholds, x[feature])):
+                masks[tree_ids[k]] &= node_masks[k]
+        votes = [0] * self.num_classes
+        for leaves, mask in zip(self.leaf_class, masks):
+            votes[leaves[(mask & -mask).bit_length() - 1]] += 1
+        return votes
+
+    # Same as RandomForest.predict: argmax of the votes, lowest class index wins a tie
+    def predict(self, x):
+        return forest_tools.argmax(self.vote(x))
+
+
+_scorer = None
+_fixed_scorer = None
+
+
+# Drop-in for RandomForest.predict (RandomForestFixed.predict with fixed set)
+def predict(x, fixed=False):
+    global _scorer, _fixed_scorer
+    if fixed:
+        if _fixed_scorer is None:
+            _fixed_scorer = QuickScorer(forest_tools.fixed_trees(forest_tools.load_trees()))
+        return _fixed_scorer.predict(x)
+    if _scorer is None:
+        _scorer = QuickScorer(forest_tools.load_trees())
+    return _scorer.predict(x)
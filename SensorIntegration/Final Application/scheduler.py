@@ -0,0 +1,33 @@
+from perf import ticks_us, ticks_diff, LatencyStats
+
+
+# Timing of one task of the uasyncio runtime in main.py (USE_ASYNCIO): the latency from
+# the event that made the task due (INT1 edge, closed window, queued notification, light
+# off time) to the end of its work, the time it ran, and how often the latency went past
+# its deadline.
+class TaskStats:
+    def __init__(self, name, deadline_ms):
+        self.name = name
+        self.deadline_us = deadline_ms * 1000
+        self.latency = LatencyStats()
+        self.run = LatencyStats()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.misses = 0
+        self.latency.reset()
+        self.run.reset()
+
+    # Work done: due_us when the task became due, start_us when it started running
+    def record(self, due_us, start_us):
+        now = ticks_us()
+        latency = ticks_diff(now, due_us)
+        self.latency.add(latency)
+        self.run.add(ticks_diff(now, start_us))
+        if latency > self.deadline_us:
+            self.misses += 1
+
+    def report(self):
+        return '{}: n={} latency mean={} max={} us, run mean={} max={} us, {} misses of {} ms'.format(
+            self.name, self.latency.count, self.latency.mean_us(), self.latency.max_us, self.run.mean_us(),
+            self.run.max_us, self.misses, self.deadline_us // 1000)
@@ -0,0 +1,458 @@
+# Usage: RUN ON PC (CPython or the MicroPython unix port)
+#   python sim_run.py [trace.csv] [-s hop_ms] [-f] [-e] [-p] [-m] [-a] [-t] [-g] [-l] [-w] [-T] [-o predictions.csv] [-c expected.csv]
+# Replays a recorded trace (BleWindows.py rows or ax,ay,az,gx,gy,gz CSV) through the
+# simulated LSM6DSOX and the acquisition path of main.py: FIFO drain into the ring
+# buffer, features and RandomForest. Without a trace a synthetic ride is used.
+# -s classifies a sliding window every hop_ms as main.py does with SLIDING_HOP_MS.
+# -f uses the integer features and RandomForestFixed as main.py does with USE_FIXED_POINT.
+# -e classifies with forest.ArrayForest in early-exit mode and reports the trees evaluated.
+# -p runs the cascade pre-filter of forest.ArrayForest and reports the windows it labelled.
+# With -c the recall of every class against the expected labels is printed as well.
+# -t batches FIFO timestamps as main.py does with FIFO_TIMESTAMPS, jerk then uses the
+# real time between samples.
+# -g runs the rate governor of main.py (RATE_GOVERNOR) with sliding windows and
+# timestamps, switching between the rate profiles of governor.py, and reports the time in
+# each. -c then compares the label in effect at every expected window. The trace agreement
+# printed with every run compares each window's label with the 26Hz features of the trace
+# itself, per rate profile and for the sleep state (where the sensor slows down itself).
+# -l light sleeps between watermarks as main.py does with LIGHT_SLEEP (power.py, as if a
+# BLE central were connected) instead of idling, and reports the wake latency.
+# -w deep sleeps the MCU after WARM_AFTER_S and warm boots it as main.py does: a new
+# driver resumes from the configuration image of the boot state instead of setting the
+# sensor up, and the FIFO samples of the sleep are kept.
+# -T drains on a second thread handing windows to the classification thread (pipeline.py)
+# as main.py does with USE_THREADS. The drain waits for the classification instead of
+# dropping windows, the labels match a run without -T, and reports the handoffs.
+# The sensor and MCU energy per hour (approximate, see lsm6dsox_sim) and the BLE bytes of
+# the labels as verdict frames (verdict.py) and as strings are always printed.
+# -a raises provisional alerts from free-fall and single-tap events as main.py does with
+# FAST_ALERTS and reports how much earlier than the forest they came.
+# -m runs the Machine Learning Core mode of main.py (USE_MLC) instead, mlc_tree.txt on the
+# emulated MLC, and lists the class changes the driver was woken for.
+# -o writes one prediction per window, -c compares against a previous -o file.
+import sys
+import _thread
+import RandomForest
+import RandomForestFixed
+import features
+from forest import ArrayForest, LABELS
+from alerts import FastAlert, ALERT_LABELS
+import governor
+from power import PowerManager, BLE_MAX_SLEEP_MS
+from pipeline import SlotHandoff
+from imu_ring import RING_WINDOWS
+from bootstate import BootState
+from verdict import VERDICT_SIZE
+from lsm6dsox import Adafruit_LSM6DSOX, LSM6DSOX_ADDR, FIFO_WATERMARK, FIFO_TS_WATERMARK
+from perf import ticks_us, ticks_diff
+from lsm6dsox_sim import SimI2C, SimLSM6DSOX, load_trace, synthetic_trace
+
+# Longest simulated wait for a watermark before giving up
+MAX_WAIT_US = 60000000
+# Sample rate and samples per sensor in a classification window, as in main.py
+ODR_HZ = 26
+WINDOW_SAMPLES = 26
+# Rough ESP32 figures for the MCU energy estimate: current while awake, in machine.idle
+# and in light sleep (with the BLE connection events), the time awake per wake on top of
+# the bus time (features and forest) and the time to leave light sleep
+MCU_ACTIVE_MA = 40
+MCU_IDLE_MA = 25
+MCU_LIGHTSLEEP_MA = 1.5
+MCU_WAKE_US = 2000
+LIGHTSLEEP_EXIT_US = 1000
+MCU_V = 3.3
+# Trace time before the deep sleep of -w, and the length of the sleep
+WARM_AFTER_S = 5
+DEEP_SLEEP_S = 3
+
+
+# Build a driver talking to a simulated sensor playing back accel/gyro
+def make_sensor(accel, gyro, rate=26, freq=100000, watermark=FIFO_WATERMARK, events=False, timestamps=False):
+    bus = SimI2C(freq)
+    sim = SimLSM6DSOX(accel, gyro, rate)
+    bus.attach(LSM6DSOX_ADDR, sim)
+    p = Adafruit_LSM6DSOX(None, None, freq, i2c=bus, int1=sim.int1, int2=sim.int2)
+    p.begin()
+    p.load_fifo_settings(watermark, timestamps)
+    if events:
+        p.load_event_settings()
+    p.enable_fifo_irq()
+    return p, sim, bus
+
+
+# Drain and classify every watermark until the trace runs out, over the drained window
+# or a SlidingFeatures window, with model.predict (the generated predict of the float or
+# fixed model by default). With alert (a FastAlert) every INT1 edge is checked for
+# free-fall/single-tap events first and each label settles the pending alert. With rate (a
+# governor.RateGovernor) every window may switch the rate profile, sliding is then
+# replaced by a window of the new length. With power (a power.PowerManager on the
+# simulated time) the wait for INT1 is spent in light sleeps. With handoff (a
+# pipeline.SlotHandoff) the drain runs on a second thread as main.py does with
+# USE_THREADS, the simulator is only driven from that thread (bus lock around the wait and
+# drain, rate switches from the classification side wait for it).
+# Returns a list of (simulated time in ms, class index)
+def replay(p, sim, stats, sliding=None, fixed=False, model=None, alert=None, rate=None, power=None,
+           handoff=None):
+    feature_buf = [0.0] * features.NUM_FEATURES
+    if model is None:
+        model = RandomForestFixed if fixed else RandomForest
+    predictions = []
+    # Simulated time each ring slot was closed at
+    closed_ms = [0] * RING_WINDOWS
+    bus_lock = _thread.allocate_lock()
+
+    # Wait for the next watermark and drain it, returns the closed ring slot, -1 without
+    # a complete window, None once the trace is over
+    def drain():
+        if sim.exhausted:
+            return None
+        if not p.fifo_pending and power is not None:
+            waited_us = 0
+            while not power.sleep(True) and waited_us < MAX_WAIT_US:
+                waited_us += BLE_MAX_SLEEP_MS * 1000
+            if not p.int1.value():
+                return None
+            p.fifo_irq(p.int1)
+        elif not p.fifo_pending and not sim.run_until(p.int1, 1, MAX_WAIT_US):
+            return None
+        if alert is not None and p.fifo_pending:
+            alert.check(p)
+        p.service_fifo()
+        if p.fifo_over != 1:
+            return -1
+        slot = p.ring.end_window()
+        closed_ms[slot] = sim.now_us // 1000
+        stats['drain_us'] += p.i2c_time_us
+        stats['wakes'] += 1
+        return slot
+
+    # The rate profiles are resampled onto the 26Hz grid of the sliding window
+    grid = features.GridFeed(sliding, ODR_HZ) if rate is not None else None
+
+    def classify(slot, sliding):
+        if sliding is not None:
+            features.ring_feed(p.ring, slot, grid or sliding)
+            sliding.features(feature_buf)
+        else:
+            features.ring_features(p.ring, slot, feature_buf, fixed)
+        label = model.predict(feature_buf)
+        predictions.append((closed_ms[slot], label))
+        state = governor.PROFILES[rate.profile][0] if rate is not None else '26Hz'
+        stats['states'].append(state + ' in sleep state' if sim.sleep_state else state)
+        if alert is not None and alert.settle(LABELS[label]) is None and alert.pending is None \
+                and LABELS[label] in ALERT_LABELS:
+            stats['unflagged'] += 1
+        if rate is not None:
+            profile = rate.update(label == 0, feature_buf)
+            if profile is not None:
+                bus_lock.acquire()
+                grid.set_rate(governor.set_profile(p, profile, alert is not None))
+                bus_lock.release()
+                if alert is not None:
+                    alert.confirm_windows = 1000 // governor.PROFILES[profile][3] + 1
+        return sliding
+
+    if handoff is None:
+        slot = drain()
+        while slot is not None:
+            if slot >= 0:
+                sliding = classify(slot, sliding)
+            slot = drain()
+        return predictions
+
+    def acquisition():
+        while True:
+            bus_lock.acquire()
+            slot = drain()
+            bus_lock.release()
+            if slot is None:
+                break
+            if slot >= 0:
+                handoff.put(slot)
+        handoff.close()
+
+    _thread.start_new_thread(acquisition, ())
+    slot = handoff.take(True)
+    while slot >= 0:
+        sliding = classify(slot, sliding)
+        handoff.done()
+        slot = handoff.take(True)
+    return predictions
+
+
+# Label of predictions in effect at every time of ref, for runs with other windows
+def aligned(predictions, ref):
+    out = []
+    i = 0
+    label = 0
+    for t, _ in ref:
+        while i < len(predictions) and predictions[i][0] <= t:
+            label = predictions[i][1]
+            i += 1
+        out.append((t, label))
+    return out
+
+
+# Labels of predictions against the fixed-rate path on the trace itself: the features of
+# the WINDOW_SAMPLES trace samples (26Hz) up to the time each window closed, counted by
+# the state of the window (rate profile or sleep state, see replay)
+def trace_agreement(predictions, states, accel, gyro, fixed):
+    model = RandomForestFixed if fixed else RandomForest
+    acc = features.KinematicAccumulator(fixed)
+    x = [0] * features.NUM_FEATURES
+    counts = {}
+    for (t, label), state in zip(predictions, states):
+        end = t * ODR_HZ // 1000 + 1
+        if end < WINDOW_SAMPLES or end > len(accel):
+            continue
+        acc.reset()
+        # Tag 1 features come from the gyro, as the FIFO delivers them
+        for i in range(end - WINDOW_SAMPLES, end):
+            acc.add_accel(*gyro[i])
+        for i in range(end - WINDOW_SAMPLES, end):
+            acc.add_gyro(*accel[i])
+        acc.features(x)
+        count = counts.setdefault(state, [0, 0])
+        count[0] += model.predict(x) == label
+        count[1] += 1
+    return 'Trace agreement: ' + ', '.join(
+        '{} {}/{}'.format(state, *count) for state, count in sorted(counts.items()))
+
+
+# Sensor supply energy and the MCU energy estimate of wakes awake for their bus time and
+# MCU_WAKE_US, idle or in light sleep (power) in between, in mWh per hour
+def energy_report(sim, bus_us, wakes, power=None):
+    hours = sim.now_us / 3.6e9
+    awake_us = bus_us + wakes * MCU_WAKE_US
+    idle_ma = MCU_IDLE_MA
+    if power is not None:
+        awake_us += power.sleeps * LIGHTSLEEP_EXIT_US
+        idle_ma = MCU_LIGHTSLEEP_MA
+    mcu_mwh = (awake_us * MCU_ACTIVE_MA + (sim.now_us - awake_us) * idle_ma) * MCU_V / 3.6e9
+    return 'Energy: sensor {:.3f} mWh/h, MCU {:.1f} mWh/h ({} wakes, {:.2f}% awake)'.format(
+        sim.energy_mwh() / hours, mcu_mwh / hours, wakes, 100 * awake_us / max(sim.now_us, 1))
+
+
+# The MCU goes to deep sleep after WARM_AFTER_S, keeping the configuration image of p
+# in a packed BootState, nothing drains the FIFO for DEEP_SLEEP_S, then a new driver
+# resumes from the image. Returns the new driver, None if the sensor lost its settings.
+def warm_boot(p, sim, bus):
+    sim.advance(WARM_AFTER_S * 1000000)
+    state = BootState()
+    state.image = p.shadow_image()
+    rtc = state.pack()
+    sim.advance(DEEP_SLEEP_S * 1000000)
+    q = Adafruit_LSM6DSOX(None, None, bus.freq, i2c=bus, int1=sim.int1, int2=sim.int2)
+    transactions = bus.transactions
+    if not q.resume(BootState(rtc).image):
+        return None
+    q.enable_fifo_irq()
+    print('Warm boot: settings kept, {} I2C transactions, {} FIFO words waiting'.format(
+        bus.transactions - transactions, sim.fifo_level))
+    return q
+
+
+# Wake on every MLC interrupt and read the new class as main.py does with USE_MLC.
+# Returns a list of (simulated time in ms, class index) of the changes.
+def replay_mlc(p, sim, tree):
+    from mlc_tools import MLCEmulator
+    sim.attach_mlc(MLCEmulator(tree))
+    p.enable_mlc()
+    changes = []
+    while not sim.exhausted:
+        if not p.mlc_pending and not sim.run_until(p.int1, 1, MAX_WAIT_US):
+            break
+        label = p.service_mlc()
+        if label is not None:
+            changes.append((sim.now_us // 1000, label))
+    return changes
+
+
+def report_mlc(sim, transactions, changes, start_ms):
+    seconds = sim.now_us / 1000000
+    print('Simulated time: {:.1f} s, MLC windows: {}'.format(seconds, sim.mlc.windows))
+    print('MCU wakes: {} ({:.1f} per minute), I2C: {} transactions'.format(
+        len(changes), 60 * len(changes) / max(seconds, 1), transactions))
+    held = [0, 0, 0, 0]
+    label, since = 0, start_ms
+    for t, new in changes:
+        held[label] += t - since
+        label, since = new, t
+    held[label] += sim.now_us // 1000 - since
+    for idx in range(4):
+        print('  {:8s} {:.1f} s'.format(RandomForest.idxToLabel(idx), held[idx] / 1000))
+
+
+def read_predictions(path):
+    rows = []
+    with open(path) as f:
+        for line in f:
+            fields = line.strip().split(',')
+            if len(fields) == 2 and fields[0].isdigit():
+                rows.append((int(fields[0]), int(fields[1])))
+    return rows
+
+
+def main(argv):
+    trace = out = expected = None
+    hop_ms = 0
+    fixed = False
+    early_exit = False
+    prefilter = False
+    mlc = False
+    alerts = False
+    timestamps = False
+    rate = None
+    light_sleep = False
+    warm = False
+    threads = False
+    i = 0
+    while i < len(argv):
+        if argv[i] == '-s':
+            hop_ms = int(argv[i + 1])
+            i += 1
+        elif argv[i] == '-f':
+            fixed = True
+        elif argv[i] == '-e':
+            early_exit = True
+        elif argv[i] == '-p':
+            prefilter = True
+        elif argv[i] == '-m':
+            mlc = True
+        elif argv[i] == '-a':
+            alerts = True
+        elif argv[i] == '-t':
+            timestamps = True
+        elif argv[i] == '-g':
+            rate = governor.NORMAL
+        elif argv[i] == '-l':
+            light_sleep = True
+        elif argv[i] == '-w':
+            warm = True
+        elif argv[i] == '-T':
+            threads = True
+        elif argv[i] == '-o':
+            out = argv[i + 1]
+            i += 1
+        elif argv[i] == '-c':
+            expected = argv[i + 1]
+            i += 1
+        else:
+            trace = argv[i]
+        i += 1
+    if trace:
+        accel, gyro = load_trace(trace)
+    else:
+        accel, gyro = synthetic_trace(600)
+
+    if rate is not None:
+        # Features only stay comparable across rates with the real sample spacing
+        timestamps = True
+        hop_ms = governor.PROFILES[rate][3]
+    sliding = None
+    # Words per sample pair, a timestamp word comes with each
+    words = 3 if timestamps else 2
+    watermark = FIFO_TS_WATERMARK if timestamps else FIFO_WATERMARK
+    if hop_ms:
+        sliding = features.SlidingFeatures(WINDOW_SAMPLES, fixed)
+        watermark = words * max(1, hop_ms * ODR_HZ // 1000)
+    p, sim, bus = make_sensor(accel, gyro, watermark=watermark, events=alerts, timestamps=timestamps)
+    setup_transactions = bus.transactions
+    setup_bus_us = bus.bus_us
+    stats = {'drain_us': 0, 'unflagged': 0, 'wakes': 0, 'states': []}
+    alert = None
+    if alerts:
+        # A sliding window still holds the event for a whole window length of hops
+        confirm = 1000 // hop_ms + 1 if hop_ms else 2
+        alert = FastAlert(confirm_windows=confirm, clock=lambda: sim.now_us)
+    if mlc:
+        import mlc_tools
+        start_ms = sim.now_us // 1000
+        changes = replay_mlc(p, sim, mlc_tools.read_tree())
+        report_mlc(sim, bus.transactions - setup_transactions, changes, start_ms)
+        if out:
+            with open(out, 'w') as f:
+                f.write('t_ms,class\n')
+                for t, label in changes:
+                    f.write('{},{}\n'.format(t, label))
+        return
+    model = None
+    if early_exit or prefilter:
+        model = ArrayForest(fixed=fixed, early_exit=early_exit, prefilter=prefilter)
+    if rate is not None:
+        rate = governor.RateGovernor(model.peak_limits if model is not None else None, fixed,
+                                     clock=lambda: sim.now_us // 1000)
+    if warm:
+        p = warm_boot(p, sim, bus)
+        if p is None:
+            print('Warm boot: the sensor lost its settings')
+            sys.exit(1)
+    boot_ms = sim.now_us // 1000
+    power = None
+    if light_sleep:
+        power = PowerManager(p.int1, p.int2, sleep=lambda ms: sim.run_until(p.int1, 1, ms * 1000),
+                             clock=lambda: sim.now_us)
+    handoff = SlotHandoff(block=True) if threads else None
+    start = ticks_us()
+    predictions = replay(p, sim, stats, sliding, fixed, model, alert, rate, power, handoff)
+    wall_us = ticks_diff(ticks_us(), start)
+
+    windows = max(len(predictions), 1)
+    counts = [0, 0, 0, 0]
+    for _, label in predictions:
+        counts[label] += 1
+    print('Simulated time: {:.1f} s, host time: {:.3f} s, {:.0f}x real time'.format(
+        sim.now_us / 1000000, wall_us / 1000000, sim.now_us / max(wall_us, 1)))
+    print('Windows: {}, {:.0f} us host time per window'.format(len(predictions), wall_us / windows))
+    if predictions:
+        print('First prediction {} ms after the {}'.format(predictions[0][0] - boot_ms, 'warm boot' if warm else 'setup'))
+    print('I2C: {:.1f} transactions and {:.0f} us bus time per window, {:.0f} us host drain time'.format(
+        (bus.transactions - setup_transactions) / windows, (bus.bus_us - setup_bus_us) / windows,
+        stats['drain_us'] / windows))
+    print(energy_report(sim, bus.bus_us - setup_bus_us, stats['wakes'], power))
+    print('BLE: {} verdict frames, {} bytes ({} as label strings)'.format(
+        len(predictions), len(predictions) * VERDICT_SIZE, sum(len(LABELS[label]) for _, label in predictions)))
+    if threads:
+        print(handoff.report())
+    if light_sleep:
+        # No simulated time passes while awake, the awake share is the estimate above
+        print('Light sleeps: {}, {} woken by INT1, {} timed out'.format(
+            power.sleeps, power.woken, power.sleeps - power.woken))
+        print('Wake latency: {} us light sleep exit + {}'.format(
+            LIGHTSLEEP_EXIT_US, p.wake_latency.report('host resume-to-drain')))
+    if rate is not None:
+        print(rate.report())
+    print(trace_agreement(predictions, stats['states'], accel, gyro, fixed))
+    if early_exit:
+        print('Early exit: {:.2f} of {} trees evaluated per window'.format(model.mean_trees(), len(model.roots)))
+    if prefilter:
+        print('Pre-filter: {:.1f}% of windows short-circuited'.format(model.short_circuit_percent()))
+    if alerts:
+        print(alert.report() + ', {} forest alert windows without one'.format(stats['unflagged']))
+        print('Event-to-alert: {:.1f} ms earlier than the window path (mean, simulated), {}'.format(
+            alert.confirm_latency.mean_us() / 1000, alert.alert_latency.report('host check')))
+    for idx in range(4):
+        print('  {:8s} {}'.format(RandomForest.idxToLabel(idx), counts[idx]))
+
+    if out:
+        with open(out, 'w') as f:
+            f.write('t_ms,class\n')
+            for t, label in predictions:
+                f.write('{},{}\n'.format(t, label))
+    if expected:
+        ref = read_predictions(expected)
+        if rate is not None:
+            predictions = aligned(predictions, ref)
+        mismatches = sum(1 for a, b in zip(predictions, ref) if a != b) + abs(len(ref) - len(predictions))
+        print('Compared with {}: {} mismatches'.format(expected, mismatches))
+        for idx in range(4):
+            total = sum(1 for (_, b) in ref if b == idx)
+            if total:
+                kept = sum(1 for (_, a), (_, b) in zip(predictions, ref) if a == b == idx)
+                print('  {:8s} recall {}/{}'.format(RandomForest.idxToLabel(idx), kept, total))
+        if mismatches:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,66 @@
+import struct
+from perf import ticks_ms
+
+# Binary verdict notification (main.py with VERDICT_FRAMES), decoded by BleWindows.py,
+# little endian, 5 bytes, no longer than any label string it replaces:
+#   head   VERDICT_MARKER, kind (bits 6-5) and class id (bits 4-0). The marker is never set
+#          in the first byte of an ASCII label string, which older firmware sends.
+#   votes  votes of the winning class (bits 7-4) out of the trees that ran (bits 3-0),
+#          saturating at 15. With early exit the trees stop once the rest cannot change
+#          the label, so fewer than the whole forest may have run. 0 of 0 when no tree
+#          voted (pre-filter, generated forest, MLC).
+#   seq    sequence number, wraps at 256, gaps are lost frames
+#   ms     ticks_ms of the verdict modulo 65536, wraps every 65.5s. BleWindows.py unwraps
+#          it against the receive time.
+VERDICT_FORMAT = '<BBBH'
+VERDICT_SIZE = 5
+VERDICT_MARKER = 0x80
+# Kinds: forest label, provisional alert (alerts.FastAlert), retraction of the last alert
+VERDICT_LABEL = 0
+VERDICT_ALERT = 1
+VERDICT_RETRACT = 2
+# Class id of frames without one (retractions)
+NO_CLASS = 0x1F
+
+
+def encode(kind, class_id, votes, trees, seq, ms):
+    return struct.pack(VERDICT_FORMAT, VERDICT_MARKER | kind << 5 | class_id & NO_CLASS,
+                       min(votes, 15) << 4 | min(trees, 15), seq & 0xFF, ms & 0xFFFF)
+
+
+# Whether data is a verdict frame rather than a label string
+def is_frame(data):
+    return len(data) == VERDICT_SIZE and data[0] & VERDICT_MARKER
+
+
+# (kind, class id, votes, trees, sequence number, ms) of a frame
+def decode(data):
+    head, votes, seq, ms = struct.unpack(VERDICT_FORMAT, data)
+    return (head >> 5) & 0x03, head & NO_CLASS, votes >> 4, votes & 0x0F, seq, ms
+
+
+# Numbers and encodes the frames, counting the bytes sent against the label strings
+# they replace
+class VerdictSender:
+    def __init__(self):
+        self.seq = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.frames = 0
+        self.bytes = 0
+        self.text_bytes = 0
+
+    # Frame of one verdict, votes of the class out of trees, label is the string notified
+    # without frames
+    def frame(self, kind, class_id, votes=0, trees=0, label=''):
+        data = encode(kind, class_id, votes, trees, self.seq, ticks_ms())
+        self.seq = (self.seq + 1) & 0xFF
+        self.frames += 1
+        self.bytes += len(data)
+        self.text_bytes += len(label)
+        return data
+
+    def report(self):
+        return 'Verdicts: {} frames, {} bytes ({} as label strings), next sequence {}'.format(
+            self.frames, self.bytes, self.text_bytes, self.seq)